@@ -0,0 +1,173 @@
+import time
+import logging
+import threading
+from opensearchpy import helpers, exceptions
+
+# Upper bound of one bulk request body, well below http.max_content_length
+DEFAULT_MAX_CHUNK_BYTES = 10 * 1024 * 1024
+
+# Bulk request duration the controller aims for
+DEFAULT_TARGET_LATENCY = 2.0
+
+# Error types the cluster returns when its write queue is full
+REJECTION_ERROR_TYPES = {
+    'es_rejected_execution_exception',
+    'opensearch_rejected_execution_exception',
+    'rejected_execution_exception',
+}
+
+
+class AdaptiveBatchController:
+    """Chooses the number of documents per bulk request from observed cluster behaviour.
+
+    Requests are always capped at max_bytes of serialized payload. The
+    document limit is halved on rejections (429 / rejected execution), shrunk
+    when requests take longer than target_latency and grown while requests
+    stay well below it. The controller is shared by all worker threads.
+    """
+
+    def __init__(self, initial_docs=500, min_docs=50, max_docs=5000, max_bytes=DEFAULT_MAX_CHUNK_BYTES,
+                 target_latency=DEFAULT_TARGET_LATENCY):
+        self.docs = initial_docs
+        self.min_docs = min_docs
+        self.max_docs = max_docs
+        self.max_bytes = max_bytes
+        self.target_latency = target_latency
+        self.requests = 0
+        self.rejections = 0
+        self._lock = threading.Lock()
+
+    def limits(self):
+        """Returns the current (max documents, max bytes) of a bulk request."""
+        with self._lock:
+            return self.docs, self.max_bytes
+
+    def observe(self, num_docs, num_bytes, elapsed, took_ms, rejected):
+        """Adjusts the document limit after one bulk request."""
+        with self._lock:
+            self.requests += 1
+            old_docs = self.docs
+            server_time = (took_ms or 0) / 1000
+
+            if rejected:
+                self.rejections += rejected
+                self.docs = max(self.min_docs, self.docs // 2)
+                cause = f"{rejected} rejected"
+            elif elapsed > self.target_latency:
+                self.docs = max(self.min_docs,
+                                int(self.docs * self.target_latency / elapsed))
+                cause = "slow request"
+            elif elapsed < self.target_latency / 2 and server_time < self.target_latency / 2 \
+                    and num_docs >= old_docs:
+                # Only grow when the request was limited by documents, not bytes
+                self.docs = min(self.max_docs, int(self.docs * 1.25) + 1)
+                cause = "fast request"
+            else:
+                cause = None
+
+            if self.docs != old_docs:
+                logging.info(
+                    f"Adaptive bulk: chunk size {old_docs} -> {self.docs} docs ({cause}: {num_docs} docs, "
+                    f"{num_bytes / 1024:.0f} KiB, {elapsed:.2f}s, took {took_ms}ms)")
+
+    def summary(self):
+        """Logs the final state of the controller."""
+        logging.info(
+            f"Bulk requests: {self.requests} requests, {self.rejections} rejected documents, "
+            f"final chunk size {self.docs} docs, byte cap {self.max_bytes / 1024 / 1024:.1f} MiB.")
+
+
+def _encode_action(action, serializer):
+    """Serializes one action into its bulk NDJSON lines as bytes.
+
+    Actions pre-encoded by BulkEncoder carry their lines in '_encoded'.
+    """
+    encoded = action.get('_encoded')
+    if encoded is not None:
+        return encoded
+    action_line, data = helpers.expand_action(action)
+    lines = serializer.dumps(action_line).encode('utf-8') + b'\n'
+    if data is not None:
+        lines += serializer.dumps(data).encode('utf-8') + b'\n'
+    return lines
+
+
+def iter_adaptive_chunks(actions, controller, serializer):
+    """Generator grouping actions into pre-encoded chunks sized by the controller's current limits.
+
+    Each chunk is a list of encoded NDJSON action/source line pairs.
+    """
+    chunk = []
+    chunk_bytes = 0
+    max_docs, max_bytes = controller.limits()
+
+    for action in actions:
+        encoded = _encode_action(action, serializer)
+        if chunk and (len(chunk) >= max_docs or chunk_bytes + len(encoded) > max_bytes):
+            yield chunk
+            chunk = []
+            chunk_bytes = 0
+            max_docs, max_bytes = controller.limits()
+        chunk.append(encoded)
+        chunk_bytes += len(encoded)
+
+    if chunk:
+        yield chunk
+
+
+def _is_rejection(item):
+    error = item.get('error')
+    error_type = error.get('type') if isinstance(error, dict) else None
+    return item.get('status') == 429 or error_type in REJECTION_ERROR_TYPES
+
+
+def send_adaptive_chunk(client, chunk, controller, max_retries=4, initial_backoff=1, max_backoff=5,
+                        request_timeout=60):
+    """Sends one pre-encoded chunk and returns its per-action (ok, info) results.
+
+    Rejected documents are retried with exponential backoff up to max_retries
+    times, like streaming_bulk does for 429 responses. Every attempt is
+    reported to the controller.
+    """
+    results = []
+    for attempt in range(max_retries + 1):
+        if attempt:
+            time.sleep(min(max_backoff, initial_backoff * 2 ** (attempt - 1)))
+
+        body = b''.join(chunk)
+        start = time.monotonic()
+        try:
+            response = client.bulk(body=body, request_timeout=request_timeout)
+        except exceptions.TransportError as e:
+            if e.status_code != 429 or attempt == max_retries:
+                raise
+            # The whole request was rejected: back off and send it again
+            controller.observe(len(chunk), len(body),
+                               time.monotonic() - start, None, len(chunk))
+            continue
+        elapsed = time.monotonic() - start
+
+        to_retry = []
+        rejected = 0
+        for encoded, item in zip(chunk, response['items']):
+            op_type, info = next(iter(item.items()))
+            ok = 200 <= info.get('status', 500) < 300
+            if not ok and _is_rejection(info):
+                rejected += 1
+                if attempt < max_retries:
+                    to_retry.append(encoded)
+                    continue
+            results.append((ok, {op_type: info}))
+
+        controller.observe(len(chunk), len(body), elapsed,
+                           response.get('took'), rejected)
+        if not to_retry:
+            break
+        chunk = to_retry
+    return results
+
+
+def adaptive_streaming_bulk(client, actions, controller, **options):
+    """Generator yielding (ok, info) results like streaming_bulk, with adaptively sized requests."""
+    for chunk in iter_adaptive_chunks(actions, controller, client.transport.serializer):
+        yield from send_adaptive_chunk(client, chunk, controller, **options)
@@ -0,0 +1,46 @@
+import base64
+import decimal
+import orjson
+from opensearchpy.serializer import JSONSerializer
+
+# NumPy arrays arrive from the DataFrame loader for Parquet list columns
+ORJSON_OPTIONS = orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS
+
+
+def _default(value):
+    """Fallback for values orjson does not serialize natively."""
+    if hasattr(value, 'tolist'):
+        # Object-dtype NumPy arrays, e.g. lists of structs
+        return value.tolist()
+    if isinstance(value, decimal.Decimal):
+        return float(value)
+    if isinstance(value, (bytes, bytearray)):
+        return base64.b64encode(value).decode('ascii')
+    if hasattr(value, 'isoformat'):
+        # pandas Timestamp and other date-like values
+        return value.isoformat()
+    raise TypeError(f"Type is not JSON serializable: {type(value).__name__}")
+
+
+def dumps(value):
+    """Serializes a value to JSON bytes with orjson."""
+    return orjson.dumps(value, default=_default, option=ORJSON_OPTIONS)
+
+
+class OrjsonSerializer(JSONSerializer):
+    """opensearch-py serializer backed by orjson instead of the stdlib json module."""
+
+    def dumps(self, data):
+        # Pre-built request bodies are passed through unchanged
+        if isinstance(data, (str, bytes)):
+            return data
+        return dumps(data).decode('utf-8')
+
+    def loads(self, s):
+        return orjson.loads(s)
+
+
+def encode_action(target_index, doc_id, doc, op_type='index'):
+    """Returns the bulk NDJSON action and source lines of one document as bytes."""
+    return (b'{"' + op_type.encode('ascii') + b'":{"_index":' + dumps(target_index)
+            + b',"_id":' + dumps(doc_id) + b'}}\n' + dumps(doc) + b'\n')
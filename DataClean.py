@@ -0,0 +1,217 @@
+import os
+import sys
+import json
+import time
+import logging
+import argparse
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
+
+# Rows per record batch read from the raw file
+DEFAULT_BATCH_SIZE = 50000
+
+# Cleaning rules of the DataInspectClean notebooks: default raw and cleaned
+# file, and the columns dropped before indexing. Columns missing from the raw
+# file are skipped.
+ENTITIES = {
+    'works': {
+        'input': 'university_papers_data_full.parquet',
+        'output': 'papers_clean2.parquet',
+        'drop_columns': ['is_retracted', 'is_paratext', 'primary_location'],
+    },
+    'authors': {
+        'input': 'authors_raw_data.parquet',
+        'output': 'authors_clean_data.parquet',
+        # Not to be confused with x_concepts, which is kept
+        'drop_columns': ['concepts'],
+    },
+    'projects': {
+        'input': 'university_projects.parquet',
+        'output': 'projects_clean.parquet',
+        'drop_columns': ['h2020Programmes', 'websiteUrl', 'keywords'],
+    },
+}
+
+
+def keep_mask(entity, batch):
+    """Returns a boolean array marking the rows of a batch that survive cleaning.
+
+    Works are kept only if they are neither retracted nor paratext; a null
+    flag counts as not kept, like the `== False` filters of the notebook.
+    """
+    mask = pa.array([True] * batch.num_rows, pa.bool_())
+    if entity != 'works':
+        return mask
+    for flag in ('is_retracted', 'is_paratext'):
+        if flag in batch.schema.names:
+            mask = pc.and_(mask, pc.equal(batch[flag], False))
+    return mask.fill_null(False)
+
+
+def _list_is_empty(column):
+    # A null list counts as empty
+    return pc.equal(pc.list_value_length(column).fill_null(0), 0)
+
+
+class QualitySummary:
+    """Quality counters of one cleaning pass, accumulated batch by batch.
+
+    Counts of missing abstracts, empty keyword lists and open access refer
+    to the rows that were kept.
+    """
+
+    def __init__(self, entity):
+        self.entity = entity
+        self.rows_read = 0
+        self.rows_written = 0
+        self.removed = {}
+        self.missing_values = {}
+        self.empty_lists = {}
+        self.universities = {}
+        self.open_access = None
+        self.dropped_columns = []
+
+    def observe_raw(self, batch):
+        self.rows_read += batch.num_rows
+        if self.entity == 'works':
+            for flag in ('is_retracted', 'is_paratext'):
+                if flag in batch.schema.names:
+                    count = pc.sum(batch[flag]).as_py() or 0
+                    self.removed[flag] = self.removed.get(flag, 0) + count
+
+    def observe_clean(self, batch):
+        self.rows_written += batch.num_rows
+        for name, column in zip(batch.schema.names, batch.columns):
+            if column.null_count:
+                self.missing_values[name] = self.missing_values.get(name, 0) + column.null_count
+            if pa.types.is_list(column.type) or pa.types.is_large_list(column.type):
+                empty = pc.sum(_list_is_empty(column)).as_py() or 0
+                self.empty_lists[name] = self.empty_lists.get(name, 0) + empty
+        if 'university_key' in batch.schema.names:
+            for item in pc.value_counts(batch['university_key']).to_pylist():
+                key = item['values']
+                self.universities[key] = self.universities.get(key, 0) + item['counts']
+        if 'open_access' in batch.schema.names:
+            is_oa = pc.sum(pc.struct_field(batch['open_access'], 'is_oa')).as_py() or 0
+            self.open_access = (self.open_access or 0) + is_oa
+
+    def to_dict(self):
+        return {
+            'entity': self.entity,
+            'rows_read': self.rows_read,
+            'rows_written': self.rows_written,
+            'removed_flags': self.removed,
+            'dropped_columns': self.dropped_columns,
+            'missing_abstracts': self.missing_values.get('abstract', 0) if self.entity == 'works' else None,
+            'empty_keywords': self.empty_lists.get('keywords') if self.entity == 'works' else None,
+            'open_access': self.open_access,
+            'missing_values': dict(sorted(self.missing_values.items())),
+            'empty_lists': {name: count for name, count in sorted(self.empty_lists.items()) if count},
+            'universities': dict(sorted(self.universities.items())),
+        }
+
+    def log(self):
+        """Logs the quality summary, in the order the notebooks inspect the data."""
+        summary = self.to_dict()
+        logging.info(
+            f"{self.entity}: {self.rows_read} rows read, {self.rows_written} rows written, "
+            f"{self.rows_read - self.rows_written} removed.")
+        for flag, count in summary['removed_flags'].items():
+            logging.info(f"  Rows with {flag}: {count}")
+        if summary['dropped_columns']:
+            logging.info(f"  Dropped columns: {', '.join(summary['dropped_columns'])}")
+        if self.rows_written and self.entity == 'works':
+            with_abstract = self.rows_written - summary['missing_abstracts']
+            logging.info(
+                f"  Papers without an abstract: {summary['missing_abstracts']} "
+                f"({with_abstract / self.rows_written * 100:.2f}% have one)")
+            logging.info(f"  Papers without keywords: {summary['empty_keywords']}")
+        if summary['open_access'] is not None and self.rows_written:
+            logging.info(
+                f"  Open access: {summary['open_access']} "
+                f"({summary['open_access'] / self.rows_written * 100:.2f}%)")
+        if summary['missing_values']:
+            logging.info("  Missing values per column: " +
+                         ', '.join(f"{name} {count}" for name, count in summary['missing_values'].items()))
+        if summary['empty_lists']:
+            logging.info("  Empty lists per column: " +
+                         ', '.join(f"{name} {count}" for name, count in summary['empty_lists'].items()))
+        if summary['universities']:
+            logging.info("  Rows per university: " +
+                         ', '.join(f"{key} {count}" for key, count in summary['universities'].items()))
+
+
+def clean_parquet(entity, input_path, output_path, batch_size=DEFAULT_BATCH_SIZE):
+    """Applies the cleaning rules of an entity in one streaming pass over the raw file's record batches.
+
+    Only one batch is held in memory at a time. The cleaned file is written
+    under a temporary name and replaces output_path when complete. Returns
+    the QualitySummary.
+    """
+    rules = ENTITIES[entity]
+    parquet_file = pq.ParquetFile(input_path)
+    input_schema = parquet_file.schema_arrow
+    summary = QualitySummary(entity)
+    summary.dropped_columns = [name for name in rules['drop_columns'] if name in input_schema.names]
+    columns = [name for name in input_schema.names if name not in summary.dropped_columns]
+    output_schema = pa.schema([input_schema.field(name) for name in columns])
+
+    start_time = time.time()
+    temp_path = output_path + '.tmp'
+    writer = pq.ParquetWriter(temp_path, output_schema)
+    try:
+        for batch in parquet_file.iter_batches(batch_size=batch_size):
+            summary.observe_raw(batch)
+            cleaned = batch.filter(keep_mask(entity, batch)).select(columns)
+            summary.observe_clean(cleaned)
+            if cleaned.num_rows:
+                writer.write_batch(cleaned)
+    except BaseException:
+        writer.close()
+        os.remove(temp_path)
+        raise
+    writer.close()
+    os.replace(temp_path, output_path)
+    logging.info(
+        f"Cleaned {input_path} into {output_path} in {time.time() - start_time:.1f}s.")
+    return summary
+
+
+def parse_args(argv=None):
+    """Parses the command line options of the cleaning stage."""
+    parser = argparse.ArgumentParser(
+        description="Clean a harvested Parquet file with the rules of the DataInspectClean notebooks.")
+    parser.add_argument('entity', choices=list(ENTITIES))
+    parser.add_argument(
+        '--input', default=None, metavar='FILE',
+        help="Raw Parquet file (default: the notebook's input file of the entity).")
+    parser.add_argument(
+        '--output', default=None, metavar='FILE',
+        help="Cleaned Parquet file (default: the notebook's output file of the entity).")
+    parser.add_argument(
+        '--batch-size', type=int, default=DEFAULT_BATCH_SIZE,
+        help=f"Rows per record batch (default: {DEFAULT_BATCH_SIZE}).")
+    parser.add_argument(
+        '--summary-json', default=None, metavar='PATH',
+        help="Also write the quality summary to this JSON file.")
+    return parser.parse_args(argv)
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    logging.basicConfig(level=logging.INFO,
+                        format='%(asctime)s - %(levelname)s - %(message)s')
+
+    input_path = args.input or ENTITIES[args.entity]['input']
+    output_path = args.output or ENTITIES[args.entity]['output']
+    try:
+        summary = clean_parquet(args.entity, input_path, output_path, args.batch_size)
+    except FileNotFoundError:
+        logging.error(f"File not found at '{input_path}'")
+        sys.exit(1)
+    summary.log()
+    if args.summary_json:
+        with open(args.summary_json, 'w', encoding='utf-8') as file:
+            json.dump(summary.to_dict(), file, indent=2)
+        logging.info(f"Quality summary written to {args.summary_json}.")
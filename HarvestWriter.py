@@ -0,0 +1,117 @@
+import os
+import glob
+import logging
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+# Column added to every record, naming the university it was harvested for
+PARTITION_COLUMN = 'university_key'
+
+
+class PartitionWriter:
+    """Appends pages of records for one university to a temporary Parquet file.
+
+    The file only gets its final name once the university is finished, so an
+    interrupted harvest never leaves a partial partition behind.
+    """
+
+    def __init__(self, temp_path, final_path, schema, key):
+        self.temp_path = temp_path
+        self.final_path = final_path
+        self.schema = schema
+        self.key = key
+        self.rows = 0
+        self.writer = pq.ParquetWriter(temp_path, schema)
+
+    def write(self, records):
+        """Writes one page of records as a row group."""
+        if not records:
+            return
+        table = pa.Table.from_pylist(
+            [{**record, PARTITION_COLUMN: self.key} for record in records], schema=self.schema)
+        self.writer.write_table(table)
+        self.rows += len(records)
+
+    def close(self):
+        """Finishes the file and moves it to its final name."""
+        self.writer.close()
+        os.replace(self.temp_path, self.final_path)
+
+    def abort(self):
+        """Discards the partial file."""
+        self.writer.close()
+        if os.path.exists(self.temp_path):
+            os.remove(self.temp_path)
+
+
+class PartitionedParquetWriter:
+    """Writes harvested records to one Parquet file per university in output_dir.
+
+    Every file holds the university_key column, so the directory can be read
+    back as a single dataset with pq.read_table(output_dir). Temporary files
+    start with '_', which dataset discovery ignores.
+    """
+
+    def __init__(self, output_dir, schema):
+        if PARTITION_COLUMN not in schema.names:
+            schema = schema.append(pa.field(PARTITION_COLUMN, pa.string()))
+        self.output_dir = output_dir
+        self.schema = schema
+        os.makedirs(output_dir, exist_ok=True)
+
+    def path(self, key):
+        """Returns the final path of a university's file."""
+        return os.path.join(self.output_dir, f"{key}.parquet")
+
+    def is_complete(self, key):
+        """True if the university was fully harvested by an earlier run."""
+        return os.path.exists(self.path(key))
+
+    def open(self, key):
+        """Starts a new file for a university, replacing any earlier partial one."""
+        temp_path = os.path.join(self.output_dir, f"_{key}.parquet.tmp")
+        return PartitionWriter(temp_path, self.path(key), self.schema, key)
+
+    def write_partition(self, key, pages):
+        """Writes an iterable of record pages as one university's file and returns the row count.
+
+        Only one page is held in memory at a time. If the pages raise, the
+        partial file is removed and the error is passed on.
+        """
+        partition = self.open(key)
+        try:
+            for page in pages:
+                partition.write(page)
+        except BaseException:
+            partition.abort()
+            raise
+        partition.close()
+        logging.info(
+            f"Wrote {partition.rows} rows for {key} to {partition.final_path}.")
+        return partition.rows
+
+
+def combine_partitions(output_dir, output_file):
+    """Concatenates all university files of a harvest into one Parquet file, one row group at a time."""
+    paths = sorted(glob.glob(os.path.join(output_dir, '[!_]*.parquet')))
+    if not paths:
+        logging.error(f"No harvested Parquet files found in {output_dir}.")
+        return 0
+
+    rows = 0
+    writer = None
+    try:
+        for path in paths:
+            parquet_file = pq.ParquetFile(path)
+            if writer is None:
+                writer = pq.ParquetWriter(output_file, parquet_file.schema_arrow)
+            for row_group in range(parquet_file.num_row_groups):
+                table = parquet_file.read_row_group(row_group)
+                writer.write_table(table)
+                rows += table.num_rows
+    finally:
+        if writer is not None:
+            writer.close()
+    logging.info(
+        f"Combined {len(paths)} files with {rows} rows into {output_file}.")
+    return rows
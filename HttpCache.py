@@ -0,0 +1,254 @@
+import os
+import gzip
+import json
+import time
+import hashlib
+import logging
+import threading
+from urllib.parse import urlsplit, urlunsplit, parse_qsl, urlencode
+import requests
+from requests.adapters import HTTPAdapter
+from requests.structures import CaseInsensitiveDict
+
+# Directory holding one gzip file per cached response
+HTTP_CACHE_DIR = '.http_cache'
+
+# Cached responses older than this are fetched again (None: never expire)
+DEFAULT_TTL = 7 * 24 * 3600
+
+# The oldest responses are evicted once the cache grows beyond this size
+DEFAULT_MAX_BYTES = 2 * 1024 ** 3
+
+# use: serve fresh responses from the cache and fetch the rest.
+# refresh: always fetch and overwrite the cache.
+# offline: only serve from the cache, whatever its age; a miss is an error.
+CACHE_MODES = ('use', 'refresh', 'offline')
+
+# Query parameters left out of the cache key, so credentials do not end up
+# on disk and a cache filled by one user can be replayed by another
+IGNORED_PARAMS = {'mailto', 'api_key'}
+
+# Headers that described the body on the wire and no longer apply to the
+# decoded body kept in the cache
+DROPPED_HEADERS = {'content-encoding', 'content-length', 'transfer-encoding', 'connection'}
+
+
+class OfflineCacheMiss(requests.RequestException):
+    """Raised in offline mode for a request that is not in the cache."""
+
+
+def normalize_url(url):
+    """Returns the URL with its query parameters sorted and credentials removed."""
+    parts = urlsplit(url)
+    params = sorted((name, value) for name, value in parse_qsl(parts.query, keep_blank_values=True)
+                    if name not in IGNORED_PARAMS)
+    return urlunsplit((parts.scheme, parts.netloc, parts.path, urlencode(params), ''))
+
+
+def request_url(url, params=None):
+    """Returns the full URL requests would send for url and params."""
+    return requests.Request('GET', url, params=params).prepare().url
+
+
+class ResponseCache:
+    """Persistent, gzip-compressed cache of successful GET responses, keyed by URL and parameters.
+
+    Entries expire after ttl seconds. Once the cache holds more than
+    max_bytes, the least recently used entries are removed. Safe to share
+    between threads.
+    """
+
+    def __init__(self, cache_dir=HTTP_CACHE_DIR, ttl=DEFAULT_TTL, max_bytes=DEFAULT_MAX_BYTES, mode='use'):
+        if mode not in CACHE_MODES:
+            raise ValueError(f"Unknown cache mode {mode!r}, expected one of {', '.join(CACHE_MODES)}.")
+        self.cache_dir = cache_dir
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.mode = mode
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        os.makedirs(cache_dir, exist_ok=True)
+        self._sizes = {entry.path: entry.stat().st_size for entry in os.scandir(cache_dir)
+                       if entry.name.endswith('.gz')}
+
+    @classmethod
+    def from_env(cls):
+        """Creates a cache from HTTP_CACHE_MODE, HTTP_CACHE_DIR, HTTP_CACHE_TTL and HTTP_CACHE_MAX_MB.
+
+        Returns None when HTTP_CACHE_MODE is unset or 'off'.
+        """
+        mode = os.getenv('HTTP_CACHE_MODE', 'off')
+        if mode == 'off':
+            return None
+        ttl = os.getenv('HTTP_CACHE_TTL')
+        max_mb = os.getenv('HTTP_CACHE_MAX_MB')
+        return cls(cache_dir=os.getenv('HTTP_CACHE_DIR', HTTP_CACHE_DIR),
+                   ttl=float(ttl) if ttl else DEFAULT_TTL,
+                   max_bytes=int(float(max_mb) * 1024 * 1024) if max_mb else DEFAULT_MAX_BYTES,
+                   mode=mode)
+
+    def path(self, url):
+        key = hashlib.sha256(normalize_url(url).encode('utf-8')).hexdigest()
+        return os.path.join(self.cache_dir, f"{key}.gz")
+
+    def _is_fresh(self, path):
+        try:
+            age = time.time() - os.path.getmtime(path)
+        except FileNotFoundError:
+            return False
+        return self.mode == 'offline' or self.ttl is None or age <= self.ttl
+
+    def has(self, url):
+        """True if a GET of url would be answered from the cache."""
+        return self.mode != 'refresh' and self._is_fresh(self.path(url))
+
+    def get(self, url):
+        """Returns (status, headers, body) of a cached response, or None.
+
+        In offline mode a miss raises OfflineCacheMiss.
+        """
+        path = self.path(url)
+        entry = None
+        if self.mode != 'refresh' and self._is_fresh(path):
+            try:
+                with gzip.open(path, 'rb') as file:
+                    meta = json.loads(file.readline())
+                    entry = meta['status'], meta['headers'], file.read()
+                # Mark as recently used for eviction
+                os.utime(path, (time.time(), os.path.getmtime(path)))
+            except (OSError, ValueError, KeyError):
+                logging.warning(f"Ignoring unreadable cache entry {path}.")
+                entry = None
+
+        with self._lock:
+            if entry is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        if entry is None and self.mode == 'offline':
+            raise OfflineCacheMiss(f"No cached response for {normalize_url(url)} (offline mode).")
+        return entry
+
+    def put(self, url, status, headers, body):
+        """Stores a response, then evicts the least recently used entries beyond max_bytes."""
+        path = self.path(url)
+        meta = {'url': normalize_url(url), 'status': status,
+                'headers': {name: value for name, value in headers.items()
+                            if name.lower() not in DROPPED_HEADERS}}
+        temp_path = f"{path}.{threading.get_ident()}.tmp"
+        with gzip.open(temp_path, 'wb') as file:
+            file.write(json.dumps(meta).encode('utf-8') + b'\n')
+            file.write(body)
+        os.replace(temp_path, path)
+
+        with self._lock:
+            self._sizes[path] = os.path.getsize(path)
+            if sum(self._sizes.values()) > self.max_bytes:
+                self._evict()
+
+    def _evict(self):
+        def last_used(path):
+            try:
+                return os.path.getatime(path)
+            except FileNotFoundError:
+                return 0
+
+        total = sum(self._sizes.values())
+        evicted = 0
+        for path in sorted(self._sizes, key=last_used):
+            if total <= self.max_bytes:
+                break
+            total -= self._sizes.pop(path)
+            evicted += 1
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+        logging.info(
+            f"Evicted {evicted} responses from {self.cache_dir} ({total / 1024 / 1024:.1f} MiB left).")
+
+    def log_stats(self):
+        logging.info(
+            f"HTTP cache ({self.mode}): {self.hits} hits, {self.misses} misses, "
+            f"{sum(self._sizes.values()) / 1024 / 1024:.1f} MiB in {self.cache_dir}.")
+
+
+class CachingAdapter(HTTPAdapter):
+    """HTTPAdapter answering GET requests from a ResponseCache and storing new 200 responses in it.
+
+    Mount it on a session in place of a plain HTTPAdapter; it takes the same
+    pool and retry options.
+    """
+
+    def __init__(self, cache, **kwargs):
+        self.cache = cache
+        super().__init__(**kwargs)
+
+    def send(self, request, **kwargs):
+        if request.method != 'GET':
+            return super().send(request, **kwargs)
+
+        entry = self.cache.get(request.url)
+        if entry is not None:
+            status, headers, body = entry
+            response = requests.Response()
+            response.status_code = status
+            response.headers = CaseInsensitiveDict(headers)
+            response._content = body
+            response.url = request.url
+            response.request = request
+            response.reason = 'OK'
+            response.encoding = requests.utils.get_encoding_from_headers(response.headers)
+            response.from_cache = True
+            return response
+
+        response = super().send(request, **kwargs)
+        response.from_cache = False
+        if response.status_code == 200:
+            self.cache.put(request.url, response.status_code, response.headers, response.content)
+        return response
+
+
+def install_pyalex_cache(cache):
+    """Makes every pyalex request go through the cache, keeping pyalex's retry settings.
+
+    pyalex builds a new session for every request; the patched factory mounts
+    a CachingAdapter with the retries of the session pyalex would have used.
+    """
+    import pyalex.api
+
+    original = getattr(pyalex.api._get_requests_session, 'original', pyalex.api._get_requests_session)
+
+    def _get_requests_session():
+        session = original()
+        retries = session.get_adapter('https://').max_retries
+        session.mount('https://', CachingAdapter(cache, max_retries=retries))
+        return session
+
+    _get_requests_session.original = original
+    pyalex.api._get_requests_session = _get_requests_session
+
+
+def add_cache_arguments(parser):
+    """Adds the --cache, --cache-dir, --cache-ttl and --cache-max-mb options to a harvester's parser."""
+    parser.add_argument(
+        '--cache', choices=('off',) + CACHE_MODES, default=os.getenv('HTTP_CACHE_MODE', 'off'),
+        help="On-disk response cache: use fresh entries, refresh all, or replay offline "
+             "with no network access (default: HTTP_CACHE_MODE or off).")
+    parser.add_argument(
+        '--cache-dir', default=os.getenv('HTTP_CACHE_DIR', HTTP_CACHE_DIR),
+        help=f"Directory of the response cache (default: {HTTP_CACHE_DIR}).")
+    parser.add_argument(
+        '--cache-ttl', type=float, default=DEFAULT_TTL,
+        help=f"Seconds before a cached response is fetched again (default: {DEFAULT_TTL}).")
+    parser.add_argument(
+        '--cache-max-mb', type=float, default=DEFAULT_MAX_BYTES / 1024 / 1024,
+        help=f"Size limit of the cache in MiB (default: {DEFAULT_MAX_BYTES // 1024 // 1024}).")
+
+
+def cache_from_args(args):
+    """Creates the ResponseCache selected on the command line, or None."""
+    if args.cache == 'off':
+        return None
+    return ResponseCache(args.cache_dir, args.cache_ttl, int(args.cache_max_mb * 1024 * 1024), args.cache)
@@ -0,0 +1,100 @@
+import re
+import logging
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
+from opensearchpy import exceptions
+
+# Versions of an alias kept after a rebuild, including the one it points to,
+# so the previous version stays available for a rollback
+DEFAULT_RETENTION = 2
+
+
+def versioned_index_name(alias, version):
+    """Returns the name of one version of an alias, e.g. university_papers_v3."""
+    return f"{alias}_v{version}"
+
+
+def list_versions(client, alias):
+    """Returns the version numbers of all existing indexes of an alias, oldest first."""
+    pattern = re.compile(rf"^{re.escape(alias)}_v(\d+)$")
+    response = client.indices.get(index=f"{alias}_v*")
+    return sorted(int(match.group(1)) for match in map(pattern.match, response) if match)
+
+
+def next_version(client, alias):
+    versions = list_versions(client, alias)
+    return versions[-1] + 1 if versions else 1
+
+
+def alias_targets(client, alias):
+    """Returns the indexes an alias currently points to."""
+    try:
+        return sorted(client.indices.get_alias(name=alias))
+    except exceptions.NotFoundError:
+        return []
+
+
+def expected_document_count(parquet_filepath, id_col):
+    """Number of distinct, non-null IDs in a Parquet file: the documents a full load leaves in the index.
+
+    Rows with a repeated ID overwrite each other and rows without an ID are
+    skipped, so the row count itself is not the expected document count.
+    """
+    ids = pq.read_table(parquet_filepath, columns=[id_col])[id_col]
+    return pc.count_distinct(pc.cast(ids, pa.string()), mode='only_valid').as_py()
+
+
+def verify_document_count(client, index_name, expected):
+    """Refreshes an index and checks that it holds the expected number of documents."""
+    client.indices.refresh(index=index_name)
+    actual = client.count(index=index_name)['count']
+    if actual != expected:
+        logging.error(
+            f"Index '{index_name}' holds {actual} documents, expected {expected}.")
+        return False
+    logging.info(f"Index '{index_name}' holds the expected {actual} documents.")
+    return True
+
+
+def swap_alias(client, alias, new_index):
+    """Points an alias at new_index and away from all its other indexes in one atomic update.
+
+    If a concrete index still has the alias's name (an index loaded before
+    versioning), it is removed in the same update, since an alias cannot
+    share its name with an index.
+    """
+    actions = [{'remove': {'index': index, 'alias': alias}}
+               for index in alias_targets(client, alias) if index != new_index]
+    if not actions and client.indices.exists(index=alias) and not client.indices.exists_alias(name=alias):
+        logging.warning(
+            f"'{alias}' is a concrete index. It is deleted as the alias takes over its name.")
+        actions.append({'remove_index': {'index': alias}})
+    actions.append({'add': {'index': new_index, 'alias': alias}})
+
+    client.indices.update_aliases(body={'actions': actions})
+    logging.info(
+        f"Alias '{alias}' now points to '{new_index}'.")
+    return True
+
+
+def apply_retention(client, alias, retention=DEFAULT_RETENTION):
+    """Deletes all but the newest `retention` versions of an alias, never the ones it points to."""
+    targets = set(alias_targets(client, alias))
+    versions = list_versions(client, alias)
+    kept = set(versions[-retention:]) if retention > 0 else set()
+    deleted = []
+    for version in versions:
+        index_name = versioned_index_name(alias, version)
+        if version in kept or index_name in targets:
+            continue
+        try:
+            client.indices.delete(index=index_name)
+            deleted.append(index_name)
+        except Exception as e:
+            logging.error(
+                f"Failed to delete old version '{index_name}': {e}", exc_info=True)
+    if deleted:
+        logging.info(
+            f"Deleted old versions of '{alias}': {', '.join(deleted)}")
+    return deleted
@@ -0,0 +1,143 @@
+import os
+import glob
+import json
+import logging
+
+# Directory holding one checkpoint file per (Parquet file, index) pair
+CHECKPOINT_DIR = '.checkpoints'
+
+
+def checkpoint_path(parquet_filepath, index_name):
+    """Returns the path of the checkpoint file for a Parquet file and index pair."""
+    parquet_name = os.path.splitext(os.path.basename(parquet_filepath))[0]
+    return os.path.join(CHECKPOINT_DIR, f"{index_name}__{parquet_name}.json")
+
+
+def remove_checkpoints(index_name):
+    """Deletes the checkpoints of an index for every Parquet file."""
+    for path in glob.glob(os.path.join(CHECKPOINT_DIR, f"{glob.escape(index_name)}__*.json")):
+        os.remove(path)
+
+
+def _file_fingerprint(parquet_filepath):
+    """Size and modification time, used to detect a Parquet file that changed since the checkpoint."""
+    stat = os.stat(parquet_filepath)
+    return {'size': stat.st_size, 'mtime': int(stat.st_mtime)}
+
+
+class IndexCheckpoint:
+    """Row watermark of a streaming indexing run.
+
+    The watermark only moves past a record batch once every action generated
+    from it (and from all earlier batches) has been acknowledged successfully,
+    so resuming from it never skips a document that was not indexed.
+    """
+
+    def __init__(self, parquet_filepath, index_name, resume=False):
+        self.path = checkpoint_path(parquet_filepath, index_name)
+        self.parquet_filepath = parquet_filepath
+        self.index_name = index_name
+        self.fingerprint = _file_fingerprint(parquet_filepath)
+        self.start_row = 0
+        self.rows_done = 0
+
+        # Per batch: [row count, outstanding actions, closed, failed]
+        self._batches = {}
+        self._next_batch = 0
+        self._lowest_open = 0
+        self._current_batch = None
+        self._inflight = {}
+
+        if resume:
+            self.start_row = self._load()
+        self.rows_done = self.start_row
+
+    def _load(self):
+        try:
+            with open(self.path, 'r', encoding='utf-8') as file:
+                state = json.load(file)
+        except FileNotFoundError:
+            logging.info(
+                f"No checkpoint found at {self.path}. Starting from row 0.")
+            return 0
+
+        if state.get('fingerprint') != self.fingerprint or state.get('index') != self.index_name:
+            logging.warning(
+                f"Checkpoint {self.path} belongs to a different file version or index. Starting from row 0.")
+            return 0
+
+        logging.info(
+            f"Resuming from checkpoint {self.path}: skipping {state['rows_done']} acknowledged rows.")
+        return state['rows_done']
+
+    def _save(self):
+        os.makedirs(CHECKPOINT_DIR, exist_ok=True)
+        state = {
+            'parquet': self.parquet_filepath,
+            'index': self.index_name,
+            'fingerprint': self.fingerprint,
+            'rows_done': self.rows_done,
+        }
+        temp_path = self.path + '.tmp'
+        with open(temp_path, 'w', encoding='utf-8') as file:
+            json.dump(state, file)
+        os.replace(temp_path, self.path)
+
+    def begin_batch(self, num_rows):
+        """Called by the action generator before it yields actions of a new record batch."""
+        batch = self._next_batch
+        self._next_batch += 1
+        self._batches[batch] = [num_rows, 0, False, False]
+        self._current_batch = batch
+
+    def end_batch(self):
+        """Called by the action generator once all actions of the current batch were yielded."""
+        self._batches[self._current_batch][2] = True
+        self._current_batch = None
+        self._advance()
+
+    def track(self, actions):
+        """Generator registering every action that is actually sent with its record batch.
+
+        Acknowledgements are matched to batches by _id, and with several
+        workers they arrive in any order, so an ID must be sent once per
+        run: the action generator only sends the last row of every ID.
+        """
+        for action in actions:
+            if self._current_batch is not None and action.get('_op_type', 'index') != 'delete':
+                if action['_id'] in self._inflight:
+                    raise ValueError(f"Document '{action['_id']}' is sent twice in one run.")
+                self._batches[self._current_batch][1] += 1
+                self._inflight[action['_id']] = self._current_batch
+            yield action
+
+    def acknowledge(self, ok, action_info):
+        """Records the result of one bulk operation and moves the watermark forward."""
+        _, info = next(iter(action_info.items()))
+        batch = self._inflight.pop(info.get('_id'), None)
+        if batch is None:
+            return
+
+        self._batches[batch][1] -= 1
+        if not ok:
+            self._batches[batch][3] = True
+        self._advance()
+
+    def _advance(self):
+        moved = False
+        while self._lowest_open in self._batches:
+            num_rows, outstanding, closed, failed = self._batches[self._lowest_open]
+            if not closed or outstanding > 0 or failed:
+                break
+            del self._batches[self._lowest_open]
+            self._lowest_open += 1
+            self.rows_done += num_rows
+            moved = True
+        if moved:
+            self._save()
+
+    def complete(self):
+        """Removes the checkpoint after a fully successful run."""
+        if os.path.exists(self.path):
+            os.remove(self.path)
+            logging.info(f"Removed checkpoint {self.path}.")
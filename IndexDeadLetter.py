@@ -0,0 +1,128 @@
+import os
+import json
+import logging
+
+# Directory holding one dead-letter file per OpenSearch index
+DEAD_LETTER_DIR = '.deadletter'
+
+# HTTP statuses that usually succeed when sent again later
+RETRYABLE_STATUSES = {408, 429, 500, 502, 503, 504}
+
+# Error types reported by the cluster when it is overloaded or timing out
+RETRYABLE_ERROR_TYPES = {
+    'es_rejected_execution_exception',
+    'opensearch_rejected_execution_exception',
+    'rejected_execution_exception',
+    'timeout_exception',
+    'process_cluster_event_timeout_exception',
+    'unavailable_shards_exception',
+    'circuit_breaking_exception',
+}
+
+
+def dead_letter_path(index_name):
+    """Returns the path of the dead-letter file for an index."""
+    return os.path.join(DEAD_LETTER_DIR, f"{index_name}.ndjson")
+
+
+def remove_dead_letters(index_name):
+    """Deletes the dead-letter file of an index, if it has one."""
+    if os.path.exists(dead_letter_path(index_name)):
+        os.remove(dead_letter_path(index_name))
+
+
+def classify_failure(info):
+    """Returns (error_type, reason, retryable) for the info of a failed bulk operation."""
+    status = info.get('status')
+    error = info.get('error')
+
+    if isinstance(error, dict):
+        error_type = error.get('type')
+        reason = error.get('reason')
+        caused_by = error.get('caused_by')
+        if isinstance(caused_by, dict) and caused_by.get('reason'):
+            reason = f"{reason}: {caused_by['reason']}"
+    else:
+        # Transport errors are reported as a plain message
+        error_type = 'transport_error'
+        reason = str(error) if error is not None else None
+
+    retryable = status in RETRYABLE_STATUSES or error_type in RETRYABLE_ERROR_TYPES \
+        or error_type == 'transport_error'
+    return error_type, reason, retryable
+
+
+def dead_letter_entry(action_info, parquet_filepath, id_col):
+    """Builds the dead-letter entry for a failed (ok, action_info) bulk result."""
+    op_type, info = next(iter(action_info.items()))
+    error_type, reason, retryable = classify_failure(info)
+    return {
+        '_id': info.get('_id'),
+        '_index': info.get('_index'),
+        'op_type': op_type,
+        'status': info.get('status'),
+        'error_type': error_type,
+        'reason': reason,
+        'retryable': retryable,
+        'parquet': parquet_filepath,
+        'id_col': id_col,
+    }
+
+
+def read_dead_letters(index_name):
+    """Reads all dead-letter entries recorded for an index."""
+    path = dead_letter_path(index_name)
+    if not os.path.exists(path):
+        return []
+    with open(path, 'r', encoding='utf-8') as file:
+        return [json.loads(line) for line in file if line.strip()]
+
+
+def write_dead_letters(index_name, entries):
+    """Replaces the dead-letter file of an index with the given entries."""
+    if not entries:
+        remove_dead_letters(index_name)
+        return
+    path = dead_letter_path(index_name)
+    os.makedirs(DEAD_LETTER_DIR, exist_ok=True)
+    temp_path = path + '.tmp'
+    with open(temp_path, 'w', encoding='utf-8') as file:
+        for entry in entries:
+            file.write(json.dumps(entry, ensure_ascii=False) + '\n')
+    os.replace(temp_path, path)
+
+
+class DeadLetterWriter:
+    """Appends failed bulk operations of one indexing run to a compact NDJSON file.
+
+    Only the document ID, where it came from and the error are stored; the
+    retry command reads the documents back from the Parquet file.
+    """
+
+    def __init__(self, index_name, parquet_filepath, id_col, append=False):
+        self.path = dead_letter_path(index_name)
+        self.parquet_filepath = parquet_filepath
+        self.id_col = id_col
+        self.count = 0
+
+        os.makedirs(DEAD_LETTER_DIR, exist_ok=True)
+        self.file = open(self.path, 'a' if append else 'w', encoding='utf-8')
+
+    def record(self, action_info):
+        """Writes one failed operation and returns its dead-letter entry."""
+        entry = dead_letter_entry(
+            action_info, self.parquet_filepath, self.id_col)
+        self.file.write(json.dumps(entry, ensure_ascii=False) + '\n')
+        # Flush so a checkpoint written after this never gets ahead of the file
+        self.file.flush()
+        self.count += 1
+        return entry
+
+    def close(self):
+        """Closes the file, removing it if the run had no failures."""
+        self.file.close()
+        if self.count == 0 and os.path.getsize(self.path) == 0:
+            os.remove(self.path)
+        elif self.count > 0:
+            logging.warning(
+                f"{self.count} failed operations written to {self.path}.")
@@ -0,0 +1,184 @@
+import os
+import json
+import sqlite3
+import hashlib
+import logging
+import numpy as np
+import pyarrow as pa
+import pyarrow.compute as pc
+
+# Directory holding one SQLite manifest per OpenSearch index
+MANIFEST_DIR = '.manifests'
+
+# Field used for the optional cheap pre-filter (present in works and authors)
+UPDATED_DATE_FIELD = 'updated_date'
+
+# Number of acknowledged operations between two manifest commits
+COMMIT_EVERY = 5000
+
+
+def _json_default(value):
+    """JSON fallback for values coming from pandas/pyarrow (NumPy arrays, dates)."""
+    if hasattr(value, 'tolist'):
+        return value.tolist()
+    return str(value)
+
+
+def document_hash(doc):
+    """Returns a stable hash of a document, independent of key order."""
+    payload = json.dumps(doc, sort_keys=True, ensure_ascii=False,
+                         default=_json_default)
+    return hashlib.blake2b(payload.encode('utf-8'), digest_size=16).hexdigest()
+
+
+def last_rows(ids):
+    """Returns a boolean mask of the rows that become documents: the last row of every non-null ID.
+
+    A later row of an ID overwrites the earlier ones in the index, so only
+    the last one is hashed and sent; the others would never match the hash
+    recorded for the ID and be sent again on every delta run.
+    """
+    ids = pc.cast(ids, pa.string())
+    rows = pa.table({'id': ids, 'row': np.arange(len(ids))}).filter(pc.is_valid(ids))
+    mask = np.zeros(len(ids), dtype=bool)
+    mask[rows.group_by('id').aggregate([('row', 'max')])['row_max'].to_numpy()] = True
+    return mask
+
+
+def manifest_path(index_name):
+    """Returns the path of the manifest file for an index."""
+    return os.path.join(MANIFEST_DIR, f"{index_name}.sqlite")
+
+
+def replace_manifest(source_index, target_index):
+    """Makes the manifest of source_index the manifest of target_index, e.g. a rebuilt version's for its alias."""
+    os.replace(manifest_path(source_index), manifest_path(target_index))
+    logging.info(f"Manifest of '{target_index}' replaced by the one recorded for '{source_index}'.")
+
+
+def remove_manifest(index_name):
+    """Deletes the manifest of an index, if it has one."""
+    if os.path.exists(manifest_path(index_name)):
+        os.remove(manifest_path(index_name))
+
+
+class IndexManifest:
+    """Local record of what has been indexed, mapping document IDs to content hashes.
+
+    Only documents acknowledged by OpenSearch are written to the manifest, so
+    a failed run never marks unsent documents as up to date.
+    """
+
+    def __init__(self, index_name, delete_missing=False, trust_updated_date=False):
+        self.index_name = index_name
+        self.delete_missing = delete_missing
+        self.trust_updated_date = trust_updated_date
+        self.pending = {}
+        self.unchanged_count = 0
+        self.changed_count = 0
+        self.deleted_count = 0
+        self._acknowledged = 0
+
+        os.makedirs(MANIFEST_DIR, exist_ok=True)
+        self.connection = sqlite3.connect(manifest_path(index_name))
+        self.connection.execute(
+            "CREATE TABLE IF NOT EXISTS docs ("
+            "doc_id TEXT PRIMARY KEY, doc_hash TEXT NOT NULL, updated_date TEXT)")
+        self.connection.execute(
+            "CREATE TEMP TABLE seen (doc_id TEXT PRIMARY KEY)")
+        self.connection.commit()
+
+    def _is_unchanged(self, doc_id, doc_hash, updated_date):
+        row = self.connection.execute(
+            "SELECT doc_hash, updated_date FROM docs WHERE doc_id = ?", (doc_id,)).fetchone()
+        if row is None:
+            return False
+        if self.trust_updated_date and updated_date is not None and row[1] == updated_date:
+            return True
+        return doc_hash is not None and row[0] == doc_hash
+
+    def filter_actions(self, actions):
+        """Generator passing through only new or changed index actions.
+
+        When delete_missing is set, delete actions are yielded at the end for
+        every manifest entry whose ID was not seen in this run.
+        """
+        seen_batch = []
+        for action in actions:
+            doc_id = action['_id']
+            doc = action['_source']
+            updated_date = doc.get(UPDATED_DATE_FIELD)
+            if updated_date is not None:
+                updated_date = str(updated_date)
+
+            seen_batch.append((doc_id,))
+            if len(seen_batch) >= COMMIT_EVERY:
+                self._mark_seen(seen_batch)
+                seen_batch = []
+
+            # Skip hashing when the updated_date pre-filter already matches
+            if self.trust_updated_date and updated_date is not None \
+                    and self._is_unchanged(doc_id, None, updated_date):
+                self.unchanged_count += 1
+                continue
+
+            doc_hash = document_hash(doc)
+            if self._is_unchanged(doc_id, doc_hash, updated_date):
+                self.unchanged_count += 1
+                continue
+
+            self.changed_count += 1
+            self.pending[doc_id] = (doc_hash, updated_date)
+            yield action
+
+        self._mark_seen(seen_batch)
+        logging.info(
+            f"Delta: {self.changed_count} new or changed, {self.unchanged_count} unchanged documents.")
+
+        if self.delete_missing:
+            missing_ids = [row[0] for row in self.connection.execute(
+                "SELECT doc_id FROM docs WHERE doc_id NOT IN (SELECT doc_id FROM seen)")]
+            logging.info(
+                f"Delta: {len(missing_ids)} documents no longer present will be deleted.")
+            for doc_id in missing_ids:
+                self.deleted_count += 1
+                yield {
+                    "_op_type": "delete",
+                    "_index": self.index_name,
+                    "_id": doc_id,
+                }
+
+    def _mark_seen(self, rows):
+        self.connection.executemany(
+            "INSERT OR IGNORE INTO seen (doc_id) VALUES (?)", rows)
+
+    def acknowledge(self, ok, action_info):
+        """Records the result of one bulk operation in the manifest."""
+        op_type, info = next(iter(action_info.items()))
+        doc_id = info.get('_id')
+
+        if op_type == 'delete':
+            if ok or info.get('status') == 404:
+                self.connection.execute(
+                    "DELETE FROM docs WHERE doc_id = ?", (doc_id,))
+        else:
+            entry = self.pending.pop(doc_id, None)
+            if ok and entry is not None:
+                self.connection.execute(
+                    "INSERT OR REPLACE INTO docs (doc_id, doc_hash, updated_date) VALUES (?, ?, ?)",
+                    (doc_id, entry[0], entry[1]))
+
+        self._acknowledged += 1
+        if self._acknowledged % COMMIT_EVERY == 0:
+            self.connection.commit()
+
+    def forget(self, doc_ids):
+        """Removes documents deleted outside filter_actions from the manifest."""
+        self.connection.executemany(
+            "DELETE FROM docs WHERE doc_id = ?", [(doc_id,) for doc_id in doc_ids])
+        self.connection.commit()
+
+    def close(self):
+        """Commits outstanding manifest changes and closes the database."""
+        self.connection.commit()
+        self.connection.close()
@@ -0,0 +1,264 @@
+import json
+import time
+import logging
+import threading
+from contextlib import contextmanager, nullcontext
+from opensearchpy import Transport, exceptions
+from opensearchpy.serializer import JSONSerializer
+
+# Client-side work between reading the Parquet file and handing a body to
+# the connection
+CLIENT_COMPONENTS = ('decode', 'convert', 'serialize')
+
+# Prefix of every metric in the Prometheus text output
+PROMETHEUS_PREFIX = 'opensearch_indexing'
+
+
+def _percentile(values, fraction):
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+def _round(value):
+    return round(value, 3) if value is not None else None
+
+
+class IndexMetrics:
+    """Timings and counters of one indexing run, shared by all worker threads.
+
+    Stage times are wall-clock. Component times (decode, convert, serialize,
+    network) are summed over all threads, so with several workers they can
+    add up to more than the wall time of the indexing stage.
+    """
+
+    def __init__(self, index_name):
+        self.index_name = index_name
+        self.stages = {}
+        self.components = {component: 0.0 for component in CLIENT_COMPONENTS + ('network',)}
+        self.bulk_requests = 0
+        self.bytes_sent = 0
+        self.took_ms = []
+        self.request_seconds = []
+        self.rejected_docs = 0
+        self.rejected_requests = 0
+        self.docs_success = 0
+        self.docs_failed = 0
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def stage(self, name):
+        """Context manager recording the wall time of one pipeline stage."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.stages[name] = time.perf_counter() - start
+
+    def add_time(self, component, seconds):
+        """Adds time spent in one of the decode, convert, serialize or network components."""
+        with self._lock:
+            self.components[component] += seconds
+
+    def observe_request(self, num_bytes, elapsed, took_ms, rejected_docs):
+        """Records one bulk request as seen by the transport."""
+        with self._lock:
+            self.bulk_requests += 1
+            self.bytes_sent += num_bytes
+            self.components['network'] += elapsed
+            self.request_seconds.append(elapsed)
+            if took_ms is not None:
+                self.took_ms.append(took_ms)
+            self.rejected_docs += rejected_docs
+
+    def observe_rejected_request(self, num_bytes, elapsed):
+        """Records a bulk request the cluster rejected as a whole with 429."""
+        with self._lock:
+            self.rejected_requests += 1
+            self.bytes_sent += num_bytes
+            self.components['network'] += elapsed
+
+    def record_results(self, success_count, failed_count):
+        """Records the final document counts of the bulk indexing stage."""
+        with self._lock:
+            self.docs_success += success_count
+            self.docs_failed += failed_count
+
+    def docs_per_second(self):
+        """Acknowledged documents per second of the indexing stage."""
+        index_time = self.stages.get('index')
+        return self.docs_success / index_time if index_time else None
+
+    def bound_by(self):
+        """Names the part of the run that took the most time: client, network or cluster."""
+        took = sum(self.took_ms) / 1000
+        shares = {
+            'client': sum(self.components[component] for component in CLIENT_COMPONENTS),
+            'network': max(0.0, self.components['network'] - took),
+            'cluster': took,
+        }
+        if not any(shares.values()):
+            return None
+        return max(shares, key=shares.get)
+
+    def summary(self):
+        """Returns all metrics as a JSON-serializable dict."""
+        with self._lock:
+            docs_per_second = self.docs_per_second()
+            index_time = self.stages.get('index')
+            return {
+                'index': self.index_name,
+                'stages_seconds': {stage: round(seconds, 3) for stage, seconds in self.stages.items()},
+                'components_seconds': {component: round(seconds, 3)
+                                       for component, seconds in self.components.items()},
+                'bulk_requests': self.bulk_requests,
+                'bytes_sent': self.bytes_sent,
+                'mb_per_second': round(self.bytes_sent / 1024 / 1024 / index_time, 2) if index_time else None,
+                'docs_success': self.docs_success,
+                'docs_failed': self.docs_failed,
+                'docs_per_second': round(docs_per_second, 1) if docs_per_second else None,
+                'rejected_docs': self.rejected_docs,
+                'rejected_requests': self.rejected_requests,
+                'took_ms': {
+                    'sum': sum(self.took_ms),
+                    'p50': _percentile(self.took_ms, 0.5),
+                    'p95': _percentile(self.took_ms, 0.95),
+                    'max': max(self.took_ms, default=None),
+                },
+                'request_seconds': {
+                    'p50': _round(_percentile(self.request_seconds, 0.5)),
+                    'p95': _round(_percentile(self.request_seconds, 0.95)),
+                    'max': _round(max(self.request_seconds, default=None)),
+                },
+                'bound_by': self.bound_by(),
+            }
+
+    def to_prometheus(self):
+        """Returns the metrics in the Prometheus text exposition format."""
+        summary = self.summary()
+        label = f'index="{self.index_name}"'
+        lines = []
+
+        def metric(name, metric_type, help_text, samples):
+            lines.append(f"# HELP {PROMETHEUS_PREFIX}_{name} {help_text}")
+            lines.append(f"# TYPE {PROMETHEUS_PREFIX}_{name} {metric_type}")
+            for labels, value in samples:
+                if value is not None:
+                    lines.append(f"{PROMETHEUS_PREFIX}_{name}{{{label}{labels}}} {value}")
+
+        metric('stage_seconds', 'gauge', "Wall time of a pipeline stage.",
+               [(f',stage="{stage}"', seconds) for stage, seconds in summary['stages_seconds'].items()])
+        metric('component_seconds', 'gauge', "Time spent in a component, summed over all threads.",
+               [(f',component="{component}"', seconds)
+                for component, seconds in summary['components_seconds'].items()])
+        metric('bulk_requests_total', 'counter', "Bulk requests answered by the cluster.",
+               [('', summary['bulk_requests'])])
+        metric('bulk_took_seconds_total', 'counter', "Sum of the server-side took of all bulk requests.",
+               [('', summary['took_ms']['sum'] / 1000)])
+        metric('bytes_sent_total', 'counter', "Uncompressed bulk request bytes sent.",
+               [('', summary['bytes_sent'])])
+        metric('documents_total', 'counter', "Documents by final bulk result.",
+               [(',result="success"', summary['docs_success']), (',result="failed"', summary['docs_failed'])])
+        metric('documents_per_second', 'gauge', "Acknowledged documents per second of the indexing stage.",
+               [('', summary['docs_per_second'])])
+        metric('rejected_documents_total', 'counter', "Documents rejected with 429 and retried.",
+               [('', summary['rejected_docs'])])
+        metric('rejected_requests_total', 'counter', "Bulk requests rejected as a whole with 429.",
+               [('', summary['rejected_requests'])])
+        return '\n'.join(lines) + '\n'
+
+    def log_summary(self):
+        """Logs a one-line overview of where the time went."""
+        summary = self.summary()
+        stages = ', '.join(f"{stage} {seconds:.1f}s" for stage, seconds in summary['stages_seconds'].items())
+        components = ', '.join(f"{component} {seconds:.1f}s"
+                               for component, seconds in summary['components_seconds'].items())
+        logging.info(
+            f"Metrics: stages [{stages}]; components [{components}]; server took "
+            f"{summary['took_ms']['sum'] / 1000:.1f}s over {summary['bulk_requests']} requests; "
+            f"{summary['bytes_sent'] / 1024 / 1024:.1f} MiB sent; {summary['docs_per_second']} docs/s; "
+            f"{summary['rejected_docs']} rejected docs retried; bound by {summary['bound_by']}.")
+
+    def write(self, json_path=None, prometheus_path=None):
+        """Writes the JSON summary and/or the Prometheus text file."""
+        if json_path:
+            with open(json_path, 'w', encoding='utf-8') as file:
+                json.dump(self.summary(), file, indent=2)
+            logging.info(f"Metrics written to {json_path}.")
+        if prometheus_path:
+            with open(prometheus_path, 'w', encoding='utf-8') as file:
+                file.write(self.to_prometheus())
+            logging.info(f"Prometheus metrics written to {prometheus_path}.")
+
+
+def timed_iter(iterable, metrics, component):
+    """Generator adding the time spent producing each item of iterable to a metrics component."""
+    iterator = iter(iterable)
+    while True:
+        start = time.perf_counter()
+        try:
+            item = next(iterator)
+        except StopIteration:
+            return
+        finally:
+            metrics.add_time(component, time.perf_counter() - start)
+        yield item
+
+
+class TimedSerializer:
+    """Wraps a client serializer and adds the time spent in dumps() to the metrics."""
+
+    def __init__(self, serializer, index_metrics):
+        self.serializer = serializer or JSONSerializer()
+        self.mimetype = self.serializer.mimetype
+        self.index_metrics = index_metrics
+
+    def dumps(self, data):
+        start = time.perf_counter()
+        try:
+            return self.serializer.dumps(data)
+        finally:
+            self.index_metrics.add_time('serialize', time.perf_counter() - start)
+
+    def loads(self, s):
+        return self.serializer.loads(s)
+
+
+class InstrumentedTransport(Transport):
+    """Transport recording size, duration, took and rejections of every _bulk request.
+
+    The metrics are attached after the client is created, as index_metrics;
+    the 'metrics' attribute name is already used by opensearch-py itself.
+    When bulk_slots is set to a semaphore, it caps the _bulk requests in
+    flight across every thread using the client, e.g. several indexes loaded
+    at once.
+    """
+
+    index_metrics = None
+    bulk_slots = None
+
+    def perform_request(self, method, url, params=None, body=None, timeout=None, ignore=(), headers=None):
+        if not url.endswith('/_bulk'):
+            return super().perform_request(method, url, params, body, timeout, ignore, headers)
+
+        with self.bulk_slots or nullcontext():
+            if self.index_metrics is None:
+                return super().perform_request(method, url, params, body, timeout, ignore, headers)
+            return self._perform_bulk_request(method, url, params, body, timeout, ignore, headers)
+
+    def _perform_bulk_request(self, method, url, params, body, timeout, ignore, headers):
+        num_bytes = len(body.encode('utf-8') if isinstance(body, str) else body or b'')
+        start = time.perf_counter()
+        try:
+            response = super().perform_request(method, url, params, body, timeout, ignore, headers)
+        except exceptions.TransportError as e:
+            if e.status_code == 429:
+                self.index_metrics.observe_rejected_request(num_bytes, time.perf_counter() - start)
+            raise
+        elapsed = time.perf_counter() - start
+
+        rejected = sum(1 for item in response.get('items', ())
+                       if next(iter(item.values())).get('status') == 429)
+        self.index_metrics.observe_request(num_bytes, elapsed, response.get('took'), rejected)
+        return response
@@ -0,0 +1,75 @@
+import copy
+import logging
+
+# Settings profiles selectable with --profile. 'default' creates indexes
+# with the plain mapping; 'search' applies the entity's SEARCH_PROFILE
+PROFILES = ('default', 'search')
+DEFAULT_PROFILE = 'default'
+
+
+def field_mapping(mapping, path):
+    """Returns the mapping of a dotted field path, following object properties and multi-fields.
+
+    'open_access.oa_url' resolves to an object property and
+    'display_name.keyword' to a multi-field.
+    """
+    node = {'properties': mapping['properties']}
+    for name in path.split('.'):
+        children = node.get('properties', {})
+        if name not in children:
+            children = node.get('fields', {})
+        if name not in children:
+            raise KeyError(f"Field '{path}' is not in the mapping.")
+        node = children[name]
+    return node
+
+
+def nested_fields(mapping, prefix=''):
+    """Returns the dotted paths of the nested fields of a mapping."""
+    paths = []
+    for name, field in mapping.get('properties', {}).items():
+        path = f"{prefix}{name}"
+        if field.get('type') == 'nested':
+            paths.append(path)
+        paths.extend(nested_fields(field, f"{path}."))
+    return paths
+
+
+def index_body(mapping, profile=None, shards=None, refresh_interval=None):
+    """Returns the (mappings, settings) an index is created with.
+
+    profile is an entity's SEARCH_PROFILE, or None for the plain mapping:
+    'sort' is the index sort as {field: order}, 'eager_global_ordinals' the
+    facet keywords whose ordinals are built at refresh instead of on the
+    first aggregation, and 'no_doc_values' fields that are never sorted or
+    aggregated on. The mapping passed in is not modified. shards and
+    refresh_interval are applied with any profile.
+
+    OpenSearch refuses to create a sorted index whose mapping has nested
+    fields, so a 'sort' on such a mapping raises ValueError instead of
+    failing at index creation.
+    """
+    mapping = copy.deepcopy(mapping)
+    settings = {}
+    if shards is not None:
+        settings['index.number_of_shards'] = shards
+    if refresh_interval is not None:
+        settings['index.refresh_interval'] = refresh_interval
+    if profile:
+        sort = profile.get('sort', {})
+        if sort:
+            nested = nested_fields(mapping)
+            if nested:
+                raise ValueError(
+                    f"Index sorting is not supported with nested fields ({', '.join(nested)}).")
+            settings['index.sort.field'] = list(sort)
+            settings['index.sort.order'] = list(sort.values())
+        for path in profile.get('eager_global_ordinals', []):
+            field_mapping(mapping, path)['eager_global_ordinals'] = True
+        for path in profile.get('no_doc_values', []):
+            field_mapping(mapping, path)['doc_values'] = False
+        logging.info(
+            f"Search profile: sorted by {', '.join(f'{field} {order}' for field, order in sort.items()) or 'nothing'}, "
+            f"eager ordinals on {', '.join(profile.get('eager_global_ordinals', [])) or 'nothing'}, "
+            f"no doc values on {', '.join(profile.get('no_doc_values', [])) or 'nothing'}.")
+    return mapping, settings
@@ -0,0 +1,221 @@
+import os
+import json
+import logging
+from datetime import datetime, timezone
+import numpy as np
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
+from dotenv import load_dotenv
+from opensearchpy import exceptions
+
+# Load environment variables from .env file
+load_dotenv()
+
+# Summary index holding one rollup document per search index, read by the
+# backend for requests without query text or filters
+ROLLUP_INDEX = os.getenv('OPENSEARCH_ROLLUPS_INDEX', 'university_rollups')
+
+# Directory of the JSON copies of the rollup documents
+ROLLUP_DIR = '.rollups'
+
+ROLLUP_MAPPING = {
+    'properties': {
+        'index': {'type': 'keyword'},
+        'source_index': {'type': 'keyword'},
+        'parquet': {'type': 'keyword', 'index': False},
+        'built_at': {'type': 'date'},
+        'total': {'type': 'long'},
+        # Served as is, never searched
+        'aggregations': {'type': 'object', 'enabled': False},
+        'universities': {'type': 'object', 'enabled': False},
+    }
+}
+
+
+def rollup_path(index_name):
+    return os.path.join(ROLLUP_DIR, f"{index_name}.json")
+
+
+def _date_millis(values):
+    # A terms aggregation on a date field keys its buckets by epoch millis
+    parsed = pc.strptime(values, format='%Y-%m-%d', unit='ms', error_is_null=True)
+    return pc.cast(parsed, pa.int64())
+
+
+def terms_buckets(values, size, date_field=False):
+    """Buckets of a terms aggregation: the `size` most frequent non-null values, ties by key.
+
+    For a date field the keys are epoch millis with the date as key_as_string.
+    """
+    if isinstance(values, pa.ChunkedArray):
+        values = values.combine_chunks()
+    if date_field:
+        dates = values
+        values = _date_millis(values)
+    counts = pc.value_counts(values.drop_null())
+    if len(counts) == 0:
+        return {'doc_count_error_upper_bound': 0, 'sum_other_doc_count': 0, 'buckets': []}
+    table = pa.table({'key': counts.field('values'), 'doc_count': counts.field('counts')})
+    table = table.sort_by([('doc_count', 'descending'), ('key', 'ascending')])
+    buckets = table.slice(0, size).to_pylist()
+    if date_field:
+        names = dict(zip(_date_millis(dates).to_pylist(), dates.to_pylist()))
+        buckets = [{'key_as_string': names[bucket['key']], **bucket} for bucket in buckets]
+    return {
+        'doc_count_error_upper_bound': 0,
+        'sum_other_doc_count': sum(table['doc_count'].to_pylist()[size:]),
+        'buckets': buckets,
+    }
+
+
+def university_rollups(table, year_col=None, citations_col=None):
+    """Documents per university_key, with counts per year and citation totals when the columns exist."""
+    aggregations = [('university_key', 'count')]
+    if citations_col:
+        aggregations.append((citations_col, 'sum'))
+    grouped = table.group_by('university_key').aggregate(aggregations)
+    universities = {}
+    for row in grouped.to_pylist():
+        entry = {'documents': row['university_key_count']}
+        if citations_col:
+            entry['cited_by_count'] = row[f"{citations_col}_sum"] or 0
+        universities[row['university_key']] = entry
+
+    if year_col:
+        by_year = table.group_by(['university_key', year_col]).aggregate([('university_key', 'count')])
+        for row in by_year.sort_by([(year_col, 'ascending')]).to_pylist():
+            if row[year_col] is not None:
+                years = universities[row['university_key']].setdefault('by_year', {})
+                years[str(row[year_col])] = row['university_key_count']
+    universities.pop(None, None)
+    return dict(sorted(universities.items()))
+
+
+def indexed_rows(table, id_col):
+    """Keeps the rows that end up as documents: the last row of every non-null ID.
+
+    Indexing writes one document per ID and a later row overwrites an
+    earlier one, so counting the file's rows would count repeated IDs twice.
+    """
+    ids = pc.cast(table[id_col], pa.string())
+    rows = pa.table({'id': ids, 'row': np.arange(table.num_rows)}).filter(pc.is_valid(ids))
+    last = rows.group_by('id').aggregate([('row', 'max')])['row_max']
+    return table.take(np.sort(last.to_numpy()))
+
+
+def compute_rollups(parquet_filepath, spec, id_col):
+    """Computes the rollup document of one index from its Parquet file with columnar group-bys.
+
+    spec is an entity's ROLLUP_SPEC, mirroring the backend's aggregations:
+    'terms' maps aggregation names to (field, size), 'nested_terms' to
+    (path, inner aggregation name, field, size) for list columns of
+    structs, and 'date_fields' lists the terms fields that are dates.
+    'year' and 'citations' name the columns of the per-university counts;
+    a string year column is read as a yyyy-MM-dd date. Only the needed
+    columns are read, and only the rows indexed as documents (see
+    indexed_rows) are counted.
+    """
+    year_col = spec.get('year')
+    columns = {'university_key', id_col}
+    columns.update(field for field, _ in spec.get('terms', {}).values())
+    columns.update(path for path, _, _, _ in spec.get('nested_terms', {}).values())
+    columns.update(filter(None, [year_col, spec.get('citations')]))
+    table = indexed_rows(pq.read_table(parquet_filepath, columns=sorted(columns)), id_col)
+
+    aggregations = {}
+    for name, (field, size) in spec.get('terms', {}).items():
+        aggregations[name] = terms_buckets(
+            table[field], size, date_field=field in spec.get('date_fields', []))
+    for name, (path, inner, field, size) in spec.get('nested_terms', {}).items():
+        # Every element of the list is one nested document
+        nested = pc.list_flatten(table[path])
+        aggregations[name] = {
+            'doc_count': len(nested),
+            inner: terms_buckets(pc.struct_field(nested, field), size),
+        }
+
+    if year_col and pa.types.is_string(table.schema.field(year_col).type):
+        parsed = pc.strptime(table[year_col], format='%Y-%m-%d', unit='s', error_is_null=True)
+        table = table.append_column('rollup_year', pc.year(parsed))
+        year_col = 'rollup_year'
+    return {
+        'total': table.num_rows,
+        'aggregations': aggregations,
+        'universities': university_rollups(table, year_col, spec.get('citations')),
+    }
+
+
+def create_rollup_index(client):
+    """Creates the summary index unless it exists.
+
+    The pipelines of OpenSearchIndexAll may get here at the same time, so
+    an index created by another one in between counts as created.
+    """
+    if client.indices.exists(index=ROLLUP_INDEX):
+        return
+    try:
+        client.indices.create(index=ROLLUP_INDEX, body={'mappings': ROLLUP_MAPPING})
+    except exceptions.RequestError as e:
+        if e.error != 'resource_already_exists_exception':
+            raise
+
+
+def delete_rollups(client, index_name):
+    """Deletes the rollup document of an index and its JSON copy, if there are any.
+
+    Called whenever the documents of the index change, so the backend never
+    serves counts of older data. Returns True on success.
+    """
+    try:
+        client.delete(index=ROLLUP_INDEX, id=index_name, refresh=True)
+        logging.info(f"Deleted the rollups of '{index_name}' from '{ROLLUP_INDEX}'.")
+    except exceptions.NotFoundError:
+        # No summary index or no document for this index
+        pass
+    except Exception as e:
+        logging.error(
+            f"Failed to delete the rollups of '{index_name}' from '{ROLLUP_INDEX}': {e}", exc_info=True)
+        return False
+    if os.path.exists(rollup_path(index_name)):
+        os.remove(rollup_path(index_name))
+    return True
+
+
+def write_rollups(client, index_name, source_index, parquet_filepath, spec, id_col):
+    """Computes the rollups of an index, writes them to .rollups/<index>.json and to the summary index.
+
+    The document ID is index_name, the name the backend searches (the alias
+    in rebuild mode). Returns True on success.
+    """
+    try:
+        rollups = compute_rollups(parquet_filepath, spec, id_col)
+    except Exception as e:
+        logging.error(
+            f"Failed to compute the rollups of '{index_name}': {e}", exc_info=True)
+        return False
+    document = {
+        'index': index_name,
+        'source_index': source_index,
+        'parquet': parquet_filepath,
+        'built_at': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+        **rollups,
+    }
+
+    os.makedirs(ROLLUP_DIR, exist_ok=True)
+    temp_path = rollup_path(index_name) + '.tmp'
+    with open(temp_path, 'w', encoding='utf-8') as file:
+        json.dump(document, file, indent=2)
+    os.replace(temp_path, rollup_path(index_name))
+
+    try:
+        create_rollup_index(client)
+        client.index(index=ROLLUP_INDEX, id=index_name, body=document, refresh=True)
+    except Exception as e:
+        logging.error(
+            f"Failed to write the rollups of '{index_name}' to '{ROLLUP_INDEX}': {e}", exc_info=True)
+        return False
+    logging.info(
+        f"Rollups of '{index_name}' ({rollups['total']} documents, {len(rollups['universities'])} universities) "
+        f"written to '{ROLLUP_INDEX}' and {rollup_path(index_name)}.")
+    return True
@@ -0,0 +1,296 @@
+import os
+import sys
+import json
+import time
+import logging
+import argparse
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+import requests
+import pyarrow as pa
+import pyarrow.parquet as pq
+from requests.adapters import HTTPAdapter
+from OpenAlexHarvester import TokenBucket, RETRY_STATUSES, REQUEST_TIMEOUT
+from HttpCache import CachingAdapter, request_url, add_cache_arguments, cache_from_args
+
+# Example fetch url: https://api.openaire.eu/graph/v1/projects?relOrganizationId=openorgs____::b8aa0bcfdbbd23a45201d751f16bef7d
+OPENAIRE_PROJECTS_URL = 'https://api.openaire.eu/graph/v1/projects'
+
+# File with the OpenAIRE organization IDs of the partner universities
+OPENAIRE_NAMES_FILE = 'OpenAIRE_names.json'
+
+OUTPUT_FILE = 'university_projects.parquet'
+
+# Largest page size the Graph API allows
+PAGE_SIZE = 100
+
+# Requests in flight at once, across all universities
+DEFAULT_CONCURRENCY = 8
+
+MAX_RETRIES = 5
+RETRY_BACKOFF = 1.0
+
+# Fit the data into a similar structure as with other data fetching with custom university keys
+custom_keys_to_full_names = {
+    'PL_ZUT': 'West Pomeranian University of Technology in Szczecin',
+    'BG_BFU': 'Burgas Free University',
+    'GR_UOP': 'University of Patras',
+    'HR_UNIDU': 'University of Dubrovnik',
+    'SL_EMUNI': 'EMUNI University',
+    'IT_UNISS': 'University of Sassari',
+    'FR_UAG': 'University of the French West Indies',
+    'PT_UAC': 'University of the Azores',
+    'ES_UIB': 'University of the Balearic Islands',
+    'FR_ULHN': 'University Le Havre Normandie',
+    'FO_UF': 'University of the Faroe Islands',
+    'DE_HOCHSTRALSUND': 'Stralsund University of Applied Sciences',
+    'FI_AUAS': 'Åland University of Applied Sciences',
+}
+
+# Explicit schema of the harvested file, in the column order of the API
+# responses, so a page holding only nulls does not change a column's type
+PROJECTS_SCHEMA = pa.schema([
+    ('id', pa.string()),
+    ('code', pa.string()),
+    ('acronym', pa.string()),
+    ('title', pa.string()),
+    ('websiteUrl', pa.string()),
+    ('startDate', pa.string()),
+    ('endDate', pa.string()),
+    ('callIdentifier', pa.string()),
+    ('keywords', pa.string()),
+    ('openAccessMandateForPublications', pa.bool_()),
+    ('openAccessMandateForDataset', pa.bool_()),
+    ('subjects', pa.list_(pa.string())),
+    ('fundings', pa.list_(pa.struct([
+        ('fundingStream', pa.string()),
+        ('jurisdiction', pa.string()),
+        ('name', pa.string()),
+        ('shortName', pa.string()),
+    ]))),
+    ('summary', pa.string()),
+    ('granted', pa.struct([
+        ('currency', pa.string()),
+        ('fundedAmount', pa.float64()),
+        ('totalCost', pa.float64()),
+    ])),
+    ('h2020Programmes', pa.list_(pa.struct([
+        ('code', pa.string()),
+        ('description', pa.string()),
+    ]))),
+    ('university_key', pa.string()),
+])
+
+
+def load_openaire_ids(names_file=OPENAIRE_NAMES_FILE):
+    """Returns university key -> OpenAIRE organization ID, as built by OpenAIREProjects.ipynb."""
+    with open(names_file, 'r', encoding='utf-8') as file:
+        openaire_uni_data = json.load(file)
+
+    uni_openaire_ids = {}
+    for custom_key, full_uni_name in custom_keys_to_full_names.items():
+        if full_uni_name in openaire_uni_data:
+            uni_openaire_ids[custom_key] = openaire_uni_data[full_uni_name]['openaire_id'][0]
+        else:
+            logging.warning(
+                f"{full_uni_name} ({custom_key}) not found in {names_file}. Skipping it.")
+    return uni_openaire_ids
+
+
+def project_record(project, university_key):
+    """Adds the university key to one project.
+
+    The projects index maps fundings.fundingStream as a keyword, so a
+    funding stream object is reduced to its ID.
+    """
+    fundings = []
+    for funding in project.get('fundings') or []:
+        funding_stream = funding.get('fundingStream')
+        if isinstance(funding_stream, dict):
+            funding_stream = funding_stream.get('id')
+        fundings.append({**funding, 'fundingStream': funding_stream})
+    return {**project, 'fundings': fundings or project.get('fundings'), 'university_key': university_key}
+
+
+class OpenAIREHarvester:
+    """Fetches the projects of several universities from the OpenAIRE Graph API.
+
+    All universities run in parallel. Each one fetches its first page to
+    learn numFound, then hands the remaining pages to a shared page pool.
+    A semaphore caps the requests in flight across all universities, and
+    every request goes through one pooled session, optionally backed by a
+    ResponseCache.
+    """
+
+    def __init__(self, concurrency=DEFAULT_CONCURRENCY, page_size=PAGE_SIZE, rate=None,
+                 max_retries=MAX_RETRIES, retry_backoff=RETRY_BACKOFF, session=None, cache=None):
+        self.concurrency = concurrency
+        self.page_size = page_size
+        self.max_retries = max_retries
+        self.retry_backoff = retry_backoff
+        self.limiter = TokenBucket(rate) if rate else None
+        self.cache = cache
+        self._in_flight = threading.BoundedSemaphore(concurrency)
+        self.session = session or requests.Session()
+        adapter = CachingAdapter(cache, pool_connections=1, pool_maxsize=concurrency) if cache \
+            else HTTPAdapter(pool_connections=1, pool_maxsize=concurrency)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+
+    def fetch_page(self, openaire_id, page):
+        """Fetches one page of projects, retrying 429 and 5xx responses with exponential backoff.
+
+        Returns the results and numFound.
+        """
+        params = {'relOrganizationId': openaire_id,
+                  'page': page, 'pageSize': self.page_size}
+
+        for attempt in range(self.max_retries + 1):
+            if self.limiter and not (self.cache and self.cache.has(request_url(OPENAIRE_PROJECTS_URL, params))):
+                self.limiter.acquire()
+            try:
+                with self._in_flight:
+                    response = self.session.get(
+                        OPENAIRE_PROJECTS_URL, params=params, timeout=REQUEST_TIMEOUT)
+            except (requests.ConnectionError, requests.Timeout) as e:
+                if attempt == self.max_retries:
+                    raise
+                delay = self.retry_backoff * 2 ** attempt
+                logging.warning(
+                    f"Request for page {page} of {openaire_id} failed ({e}). Retrying in {delay:.1f}s.")
+                time.sleep(delay)
+                continue
+
+            if response.status_code in RETRY_STATUSES and attempt < self.max_retries:
+                retry_after = response.headers.get('Retry-After')
+                delay = float(retry_after) if retry_after and retry_after.isdigit() \
+                    else self.retry_backoff * 2 ** attempt
+                logging.warning(
+                    f"OpenAIRE answered {response.status_code} for page {page} of {openaire_id}. "
+                    f"Retrying in {delay:.1f}s.")
+                time.sleep(delay)
+                continue
+            response.raise_for_status()
+            data = response.json()
+            return data['results'], int(data['header']['numFound'])
+
+    def iter_pages(self, university_key, openaire_id, page_pool):
+        """Generator yielding the pages of one university in order.
+
+        Pages after the first are submitted to page_pool all at once and
+        yielded as each one in turn completes.
+        """
+        start_time = time.time()
+        projects, number_of_results = self.fetch_page(openaire_id, 1)
+        logging.info(
+            f"API reports {number_of_results} total projects for {university_key}.")
+        yield [project_record(project, university_key) for project in projects]
+
+        # Ceiling division; the first page was already fetched
+        number_of_pages = -(-number_of_results // self.page_size)
+        futures = [page_pool.submit(self.fetch_page, openaire_id, page)
+                   for page in range(2, number_of_pages + 1)]
+        try:
+            for future in futures:
+                projects, _ = future.result()
+                yield [project_record(project, university_key) for project in projects]
+        finally:
+            for future in futures:
+                future.cancel()
+        logging.info(
+            f"Finished {university_key}: {number_of_pages} pages in {time.time() - start_time:.1f}s.")
+
+    def harvest_to_parquet(self, output_file=OUTPUT_FILE, universities=None):
+        """Fetches the projects of all universities in parallel and writes them to one Parquet file.
+
+        Pages are written as row groups as soon as they arrive. The file is
+        written under a temporary name and only replaces output_file when
+        every university succeeded, so a failed run leaves the previous file
+        in place. Returns a dict of university key -> rows written, or None
+        on failure.
+        """
+        universities = universities or load_openaire_ids()
+        temp_path = output_file + '.tmp'
+        writer = pq.ParquetWriter(temp_path, PROJECTS_SCHEMA)
+        write_lock = threading.Lock()
+
+        def harvest_university(university_key, openaire_id):
+            rows = 0
+            for page in self.iter_pages(university_key, openaire_id, page_pool):
+                if page:
+                    table = pa.Table.from_pylist(page, schema=PROJECTS_SCHEMA)
+                    with write_lock:
+                        writer.write_table(table)
+                    rows += len(page)
+            return rows
+
+        results = {}
+        failed = []
+        try:
+            with ThreadPoolExecutor(max_workers=self.concurrency) as page_pool, \
+                    ThreadPoolExecutor(max_workers=len(universities)) as university_pool:
+                futures = {university_pool.submit(harvest_university, key, openaire_id): key
+                           for key, openaire_id in universities.items()}
+                for future in as_completed(futures):
+                    key = futures[future]
+                    try:
+                        results[key] = future.result()
+                    except Exception as e:
+                        failed.append(key)
+                        logging.error(
+                            f"Failed to fetch projects for {key}: {e}", exc_info=True)
+        finally:
+            writer.close()
+
+        if failed:
+            os.remove(temp_path)
+            logging.error(
+                f"Failed universities: {', '.join(failed)}. {output_file} was left unchanged.")
+            return None
+        os.replace(temp_path, output_file)
+        logging.info(
+            f"Successfully saved {sum(results.values())} projects of {len(results)} universities to {output_file}")
+        return results
+
+
+def parse_args(argv=None):
+    """Parses the command line options of the harvester."""
+    parser = argparse.ArgumentParser(
+        description="Fetch the projects of the partner universities from OpenAIRE.")
+    parser.add_argument(
+        '--output', default=OUTPUT_FILE, metavar='FILE',
+        help=f"Parquet file to write (default: {OUTPUT_FILE}).")
+    parser.add_argument(
+        '--universities', nargs='+', choices=list(custom_keys_to_full_names), default=None,
+        help="University keys to fetch (default: all in OpenAIRE_names.json).")
+    parser.add_argument(
+        '--concurrency', type=int, default=DEFAULT_CONCURRENCY,
+        help=f"Requests in flight at once across all universities (default: {DEFAULT_CONCURRENCY}).")
+    parser.add_argument(
+        '--page-size', type=int, default=PAGE_SIZE,
+        help=f"Projects per page (default: {PAGE_SIZE}).")
+    parser.add_argument(
+        '--rate', type=float, default=None,
+        help="Maximum requests per second (default: no limit beyond the concurrency cap).")
+    add_cache_arguments(parser)
+    return parser.parse_args(argv)
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    logging.basicConfig(level=logging.INFO,
+                        format='%(asctime)s - %(levelname)s - %(message)s')
+
+    universities = load_openaire_ids()
+    if args.universities:
+        universities = {key: universities[key]
+                        for key in args.universities if key in universities}
+
+    cache = cache_from_args(args)
+    harvester = OpenAIREHarvester(
+        concurrency=args.concurrency, page_size=args.page_size, rate=args.rate, cache=cache)
+    results = harvester.harvest_to_parquet(args.output, universities)
+    if cache:
+        cache.log_stats()
+    if results is None:
+        sys.exit(1)
@@ -0,0 +1,514 @@
+import os
+import sys
+import time
+import logging
+import argparse
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+import requests
+import pandas as pd
+import pyarrow as pa
+from requests.adapters import HTTPAdapter
+from dotenv import load_dotenv
+from pyalex.api import invert_abstract
+import helpers
+from HarvestWriter import PartitionedParquetWriter, combine_partitions
+from HttpCache import CachingAdapter, request_url, add_cache_arguments, cache_from_args
+
+# Load environment variables from .env file
+load_dotenv()
+
+# Email sent with every request to be served from the polite pool
+OPENALEX_EMAIL = os.getenv('OPENALEX_EMAIL')
+
+# Premium API key, needed for the from_updated_date filter
+OPENALEX_API_KEY = os.getenv('OPENALEX_API_KEY')
+
+OPENALEX_API_URL = 'https://api.openalex.org'
+
+# Largest page size the API allows
+PER_PAGE = 200
+
+# The polite pool allows 10 requests per second per email
+POLITE_POOL_RATE = 10
+
+# Universities fetched at the same time
+DEFAULT_WORKERS = 4
+
+MAX_RETRIES = 5
+RETRY_BACKOFF = 1.0
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+REQUEST_TIMEOUT = 60
+
+universities_ror_url = {
+    # West Pomeranian University of Technology in Szczecin
+    'PL_ZUT': 'https://ror.org/0596m7f19',
+    # Burgas Free University
+    'BG_BFU': 'https://ror.org/02ek1bx64',
+    # University of Patras
+    'GR_UOP': 'https://ror.org/017wvtq80',
+    # University of Dubrovnik
+    'HR_UNIDU': 'https://ror.org/05yptqp13',
+    # University EMUNI
+    'SL_EMUNI': 'https://ror.org/03761pf32',
+    # University of Sassari
+    'IT_UNISS': 'https://ror.org/01bnjbv91',
+    # University of the Antilles
+    'FR_UAG': 'https://ror.org/02ryfmr77',
+    # University of the Azores
+    'PT_UAC': 'https://ror.org/04276xd64',
+    # University of the Balearic Islands
+    'ES_UIB': 'https://ror.org/03e10x626',
+    # University Le Havre Normandie
+    'FR_ULHN': 'https://ror.org/05v509s40',
+    # University of the Faroe Islands
+    'FO_UF': 'https://ror.org/05mwmd090',
+    # Stralsund University of Applied Sciences
+    'DE_HOCHSTRALSUND': 'https://ror.org/04g99jx54',
+    # Åland University of Applied Sciences
+    'FI_AUAS': 'https://ror.org/05mknbx32',
+}
+
+# Just ROR IDs stored in universities_ror_id dictionary
+universities_ror_id = {key: helpers.extract_id_from_url(url)
+                       for key, url in universities_ror_url.items()}
+
+
+def work_record(work):
+    """Extracts the fields kept for one work, in the shape built by OpenAlexWorks.ipynb."""
+    author_names = []
+    institutions_names = []
+
+    for authorship in work.get('authorships', []):
+        author = authorship.get('author')
+        institutions = authorship.get('institutions')
+
+        for inst in institutions:
+            name_to_add = None
+            if inst and inst.get('display_name'):
+                name_to_add = inst['display_name']
+            if name_to_add not in institutions_names:
+                institutions_names.append(name_to_add)
+
+        if author and author.get('display_name'):
+            author_names.append(author['display_name'])
+
+    return {
+        "openalex_id": work.get('id'),
+        "doi": work.get('doi'),
+        "language": work.get('language'),
+        "type": work.get('type'),
+        "title": work.get('title'),
+        "publication_date": work.get('publication_date'),
+        "primary_location": work.get('primary_location'),
+        "open_access": work.get('open_access'),
+        "institutions": institutions_names,
+        "authors": author_names,
+        "cited_by_count": work.get('cited_by_count'),
+        "fwci": work.get('fwci'),
+        "citation_normalized_percentile": work.get('citation_normalized_percentile'),
+        "is_retracted": work.get('is_retracted'),
+        "is_paratext": work.get('is_paratext'),
+        "abstract": invert_abstract(work.get('abstract_inverted_index')),
+        "primary_topic": work.get('primary_topic'),
+        "topics": work.get('topics'),
+        "keywords": work.get('keywords'),
+        "cited_by_api_url": work.get('cited_by_api_url'),
+        "updated_date": work.get('updated_date'),
+        "created_date": work.get('created_date'),
+    }
+
+
+def author_record(author):
+    """Extracts the fields kept for one author, in the shape built by OpenAlexAuthors.ipynb."""
+    return {
+        "id": author.get('id'),
+        "ids": author.get('ids', []),
+        "display_name": author.get('display_name'),
+        "display_name_alternatives": author.get('display_name_alternatives', []),
+        "affiliations": author.get('affiliations', []),
+        "cited_by_count": author.get('cited_by_count'),
+        "last_known_institutions": author.get('last_known_institutions', []),
+        "orcid": author.get('orcid'),
+        "summary_stats": author.get('summary_stats', []),
+        "works_count": author.get('works_count'),
+        "counts_by_year": author.get('counts_by_year', []),
+        "created_date": author.get('created_date'),
+        "updated_date": author.get('updated_date'),
+        # x_concepts will be deprecated soon tho, but it's easier to use than Topics
+        "x_concepts": author.get('x_concepts', []),
+    }
+
+
+def _id_name(*fields):
+    return pa.struct([('id', pa.string()), ('display_name', pa.string()), *fields])
+
+
+TOPIC_TYPE = _id_name(
+    ('score', pa.float64()),
+    ('subfield', _id_name()),
+    ('field', _id_name()),
+    ('domain', _id_name()),
+)
+
+INSTITUTION_TYPE = _id_name(
+    ('ror', pa.string()),
+    ('country_code', pa.string()),
+    ('type', pa.string()),
+    ('lineage', pa.list_(pa.string())),
+)
+
+LOCATION_TYPE = pa.struct([
+    ('is_oa', pa.bool_()),
+    ('landing_page_url', pa.string()),
+    ('pdf_url', pa.string()),
+    ('source', _id_name(
+        ('issn_l', pa.string()),
+        ('type', pa.string()),
+        ('host_organization_name', pa.string()),
+    )),
+    ('license', pa.string()),
+    ('version', pa.string()),
+    ('is_accepted', pa.bool_()),
+    ('is_published', pa.bool_()),
+])
+
+# Explicit schemas of the harvested files, so every university's file has
+# the same column types even when a page happens to hold only nulls
+WORKS_SCHEMA = pa.schema([
+    ('openalex_id', pa.string()),
+    ('doi', pa.string()),
+    ('language', pa.string()),
+    ('type', pa.string()),
+    ('title', pa.string()),
+    ('publication_date', pa.string()),
+    ('primary_location', LOCATION_TYPE),
+    ('open_access', pa.struct([
+        ('is_oa', pa.bool_()),
+        ('oa_status', pa.string()),
+        ('oa_url', pa.string()),
+        ('any_repository_has_fulltext', pa.bool_()),
+    ])),
+    ('institutions', pa.list_(pa.string())),
+    ('authors', pa.list_(pa.string())),
+    ('cited_by_count', pa.int64()),
+    ('fwci', pa.float64()),
+    ('citation_normalized_percentile', pa.struct([
+        ('value', pa.float64()),
+        ('is_in_top_1_percent', pa.bool_()),
+        ('is_in_top_10_percent', pa.bool_()),
+    ])),
+    ('is_retracted', pa.bool_()),
+    ('is_paratext', pa.bool_()),
+    ('abstract', pa.string()),
+    ('primary_topic', TOPIC_TYPE),
+    ('topics', pa.list_(TOPIC_TYPE)),
+    ('keywords', pa.list_(_id_name(('score', pa.float64())))),
+    ('cited_by_api_url', pa.string()),
+    ('updated_date', pa.string()),
+    ('created_date', pa.string()),
+    ('university_key', pa.string()),
+])
+
+AUTHORS_SCHEMA = pa.schema([
+    ('id', pa.string()),
+    ('ids', pa.struct([
+        ('openalex', pa.string()),
+        ('orcid', pa.string()),
+        ('scopus', pa.string()),
+        ('twitter', pa.string()),
+        ('wikipedia', pa.string()),
+    ])),
+    ('display_name', pa.string()),
+    ('display_name_alternatives', pa.list_(pa.string())),
+    ('affiliations', pa.list_(pa.struct([
+        ('institution', INSTITUTION_TYPE),
+        ('years', pa.list_(pa.int64())),
+    ]))),
+    ('cited_by_count', pa.int64()),
+    ('last_known_institutions', pa.list_(INSTITUTION_TYPE)),
+    ('orcid', pa.string()),
+    ('summary_stats', pa.struct([
+        ('2yr_mean_citedness', pa.float64()),
+        ('h_index', pa.int64()),
+        ('i10_index', pa.int64()),
+    ])),
+    ('works_count', pa.int64()),
+    ('counts_by_year', pa.list_(pa.struct([
+        ('year', pa.int64()),
+        ('works_count', pa.int64()),
+        ('cited_by_count', pa.int64()),
+    ]))),
+    ('created_date', pa.string()),
+    ('updated_date', pa.string()),
+    ('x_concepts', pa.list_(pa.struct([
+        ('id', pa.string()),
+        ('wikidata', pa.string()),
+        ('display_name', pa.string()),
+        ('level', pa.int64()),
+        ('score', pa.float64()),
+    ]))),
+    ('university_key', pa.string()),
+])
+
+# API endpoint, institution filter, record builder and file schema of every harvested entity
+ENTITIES = {
+    'works': {'endpoint': 'works', 'ror_filter': 'institutions.ror', 'record': work_record,
+              'schema': WORKS_SCHEMA},
+    'authors': {'endpoint': 'authors', 'ror_filter': 'affiliations.institution.ror', 'record': author_record,
+                'schema': AUTHORS_SCHEMA},
+}
+
+
+class TokenBucket:
+    """Thread-safe token bucket allowing `rate` requests per second with bursts of up to `capacity`."""
+
+    def __init__(self, rate, capacity=None):
+        self.rate = rate
+        self.capacity = capacity or rate
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        """Blocks until a token is available and takes it."""
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens +
+                                  (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait_time = (1 - self.tokens) / self.rate
+            time.sleep(wait_time)
+
+
+class OpenAlexHarvester:
+    """Fetches works or authors of several universities concurrently from the OpenAlex API.
+
+    All workers share one pooled session and one token bucket, so the
+    combined request rate stays within the polite-pool limit however many
+    universities are fetched at once. With a ResponseCache, cached pages
+    are served from disk without waiting for a token.
+    """
+
+    def __init__(self, email=OPENALEX_EMAIL, rate=POLITE_POOL_RATE, workers=DEFAULT_WORKERS,
+                 max_retries=MAX_RETRIES, retry_backoff=RETRY_BACKOFF, session=None, api_key=OPENALEX_API_KEY,
+                 cache=None):
+        self.email = email
+        self.api_key = api_key
+        self.workers = workers
+        self.max_retries = max_retries
+        self.retry_backoff = retry_backoff
+        self.limiter = TokenBucket(rate)
+        self.cache = cache
+        self.session = session or requests.Session()
+        adapter = CachingAdapter(cache, pool_connections=1, pool_maxsize=workers) if cache \
+            else HTTPAdapter(pool_connections=1, pool_maxsize=workers)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+        if not email:
+            logging.warning(
+                "OPENALEX_EMAIL not set. Requests are served from the common pool.")
+
+    def get(self, path, params):
+        """GETs one API page, retrying 429 and 5xx responses with exponential backoff."""
+        params = dict(params)
+        if self.email:
+            params['mailto'] = self.email
+        if self.api_key:
+            params['api_key'] = self.api_key
+
+        url = f"{OPENALEX_API_URL}/{path}"
+        for attempt in range(self.max_retries + 1):
+            if not (self.cache and self.cache.has(request_url(url, params))):
+                self.limiter.acquire()
+            try:
+                response = self.session.get(url, params=params, timeout=REQUEST_TIMEOUT)
+            except (requests.ConnectionError, requests.Timeout) as e:
+                if attempt == self.max_retries:
+                    raise
+                delay = self.retry_backoff * 2 ** attempt
+                logging.warning(
+                    f"Request to {path} failed ({e}). Retrying in {delay:.1f}s.")
+                time.sleep(delay)
+                continue
+
+            if response.status_code in RETRY_STATUSES and attempt < self.max_retries:
+                retry_after = response.headers.get('Retry-After')
+                delay = float(retry_after) if retry_after and retry_after.isdigit() \
+                    else self.retry_backoff * 2 ** attempt
+                logging.warning(
+                    f"OpenAlex answered {response.status_code} for {path}. Retrying in {delay:.1f}s.")
+                time.sleep(delay)
+                continue
+            response.raise_for_status()
+            return response.json()
+
+    def iter_pages(self, entity, ror_id, n_max=None, label=None, filters=None):
+        """Generator yielding one page of records at a time for an institution, using cursor pagination.
+
+        filters adds further API filters, e.g. {'from_updated_date': '2025-01-01'}.
+        """
+        spec = ENTITIES[entity]
+        filter_param = ','.join([f"{spec['ror_filter']}:{ror_id}"] +
+                                [f"{name}:{value}" for name, value in (filters or {}).items()])
+        params = {'filter': filter_param,
+                  'per-page': PER_PAGE, 'cursor': '*'}
+        label = label or ror_id
+        processed_count = 0
+        start_time = time.time()
+
+        while params['cursor']:
+            page = self.get(spec['endpoint'], params)
+            results = page.get('results', [])
+            if n_max is not None:
+                results = results[:n_max - processed_count]
+            if not results:
+                break
+            processed_count += len(results)
+
+            total = page.get('meta', {}).get('count')
+            if n_max is not None and total is not None:
+                total = min(total, n_max)
+            elapsed_time = time.time() - start_time
+            logging.info(
+                f"{label}: {processed_count}/{total} {entity} "
+                f"({processed_count / elapsed_time:.0f}/s, {elapsed_time:.1f}s elapsed)")
+
+            yield [spec['record'](result) for result in results]
+            if n_max is not None and processed_count >= n_max:
+                break
+            params['cursor'] = page.get('meta', {}).get('next_cursor')
+
+    def fetch(self, entity, university_key, ror_id, n_max=None, filters=None):
+        """Fetches all records of one institution into a list."""
+        records = []
+        for page in self.iter_pages(entity, ror_id, n_max, label=university_key, filters=filters):
+            records.extend(page)
+        logging.info(
+            f"Finished {university_key}: {len(records)} {entity}.")
+        return records
+
+    def harvest(self, entity, universities=None, n_max=None, filters=None):
+        """Fetches records for several universities concurrently.
+
+        Returns a dict of university key -> list of records, like the
+        universities_papers / universities_authors dicts of the notebooks.
+        A university that fails is logged and left out. filters is either one
+        dict of extra API filters for all universities, or a callable returning
+        the filters for a university key.
+        """
+        universities = universities or universities_ror_id
+        results = {}
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            futures = {executor.submit(self.fetch, entity, key, ror_id, n_max,
+                                       filters(key) if callable(filters) else filters): key
+                       for key, ror_id in universities.items()}
+            for future in as_completed(futures):
+                key = futures[future]
+                try:
+                    results[key] = future.result()
+                except Exception as e:
+                    logging.error(
+                        f"Failed to fetch {entity} for {key}: {e}", exc_info=True)
+        return results
+
+    def harvest_to_parquet(self, entity, output_dir, universities=None, n_max=None, overwrite=False):
+        """Fetches records for several universities concurrently, writing each page to Parquet as it arrives.
+
+        Every university gets its own file in output_dir once it is complete,
+        so memory stays bounded by one page per worker and finished
+        universities survive a crash. Universities with a file from an earlier
+        run are skipped unless overwrite is set. Returns a dict of university
+        key -> rows written.
+        """
+        universities = universities or universities_ror_id
+        writer = PartitionedParquetWriter(output_dir, ENTITIES[entity]['schema'])
+        pending = {}
+        for key, ror_id in universities.items():
+            if writer.is_complete(key) and not overwrite:
+                logging.info(
+                    f"Skipping {key}: {writer.path(key)} exists from an earlier run.")
+            else:
+                pending[key] = ror_id
+
+        results = {}
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            futures = {executor.submit(writer.write_partition, key,
+                                       self.iter_pages(entity, ror_id, n_max, label=key)): key
+                       for key, ror_id in pending.items()}
+            for future in as_completed(futures):
+                key = futures[future]
+                try:
+                    results[key] = future.result()
+                except Exception as e:
+                    logging.error(
+                        f"Failed to fetch {entity} for {key}: {e}", exc_info=True)
+        return results
+
+
+def to_dataframe(universities_records):
+    """Flattens harvested records into one DataFrame with a university_key column."""
+    all_records = []
+    for university_key, records in universities_records.items():
+        for record in records:
+            all_records.append({**record, 'university_key': university_key})
+    return pd.DataFrame(all_records)
+
+
+def parse_args(argv=None):
+    """Parses the command line options of the harvester."""
+    parser = argparse.ArgumentParser(
+        description="Fetch works or authors of the partner universities from OpenAlex.")
+    parser.add_argument('entity', choices=list(ENTITIES))
+    parser.add_argument(
+        'output_dir', help="Directory receiving one Parquet file per university.")
+    parser.add_argument(
+        '--combine', default=None, metavar='FILE',
+        help="Also concatenate all university files into this single Parquet file.")
+    parser.add_argument(
+        '--overwrite', action='store_true',
+        help="Fetch universities again even if their file exists from an earlier run.")
+    parser.add_argument(
+        '--universities', nargs='+', choices=list(universities_ror_id), default=None,
+        help="University keys to fetch (default: all).")
+    parser.add_argument(
+        '--n-max', type=int, default=None,
+        help="Maximum number of records per university (default: all).")
+    parser.add_argument(
+        '--workers', type=int, default=DEFAULT_WORKERS,
+        help=f"Universities fetched concurrently (default: {DEFAULT_WORKERS}).")
+    parser.add_argument(
+        '--rate', type=float, default=POLITE_POOL_RATE,
+        help=f"Maximum requests per second across all workers (default: {POLITE_POOL_RATE}).")
+    add_cache_arguments(parser)
+    return parser.parse_args(argv)
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    logging.basicConfig(level=logging.INFO,
+                        format='%(asctime)s - %(levelname)s - %(message)s')
+
+    universities = universities_ror_id
+    if args.universities:
+        universities = {key: universities_ror_id[key]
+                        for key in args.universities}
+
+    cache = cache_from_args(args)
+    harvester = OpenAlexHarvester(rate=args.rate, workers=args.workers, cache=cache)
+    harvester.harvest_to_parquet(
+        args.entity, args.output_dir, universities, args.n_max, args.overwrite)
+    if cache:
+        cache.log_stats()
+    failed = [key for key in universities
+              if not os.path.exists(os.path.join(args.output_dir, f"{key}.parquet"))]
+    if failed:
+        logging.error(
+            f"Failed universities: {', '.join(failed)}. Run the same command again to fetch only those.")
+        sys.exit(1)
+    if args.combine:
+        combine_partitions(args.output_dir, args.combine)
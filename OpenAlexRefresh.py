@@ -0,0 +1,220 @@
+import os
+import sys
+import json
+import logging
+import argparse
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
+from OpenAlexHarvester import ENTITIES, OpenAlexHarvester, universities_ror_id
+from DataClean import keep_mask
+
+# Directory holding the updated_date high-water marks of every refreshed file
+HARVEST_STATE_DIR = '.harvest_state'
+
+# ID column of the cleaned Parquet file of every entity
+ID_COLUMNS = {
+    'works': 'openalex_id',
+    'authors': 'id',
+}
+
+
+def state_path(parquet_filepath):
+    """Returns the path of the high-water mark file for a cleaned Parquet file."""
+    parquet_name = os.path.splitext(os.path.basename(parquet_filepath))[0]
+    return os.path.join(HARVEST_STATE_DIR, f"{parquet_name}.json")
+
+
+def high_water_marks_from_parquet(parquet_filepath):
+    """Returns the latest updated_date of every university in a cleaned Parquet file."""
+    table = pq.read_table(parquet_filepath, columns=['university_key', 'updated_date'])
+    grouped = table.group_by('university_key').aggregate([('updated_date', 'max')])
+    return {key: value for key, value in zip(grouped['university_key'].to_pylist(),
+                                              grouped['updated_date_max'].to_pylist())
+            if key is not None and value is not None}
+
+
+def load_high_water_marks(parquet_filepath):
+    """Reads the saved high-water marks, deriving them from the Parquet file on the first refresh."""
+    path = state_path(parquet_filepath)
+    if os.path.exists(path):
+        with open(path, 'r', encoding='utf-8') as file:
+            return json.load(file)
+    logging.info(
+        f"No refresh state at {path}. Using the latest updated_date per university in {parquet_filepath}.")
+    return high_water_marks_from_parquet(parquet_filepath)
+
+
+def save_high_water_marks(parquet_filepath, marks):
+    os.makedirs(HARVEST_STATE_DIR, exist_ok=True)
+    path = state_path(parquet_filepath)
+    temp_path = path + '.tmp'
+    with open(temp_path, 'w', encoding='utf-8') as file:
+        json.dump(marks, file, indent=2, sort_keys=True)
+    os.replace(temp_path, path)
+
+
+def deletes_path(changes_filepath):
+    """Returns the path of the IDs to delete that go with a change set."""
+    return f"{os.path.splitext(changes_filepath)[0]}_deletes.parquet"
+
+
+def _key_column(table, id_col):
+    return pc.binary_join_element_wise(
+        pc.cast(table[id_col], pa.string()), table['university_key'], '|',
+        null_handling='replace', null_replacement='')
+
+
+def merge_changes(parquet_filepath, changes, removed_keys, id_col):
+    """Upserts the change set into the cleaned Parquet file by (ID, university_key), last write wins.
+
+    Rows whose key is in removed_keys are dropped. The file is replaced atomically.
+    """
+    existing = pq.read_table(parquet_filepath)
+    replaced_keys = set(_key_column(changes, id_col).to_pylist()) | removed_keys
+    is_replaced = pc.is_in(_key_column(existing, id_col),
+                           value_set=pa.array(sorted(replaced_keys), pa.string()))
+    kept = existing.filter(pc.invert(is_replaced))
+    # Permissive promotion widens columns the old file typed as null or int
+    merged = pa.concat_tables(
+        [kept.replace_schema_metadata(None), changes], promote_options='permissive')
+
+    temp_path = parquet_filepath + '.tmp'
+    pq.write_table(merged, temp_path)
+    os.replace(temp_path, parquet_filepath)
+    logging.info(
+        f"Merged into {parquet_filepath}: {existing.num_rows - kept.num_rows} rows replaced or removed, "
+        f"{changes.num_rows} written, {merged.num_rows} rows in total.")
+    return merged.num_rows
+
+
+def refresh(entity, parquet_filepath, changes_filepath, universities=None, harvester=None, since=None,
+            deletes_filepath=None):
+    """Fetches records updated since the last refresh and merges them into a cleaned Parquet file.
+
+    The upserted rows are written to changes_filepath and the IDs left
+    without any row (e.g. works that became retracted) to deletes_filepath,
+    <changes>_deletes.parquet by default, for the indexer's --deletes.
+
+    The from_updated_date filter needs an OpenAlex premium API key
+    (OPENALEX_API_KEY). Without one the refresh falls back to
+    from_created_date, which finds new records but not changes to old ones.
+    Returns the number of changed rows, or None on failure.
+    """
+    harvester = harvester or OpenAlexHarvester()
+    universities = universities or universities_ror_id
+    id_col = ID_COLUMNS[entity]
+    marks = load_high_water_marks(parquet_filepath)
+
+    date_filter = 'from_updated_date'
+    if not harvester.api_key:
+        logging.warning(
+            "OPENALEX_API_KEY not set; from_updated_date needs a premium key. "
+            "Falling back to from_created_date, so only new records are picked up.")
+        date_filter = 'from_created_date'
+
+    def filters(key):
+        mark = since or marks.get(key)
+        # Filter by day; records of that day are fetched again and merge as no-ops
+        return {date_filter: mark[:10]} if mark else None
+
+    missing = [key for key in universities if not (since or marks.get(key))]
+    if missing:
+        logging.warning(
+            f"No high-water mark for {', '.join(missing)}; fetching their full history.")
+
+    harvested = harvester.harvest(entity, universities, filters=filters)
+    failed = [key for key in universities if key not in harvested]
+    if failed:
+        logging.error(
+            f"Refresh failed for {', '.join(failed)}. Nothing was merged.")
+        return None
+
+    # Last write wins inside the change set as well
+    latest = {}
+    for university_key, records in harvested.items():
+        for record in records:
+            key = f"{record.get(id_col) or ''}|{university_key}"
+            previous = latest.get(key)
+            if previous is None or (record.get('updated_date') or '') >= (previous.get('updated_date') or ''):
+                latest[key] = {**record, 'university_key': university_key}
+
+    # The cleaning rules of DataClean decide which records are upserted and
+    # which are removed from the cleaned file
+    harvest_schema = ENTITIES[entity]['schema']
+    harvested_table = pa.Table.from_pylist(list(latest.values()), schema=harvest_schema)
+    keep = keep_mask(entity, harvested_table)
+    removed = harvested_table.filter(pc.invert(keep))
+    removed_keys = set(_key_column(removed, id_col).to_pylist())
+    upserts = harvested_table.filter(keep)
+
+    # Columns of the cleaned file, typed by the harvest schema where it has them
+    schema = pa.schema([harvest_schema.field(field.name) if field.name in harvest_schema.names else field
+                        for field in pq.read_schema(parquet_filepath)])
+    changes = pa.Table.from_arrays(
+        [upserts[field.name] if field.name in upserts.column_names else pa.nulls(upserts.num_rows, field.type)
+         for field in schema], schema=schema)
+    pq.write_table(changes, changes_filepath)
+    logging.info(
+        f"Change set: {changes.num_rows} new or updated rows written to {changes_filepath}, "
+        f"{len(removed_keys)} rows to remove.")
+
+    if changes.num_rows or removed_keys:
+        merge_changes(parquet_filepath, changes, removed_keys, id_col)
+
+    # The index holds one document per ID: it is deleted only once no
+    # university has a row of it any more
+    removed_ids = set(pc.cast(removed[id_col], pa.string()).drop_null().to_pylist())
+    if removed_ids:
+        remaining = pc.cast(pq.read_table(parquet_filepath, columns=[id_col])[id_col], pa.string())
+        removed_ids -= set(pc.unique(remaining).to_pylist())
+    deletes_filepath = deletes_filepath or deletes_path(changes_filepath)
+    pq.write_table(pa.table({id_col: pa.array(sorted(removed_ids), pa.string())}), deletes_filepath)
+    logging.info(f"{len(removed_ids)} IDs to delete from the index written to {deletes_filepath}.")
+
+    # Only move the marks forward once the merge is on disk
+    for record in latest.values():
+        key = record['university_key']
+        if record.get('updated_date') and record['updated_date'] > marks.get(key, ''):
+            marks[key] = record['updated_date']
+    save_high_water_marks(parquet_filepath, marks)
+    return changes.num_rows + len(removed_keys)
+
+
+def parse_args(argv=None):
+    """Parses the command line options of the refresh command."""
+    parser = argparse.ArgumentParser(
+        description="Merge OpenAlex records updated since the last refresh into a cleaned Parquet file.")
+    parser.add_argument('entity', choices=list(ENTITIES))
+    parser.add_argument('parquet_filepath', help="Cleaned Parquet file to update in place.")
+    parser.add_argument(
+        '--changes', default=None, metavar='FILE',
+        help="Where to write the change set (default: <parquet>_changes.parquet).")
+    parser.add_argument(
+        '--deletes', default=None, metavar='FILE',
+        help="Where to write the IDs to delete from the index (default: <changes>_deletes.parquet).")
+    parser.add_argument(
+        '--universities', nargs='+', choices=list(universities_ror_id), default=None,
+        help="University keys to refresh (default: all).")
+    parser.add_argument(
+        '--since', default=None, metavar='DATE',
+        help="Ignore the saved high-water marks and fetch records updated since this date (YYYY-MM-DD).")
+    return parser.parse_args(argv)
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    logging.basicConfig(level=logging.INFO,
+                        format='%(asctime)s - %(levelname)s - %(message)s')
+
+    universities = universities_ror_id
+    if args.universities:
+        universities = {key: universities_ror_id[key]
+                        for key in args.universities}
+    changes_filepath = args.changes or \
+        f"{os.path.splitext(args.parquet_filepath)[0]}_changes.parquet"
+
+    changed = refresh(args.entity, args.parquet_filepath,
+                      changes_filepath, universities, since=args.since, deletes_filepath=args.deletes)
+    if changed is None:
+        sys.exit(1)
@@ -0,0 +1,413 @@
+import os
+import sys
+import csv
+import json
+import time
+import random
+import logging
+import argparse
+import resource
+import subprocess
+import tempfile
+import urllib.request
+from itertools import product
+import pyarrow as pa
+import pyarrow.parquet as pq
+import OpenSearchIndexing
+from OpenSearchIndexWorks import define_works_mapping
+from OpenSearchIndexAuthors import define_authors_mapping
+from OpenSearchIndexProjects import define_projects_mapping
+from AdaptiveBulk import AdaptiveBatchController
+from BulkEncoder import OrjsonSerializer
+from IndexMetrics import IndexMetrics
+from OpenSearchStandIn import start_stand_in
+
+# Directory holding the generated Parquet files
+BENCHMARK_DATA_DIR = '.benchmark'
+
+# Rows generated and written per Parquet row group
+GENERATE_CHUNK_ROWS = 10000
+
+# Loader modes a benchmark case can run in
+LOADER_MODES = ['dataframe', 'stream', 'adaptive', 'fast-json']
+
+UNIVERSITY_KEYS = ['agh', 'pw', 'uw', 'uj', 'pwr', 'pg', 'put', 'pl', 'pk', 'ug']
+
+WORDS = (
+    "analysis model data system network learning method energy structure control design process "
+    "performance material surface signal quantum protein cell optimization distributed algorithm "
+    "measurement theory simulation detection transport thermal spectral graph polymer urban policy "
+    "health climate sensor neural image language robust adaptive hybrid dynamic stochastic linear"
+).split()
+
+
+def _words(rng, low, high):
+    return ' '.join(rng.choices(WORDS, k=rng.randint(low, high)))
+
+
+def _date(rng, first_year=1990, last_year=2024):
+    return f"{rng.randint(first_year, last_year)}-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}"
+
+
+def _institution(rng):
+    key = rng.choice(UNIVERSITY_KEYS)
+    return {
+        'id': f"https://openalex.org/I{rng.randint(10**7, 10**8)}",
+        'ror': f"https://ror.org/0{rng.randint(10**7, 10**8)}",
+        'display_name': f"University {key.upper()}",
+        'country_code': 'PL',
+        'type': 'education',
+    }
+
+
+def _topic(rng):
+    def named(prefix, low, high):
+        return {'id': f"https://openalex.org/{prefix}{rng.randint(low, high)}",
+                'display_name': _words(rng, 1, 3).title()}
+    return {
+        **named('T', 10000, 14000),
+        'score': round(rng.random(), 4),
+        'field': named('fields/', 11, 36),
+        'subfield': named('subfields/', 1100, 3600),
+        'domain': named('domains/', 1, 4),
+    }
+
+
+def generate_work(rng, row):
+    """Builds one synthetic work shaped like define_works_mapping."""
+    publication_date = _date(rng)
+    topics = [_topic(rng) for _ in range(rng.randint(1, 3))]
+    return {
+        'university_key': rng.choice(UNIVERSITY_KEYS),
+        'openalex_id': f"https://openalex.org/W{row}",
+        'doi': f"https://doi.org/10.{rng.randint(1000, 9999)}/{row}",
+        'language': rng.choice(['en', 'en', 'en', 'pl']),
+        'type': rng.choice(['article', 'book-chapter', 'preprint', 'dissertation']),
+        'title': _words(rng, 6, 16).capitalize(),
+        'publication_date': publication_date,
+        'publication_year': int(publication_date[:4]),
+        'open_access': {
+            'any_repository_has_fulltext': rng.random() < 0.4,
+            'is_oa': rng.random() < 0.5,
+            'oa_status': rng.choice(['gold', 'green', 'hybrid', 'bronze', 'closed']),
+            'oa_url': f"https://example.org/fulltext/{row}.pdf",
+        },
+        'institutions': [_institution(rng)['display_name'] for _ in range(rng.randint(1, 3))],
+        'authors': [_words(rng, 2, 2).title() for _ in range(rng.randint(1, 8))],
+        'cited_by_count': rng.randint(0, 500),
+        'fwci': round(rng.random() * 5, 3),
+        'citation_normalized_percentile': {
+            'is_in_top_10_percent': rng.random() < 0.1,
+            'is_in_top_1_percent': rng.random() < 0.01,
+            'value': round(rng.random(), 4),
+        },
+        'abstract': _words(rng, 80, 250).capitalize(),
+        'primary_topic': topics[0],
+        'topics': topics,
+        'keywords': [{'id': f"https://openalex.org/keywords/{word}", 'display_name': word,
+                      'score': round(rng.random(), 4)} for word in rng.sample(WORDS, rng.randint(1, 5))],
+        'cited_by_api_url': f"https://api.openalex.org/works?filter=cites:W{row}",
+        'updated_date': f"{_date(rng, 2024, 2025)}T00:00:00.000000",
+        'created_date': _date(rng, 2016, 2024),
+    }
+
+
+def generate_author(rng, row):
+    """Builds one synthetic author shaped like define_authors_mapping."""
+    name = _words(rng, 2, 2).title()
+    orcid = f"https://orcid.org/0000-000{rng.randint(1, 9)}-{rng.randint(1000, 9999)}-{rng.randint(1000, 9999)}"
+    institutions = [_institution(rng) for _ in range(rng.randint(1, 3))]
+    return {
+        'university_key': rng.choice(UNIVERSITY_KEYS),
+        'id': f"https://openalex.org/A{row}",
+        'orcid': orcid,
+        'display_name': name,
+        'display_name_alternatives': [name, name.upper()],
+        'works_count': rng.randint(1, 400),
+        'cited_by_count': rng.randint(0, 20000),
+        'ids': {
+            'openalex': f"https://openalex.org/A{row}",
+            'orcid': orcid,
+            'scopus': f"http://www.scopus.com/inward/authorDetails.url?authorID={rng.randint(10**9, 10**10)}",
+            'twitter': None,
+        },
+        'last_known_institutions': institutions[:1],
+        'affiliations': [{'years': sorted(rng.sample(range(2000, 2025), rng.randint(1, 6))),
+                          'institution': institution} for institution in institutions],
+        'summary_stats': {
+            '2yr_mean_citedness': round(rng.random() * 10, 3),
+            'h_index': rng.randint(0, 60),
+            'i10_index': rng.randint(0, 150),
+        },
+        'counts_by_year': [{'year': year, 'works_count': rng.randint(0, 20), 'cited_by_count': rng.randint(0, 900)}
+                           for year in range(2012, 2025)],
+        'x_concepts': [{'id': f"https://openalex.org/C{rng.randint(10**6, 10**8)}",
+                        'wikidata': f"https://www.wikidata.org/wiki/Q{rng.randint(10**3, 10**7)}",
+                        'display_name': _words(rng, 1, 2).title(), 'level': rng.randint(0, 3),
+                        'score': round(rng.random() * 100, 1)} for _ in range(rng.randint(3, 15))],
+        'created_date': _date(rng, 2016, 2024),
+        'updated_date': f"{_date(rng, 2024, 2025)}T00:00:00.000000",
+    }
+
+
+def generate_project(rng, row):
+    """Builds one synthetic project shaped like define_projects_mapping."""
+    start_year = rng.randint(2005, 2024)
+    return {
+        'id': f"corda__h2020::{row:032x}",
+        'code': str(rng.randint(100000, 999999)),
+        'acronym': ''.join(rng.choices('ABCDEFGHIJKLMNOPQRSTUVWXYZ', k=rng.randint(3, 8))),
+        'title': _words(rng, 5, 14).capitalize(),
+        'startDate': f"{start_year}-{rng.randint(1, 12):02d}-01",
+        'endDate': f"{start_year + rng.randint(1, 5)}-{rng.randint(1, 12):02d}-28",
+        'callIdentifier': f"H2020-{rng.choice(['MSCA', 'ERC', 'SC5', 'ICT'])}-{start_year}",
+        'openAccessMandateForPublications': rng.random() < 0.8,
+        'openAccessMandateForDataset': rng.random() < 0.3,
+        'subjects': [_words(rng, 1, 3) for _ in range(rng.randint(0, 3))],
+        'fundings': [{'jurisdiction': 'EU', 'name': 'European Commission', 'shortName': 'EC'}],
+        'summary': _words(rng, 100, 300).capitalize(),
+        'granted': {'currency': 'EUR', 'fundedAmount': round(rng.random() * 2e6, 2),
+                    'totalCost': round(rng.random() * 3e6, 2)},
+        'university_key': rng.choice(UNIVERSITY_KEYS),
+    }
+
+
+# Generator, mapping and ID column of every entity the benchmark can load
+ENTITIES = {
+    'works': {'generate': generate_work, 'mapping': define_works_mapping, 'id_col': 'openalex_id'},
+    'authors': {'generate': generate_author, 'mapping': define_authors_mapping, 'id_col': 'id'},
+    'projects': {'generate': generate_project, 'mapping': define_projects_mapping, 'id_col': 'id'},
+}
+
+
+def synthetic_parquet_path(entity, rows, data_dir=BENCHMARK_DATA_DIR):
+    """Returns the path of the generated Parquet file for an entity and row count."""
+    return os.path.join(data_dir, f"{entity}_{rows}.parquet")
+
+
+def generate_synthetic_parquet(entity, rows, data_dir=BENCHMARK_DATA_DIR, seed=42):
+    """Writes a reproducible synthetic Parquet file, reusing it if it already exists."""
+    path = synthetic_parquet_path(entity, rows, data_dir)
+    if os.path.exists(path):
+        logging.info(f"Reusing synthetic data {path}.")
+        return path
+
+    os.makedirs(data_dir, exist_ok=True)
+    generate = ENTITIES[entity]['generate']
+    rng = random.Random(seed)
+    temp_path = path + '.tmp'
+    writer = None
+    start = time.perf_counter()
+    try:
+        for chunk_start in range(0, rows, GENERATE_CHUNK_ROWS):
+            chunk_rows = range(chunk_start, min(rows, chunk_start + GENERATE_CHUNK_ROWS))
+            records = [generate(rng, row) for row in chunk_rows]
+            # Later chunks reuse the schema inferred from the first one
+            table = pa.Table.from_pylist(
+                records, schema=writer.schema if writer is not None else None)
+            if writer is None:
+                writer = pq.ParquetWriter(temp_path, table.schema)
+            writer.write_table(table)
+    finally:
+        if writer is not None:
+            writer.close()
+    os.replace(temp_path, path)
+    logging.info(
+        f"Generated {rows} synthetic {entity} rows in {path} "
+        f"({os.path.getsize(path) / 1024 / 1024:.1f} MiB, {time.perf_counter() - start:.1f}s).")
+    return path
+
+
+def run_case(case):
+    """Runs one benchmark case in the current process and returns its measurements.
+
+    Called in a fresh subprocess per case, so peak RSS belongs to that case only.
+    """
+    mode = case['mode']
+    stream = mode != 'dataframe'
+    fast_json = mode == 'fast-json'
+    OpenSearchIndexing.BULK_OPTIONS['chunk_size'] = case['chunk_size']
+    entity = ENTITIES[case['entity']]
+    index_name = f"benchmark_{case['entity']}"
+    metrics = IndexMetrics(index_name)
+
+    with metrics.stage('connect'):
+        client = OpenSearchIndexing.create_opensearch_client(
+            pool_maxsize=max(case['workers'], 10),
+            serializer=OrjsonSerializer() if fast_json else None,
+            metrics=metrics)
+    if not client:
+        return {'success': False, 'metrics': metrics.summary()}
+
+    with metrics.stage('create_index'):
+        OpenSearchIndexing.create_opensearch_index(client, index_name, entity['mapping']())
+
+    with metrics.stage('load'):
+        if stream:
+            data = OpenSearchIndexing.open_parquet_stream(case['parquet'])
+        else:
+            data = OpenSearchIndexing.load_from_parquet(case['parquet'])
+
+    controller = None
+    if mode == 'adaptive':
+        controller = AdaptiveBatchController(initial_docs=case['chunk_size'])
+    elif fast_json:
+        controller = AdaptiveBatchController(
+            initial_docs=case['chunk_size'], min_docs=case['chunk_size'], max_docs=case['chunk_size'])
+
+    with metrics.stage('index'):
+        if stream:
+            success = OpenSearchIndexing.index_parquet_stream_to_opensearch(
+                client, data, index_name, entity['id_col'], case['batch_size'], case['workers'],
+                controller=controller, pre_encode=fast_json, metrics=metrics)
+        else:
+            success = OpenSearchIndexing.index_data_to_opensearch(
+                client, data, index_name, entity['id_col'], case['workers'], controller=controller,
+                metrics=metrics)
+
+    return {
+        'success': success,
+        'metrics': metrics.summary(),
+        # ru_maxrss is reported in KiB on Linux
+        'peak_rss_mb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+    }
+
+
+def _stand_in_request(port, method, path):
+    request = urllib.request.Request(f"http://127.0.0.1:{port}{path}", method=method)
+    with urllib.request.urlopen(request) as response:
+        return json.loads(response.read())
+
+
+def run_benchmark(entities, row_counts, chunk_sizes, worker_counts, modes, latency=0.0, reject_rate=0.0,
+                  batch_size=OpenSearchIndexing.STREAM_BATCH_SIZE, repeat=1, data_dir=BENCHMARK_DATA_DIR):
+    """Runs every combination of the swept parameters against a local stand-in and returns one result per run."""
+    server = start_stand_in(latency=latency, reject_rate=reject_rate)
+    port = server.server_address[1]
+    # The cases connect to the stand-in through the usual environment variables
+    env = dict(os.environ, OPENSEARCH_HOST='127.0.0.1', OPENSEARCH_PORT=str(port), OPENSEARCH_SCHEME='http',
+               OPENSEARCH_USER='', OPENSEARCH_PASSWORD='')
+
+    results = []
+    try:
+        for entity, rows in product(entities, row_counts):
+            parquet_path = generate_synthetic_parquet(entity, rows, data_dir)
+            for chunk_size, workers, mode, run in product(chunk_sizes, worker_counts, modes, range(repeat)):
+                case = {'entity': entity, 'rows': rows, 'chunk_size': chunk_size, 'workers': workers,
+                        'mode': mode, 'batch_size': batch_size, 'parquet': parquet_path}
+                logging.info(f"Benchmark case: {case} (run {run + 1}/{repeat})")
+                _stand_in_request(port, 'POST', '/_standin/reset')
+
+                with tempfile.NamedTemporaryFile(suffix='.json', delete=False) as result_file:
+                    result_path = result_file.name
+                try:
+                    wall_start = time.perf_counter()
+                    process = subprocess.run(
+                        [sys.executable, os.path.abspath(__file__), 'case', json.dumps(case), result_path],
+                        env=env)
+                    wall_time = time.perf_counter() - wall_start
+                    with open(result_path, 'r', encoding='utf-8') as file:
+                        measured = json.load(file) if process.returncode == 0 else {'success': False}
+                finally:
+                    os.remove(result_path)
+
+                stats = _stand_in_request(port, 'GET', '/_standin/stats')
+                case_metrics = measured.get('metrics', {})
+                index_time = case_metrics.get('stages_seconds', {}).get('index')
+                result = {
+                    **{key: value for key, value in case.items() if key != 'parquet'},
+                    'run': run + 1,
+                    'success': measured.get('success', False),
+                    'wall_s': round(wall_time, 3),
+                    **{f"{stage}_s": seconds for stage, seconds in case_metrics.get('stages_seconds', {}).items()},
+                    **{f"{component}_s": seconds
+                       for component, seconds in case_metrics.get('components_seconds', {}).items()},
+                    'docs_per_s': round(rows / index_time, 1) if index_time else None,
+                    'mb_per_s': round(stats['bulk_bytes'] / 1024 / 1024 / index_time, 2) if index_time else None,
+                    'peak_rss_mb': round(measured['peak_rss_mb'], 1) if 'peak_rss_mb' in measured else None,
+                    'bulk_requests': stats['bulk_requests'],
+                    'bulk_mb_sent': round(stats['bulk_bytes'] / 1024 / 1024, 2),
+                    'rejected': stats['rejected'],
+                    'took_p95_ms': case_metrics.get('took_ms', {}).get('p95'),
+                    'bound_by': case_metrics.get('bound_by'),
+                }
+                logging.info(
+                    f"Result: {result['docs_per_s']} docs/s, {result['mb_per_s']} MB/s, "
+                    f"peak RSS {result['peak_rss_mb']} MiB, success {result['success']}.")
+                results.append(result)
+    finally:
+        server.shutdown()
+    return results
+
+
+def write_report(results, report_path):
+    """Writes benchmark results as JSON, or as CSV when the path ends with .csv."""
+    if report_path.endswith('.csv'):
+        columns = []
+        for result in results:
+            columns.extend(key for key in result if key not in columns)
+        with open(report_path, 'w', newline='', encoding='utf-8') as file:
+            writer = csv.DictWriter(file, fieldnames=columns)
+            writer.writeheader()
+            writer.writerows(results)
+    else:
+        with open(report_path, 'w', encoding='utf-8') as file:
+            json.dump(results, file, indent=2)
+    logging.info(f"Benchmark report with {len(results)} runs written to {report_path}.")
+
+
+def parse_args(argv=None):
+    """Parses the command line options of the benchmark commands."""
+    parser = argparse.ArgumentParser(
+        description="Benchmark the OpenSearch loader offline against a local stand-in server.")
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    generate_parser = commands.add_parser(
+        'generate', help="Generate synthetic Parquet files.")
+    generate_parser.add_argument('--entities', nargs='+', choices=list(ENTITIES), default=list(ENTITIES))
+    generate_parser.add_argument('--rows', nargs='+', type=int, default=[10000])
+    generate_parser.add_argument('--data-dir', default=BENCHMARK_DATA_DIR)
+
+    run_parser = commands.add_parser(
+        'run', help="Sweep loader settings and write a report.")
+    run_parser.add_argument('--entities', nargs='+', choices=list(ENTITIES), default=['works'])
+    run_parser.add_argument('--rows', nargs='+', type=int, default=[10000],
+                            help="Synthetic row counts, e.g. 10000 100000 1000000 (default: 10000).")
+    run_parser.add_argument('--chunk-sizes', nargs='+', type=int, default=[500])
+    run_parser.add_argument('--workers', nargs='+', type=int, default=[1])
+    run_parser.add_argument('--modes', nargs='+', choices=LOADER_MODES, default=['stream'])
+    run_parser.add_argument('--batch-size', type=int, default=OpenSearchIndexing.STREAM_BATCH_SIZE)
+    run_parser.add_argument('--latency', type=float, default=0.0,
+                            help="Seconds the stand-in adds to every _bulk request (default: 0).")
+    run_parser.add_argument('--reject-rate', type=float, default=0.0,
+                            help="Fraction of bulk operations the stand-in answers with 429 (default: 0).")
+    run_parser.add_argument('--repeat', type=int, default=1)
+    run_parser.add_argument('--data-dir', default=BENCHMARK_DATA_DIR)
+    run_parser.add_argument('--report', default='benchmark_report.json',
+                            help="Report path; a .csv extension writes CSV (default: benchmark_report.json).")
+
+    # Internal: runs a single case in a child process
+    case_parser = commands.add_parser('case')
+    case_parser.add_argument('case')
+    case_parser.add_argument('result_path')
+    return parser.parse_args(argv)
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    if args.command == 'generate':
+        for entity, rows in product(args.entities, args.rows):
+            generate_synthetic_parquet(entity, rows, args.data_dir)
+    elif args.command == 'run':
+        results = run_benchmark(
+            args.entities, args.rows, args.chunk_sizes, args.workers, args.modes, args.latency,
+            args.reject_rate, args.batch_size, args.repeat, args.data_dir)
+        write_report(results, args.report)
+        if not all(result['success'] for result in results):
+            sys.exit(1)
+    else:
+        # Keep the per-document progress logs of the loader out of the measurement
+        logging.getLogger().setLevel(logging.WARNING)
+        measured = run_case(json.loads(args.case))
+        with open(args.result_path, 'w', encoding='utf-8') as file:
+            json.dump(measured, file)
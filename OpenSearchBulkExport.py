@@ -0,0 +1,281 @@
+import os
+import sys
+import gzip
+import json
+import hashlib
+import logging
+import argparse
+from datetime import datetime, timezone
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from dotenv import load_dotenv
+import OpenSearchIndexing
+from OpenSearchIndexAll import ENTITY_SPECS
+from AdaptiveBulk import AdaptiveBatchController, send_adaptive_chunk
+from IndexProfiles import DEFAULT_PROFILE, PROFILES, index_body
+
+# Load environment variables from .env file
+load_dotenv()
+
+# Uncompressed size of one shard. One shard is sent as one _bulk request, so
+# this must stay below the cluster's http.max_content_length (100MB default)
+DEFAULT_SHARD_BYTES = 10 * 1024 * 1024
+
+MANIFEST_FILE = 'manifest.json'
+
+
+def _shard_name(shard_number):
+    return f"shard-{shard_number:05d}.ndjson.gz"
+
+
+def _sha256(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as file:
+        for block in iter(lambda: file.read(1024 * 1024), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def entity_index_body(entity, profile=DEFAULT_PROFILE):
+    """Returns the (mappings, settings) the pipeline creates an entity's index with."""
+    spec = next(spec for spec in ENTITY_SPECS if spec['name'] == entity)
+    return index_body(spec['mapping'](), spec['search_profile'] if profile == 'search' else None)
+
+
+def export_bulk_shards(parquet_filepath, index_name, id_col, output_dir, max_shard_bytes=DEFAULT_SHARD_BYTES,
+                       batch_size=OpenSearchIndexing.STREAM_BATCH_SIZE, entity=None, profile=DEFAULT_PROFILE):
+    """Converts a Parquet file into size-capped, gzip-compressed _bulk NDJSON shards.
+
+    Every shard is a complete _bulk request body. A manifest.json next to the
+    shards lists the document count, sizes and checksum of each shard, and
+    with an entity the mappings and settings the index is created with on
+    load.
+    """
+    parquet_file = OpenSearchIndexing.open_parquet_stream(parquet_filepath)
+    if parquet_file is None:
+        return None
+
+    os.makedirs(output_dir, exist_ok=True)
+    shards = []
+    shard_file = None
+    shard_docs = 0
+    shard_bytes = 0
+
+    def close_shard():
+        shard_file.close()
+        path = os.path.join(output_dir, _shard_name(len(shards)))
+        shards.append({
+            'file': os.path.basename(path),
+            'docs': shard_docs,
+            'bytes': shard_bytes,
+            'compressed_bytes': os.path.getsize(path),
+            'sha256': _sha256(path),
+        })
+        logging.info(
+            f"Wrote {path}: {shard_docs} docs, {shard_bytes / 1024 / 1024:.1f} MiB uncompressed.")
+
+    actions = OpenSearchIndexing.generate_bulk_actions_from_parquet(
+        parquet_file, index_name, id_col, batch_size, pre_encode=True)
+    for action in actions:
+        encoded = action['_encoded']
+        if shard_file is not None and shard_bytes + len(encoded) > max_shard_bytes:
+            close_shard()
+            shard_file = None
+        if shard_file is None:
+            shard_file = gzip.open(os.path.join(
+                output_dir, _shard_name(len(shards))), 'wb')
+            shard_docs = 0
+            shard_bytes = 0
+        shard_file.write(encoded)
+        shard_docs += 1
+        shard_bytes += len(encoded)
+    if shard_file is not None:
+        close_shard()
+
+    manifest = {
+        'index': index_name,
+        'id_col': id_col,
+        'parquet': parquet_filepath,
+        'created': datetime.now(timezone.utc).isoformat(),
+        'max_shard_bytes': max_shard_bytes,
+        'total_docs': sum(shard['docs'] for shard in shards),
+        'total_bytes': sum(shard['bytes'] for shard in shards),
+        'shards': shards,
+    }
+    if entity is not None:
+        manifest['entity'] = entity
+        manifest['profile'] = profile
+        manifest['mappings'], manifest['settings'] = entity_index_body(entity, profile)
+    with open(os.path.join(output_dir, MANIFEST_FILE), 'w', encoding='utf-8') as file:
+        json.dump(manifest, file, indent=2)
+    logging.info(
+        f"Exported {manifest['total_docs']} documents for '{index_name}' into {len(shards)} shards in {output_dir}.")
+    return manifest
+
+
+def _read_shard_pairs(path):
+    """Reads a shard back as a list of encoded action/source line pairs."""
+    with gzip.open(path, 'rb') as file:
+        lines = file.read().rstrip(b'\n').split(b'\n')
+    return [lines[i] + b'\n' + lines[i + 1] + b'\n' for i in range(0, len(lines), 2)]
+
+
+def verify_shards(shard_dir, manifest):
+    """Checks that every shard of the manifest exists and matches its checksum. Returns True if all do."""
+    valid = True
+    for shard in manifest['shards']:
+        path = os.path.join(shard_dir, shard['file'])
+        if not os.path.exists(path):
+            logging.error(f"Shard {path} is missing.")
+            valid = False
+        elif _sha256(path) != shard['sha256']:
+            logging.error(f"Checksum mismatch for {path}.")
+            valid = False
+    return valid
+
+
+def prepare_index(client, manifest):
+    """Creates the target index with the mappings recorded in the manifest, unless it exists.
+
+    Without recorded mappings the index must already exist: sending the
+    shards would otherwise create it with dynamic mappings.
+    """
+    index_name = manifest['index']
+    if 'mappings' in manifest:
+        return OpenSearchIndexing.create_opensearch_index(
+            client, index_name, manifest['mappings'], manifest.get('settings'))
+    try:
+        if client.indices.exists(index=index_name):
+            return True
+    except Exception as e:
+        logging.error(f"Failed to check whether index '{index_name}' exists: {e}", exc_info=True)
+        return False
+    logging.error(
+        f"Index '{index_name}' does not exist and the manifest records no mapping. Create it first "
+        f"(e.g. with the indexing script) or export with --entity.")
+    return False
+
+
+def _load_shard(client, shard_dir, shard, controller):
+    path = os.path.join(shard_dir, shard['file'])
+    pairs = _read_shard_pairs(path)
+    if len(pairs) != shard['docs']:
+        raise ValueError(
+            f"{path} holds {len(pairs)} documents, manifest says {shard['docs']}")
+    results = send_adaptive_chunk(
+        client, pairs, controller,
+        max_retries=OpenSearchIndexing.BULK_OPTIONS['max_retries'],
+        initial_backoff=OpenSearchIndexing.BULK_OPTIONS['initial_backoff'],
+        max_backoff=OpenSearchIndexing.BULK_OPTIONS['max_backoff'],
+        request_timeout=OpenSearchIndexing.BULK_OPTIONS['request_timeout'])
+    return sum(1 for ok, _ in results if ok), [info for ok, info in results if not ok]
+
+
+def load_bulk_shards(client, shard_dir, workers=4):
+    """Sends exported shards to OpenSearch with several workers and checks the counts against the manifest.
+
+    Nothing is sent unless every shard matches its checksum and the index
+    exists or can be created with the mappings of the manifest.
+    """
+    with open(os.path.join(shard_dir, MANIFEST_FILE), 'r', encoding='utf-8') as file:
+        manifest = json.load(file)
+    index_name = manifest['index']
+    if not verify_shards(shard_dir, manifest) or not prepare_index(client, manifest):
+        logging.error(f"Not loading {shard_dir} into '{index_name}'.")
+        return False
+    logging.info(
+        f"Loading {len(manifest['shards'])} shards ({manifest['total_docs']} docs) into '{index_name}' "
+        f"with {workers} workers...")
+
+    # One shard is one request; the controller only tracks retries and stats
+    controller = AdaptiveBatchController(
+        min_docs=1, max_docs=sys.maxsize, max_bytes=sys.maxsize)
+    success_count = 0
+    failed_count = 0
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = {executor.submit(_load_shard, client, shard_dir, shard, controller): shard
+                   for shard in manifest['shards']}
+        for future in as_completed(futures):
+            shard = futures[future]
+            try:
+                shard_success, shard_failures = future.result()
+            except Exception as e:
+                logging.error(
+                    f"Failed to load {shard['file']}: {e}", exc_info=True)
+                failed_count += shard['docs']
+                continue
+            success_count += shard_success
+            failed_count += len(shard_failures)
+            for info in shard_failures[:5]:
+                logging.error(
+                    f"Failed to index document from {shard['file']}: {info}")
+            logging.info(
+                f"Loaded {shard['file']}: {shard_success} ok, {len(shard_failures)} failed.")
+
+    logging.info(
+        f"Loaded {success_count} of {manifest['total_docs']} documents, {failed_count} failed "
+        f"({controller.requests} requests, {controller.rejections} rejected documents retried).")
+    if success_count > 0:
+        try:
+            client.indices.refresh(index=index_name)
+            logging.info(f"Index '{index_name}' refreshed.")
+        except Exception as e:
+            logging.error(f"Error refreshing index '{index_name}': {e}")
+    return failed_count == 0 and success_count == manifest['total_docs']
+
+
+def parse_args(argv=None):
+    """Parses the command line options of the export and load commands."""
+    parser = argparse.ArgumentParser(
+        description="Export Parquet files to compressed _bulk shards, or load such shards into OpenSearch.")
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    export_parser = commands.add_parser(
+        'export', help="Convert a Parquet file into gzip-compressed _bulk NDJSON shards.")
+    export_parser.add_argument('parquet_filepath')
+    export_parser.add_argument('index_name')
+    export_parser.add_argument('id_col')
+    export_parser.add_argument('output_dir')
+    export_parser.add_argument(
+        '--shard-mb', type=float, default=DEFAULT_SHARD_BYTES / 1024 / 1024,
+        help=f"Uncompressed size cap of one shard in MiB (default: {DEFAULT_SHARD_BYTES // 1024 // 1024}).")
+    export_parser.add_argument(
+        '--entity', choices=[spec['name'] for spec in ENTITY_SPECS], default=None,
+        help="Entity whose mapping is recorded for creating the index on load "
+             "(default: the entity indexed under index_name, if any).")
+    export_parser.add_argument(
+        '--profile', choices=PROFILES, default=DEFAULT_PROFILE,
+        help="Settings profile of the recorded index settings (default: default).")
+    export_parser.add_argument(
+        '--batch-size', type=int, default=OpenSearchIndexing.STREAM_BATCH_SIZE,
+        help=f"Rows per Parquet record batch (default: {OpenSearchIndexing.STREAM_BATCH_SIZE}).")
+
+    load_parser = commands.add_parser(
+        'load', help="Send exported shards to OpenSearch.")
+    load_parser.add_argument('shard_dir')
+    load_parser.add_argument(
+        '--workers', type=int, default=4,
+        help="Number of shards sent concurrently (default: 4).")
+    return parser.parse_args(argv)
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    if args.command == 'export':
+        entity = args.entity or next(
+            (spec['name'] for spec in ENTITY_SPECS if spec['index'] == args.index_name), None)
+        if entity is None:
+            logging.warning(
+                f"No entity is indexed under '{args.index_name}' and --entity is not set; the manifest "
+                f"records no mapping, so the index must exist before loading.")
+        manifest = export_bulk_shards(
+            args.parquet_filepath, args.index_name, args.id_col, args.output_dir,
+            int(args.shard_mb * 1024 * 1024), args.batch_size, entity, args.profile)
+        if manifest is None:
+            sys.exit(1)
+    else:
+        client = OpenSearchIndexing.create_opensearch_client(
+            pool_maxsize=max(args.workers, 10))
+        if not client:
+            sys.exit(1)
+        if not load_bulk_shards(client, args.shard_dir, args.workers):
+            sys.exit(1)
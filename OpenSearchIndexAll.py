@@ -0,0 +1,164 @@
+import sys
+import json
+import time
+import logging
+import argparse
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from dotenv import load_dotenv
+import OpenSearchIndexing
+import OpenSearchIndexWorks
+import OpenSearchIndexAuthors
+import OpenSearchIndexProjects
+from BulkEncoder import OrjsonSerializer
+from IndexMetrics import IndexMetrics
+
+# Load environment variables from .env file
+load_dotenv()
+
+# Bulk requests in flight at once across all indexes
+DEFAULT_MAX_IN_FLIGHT = 8
+
+# Bulk requests each index keeps in flight, within the global limit
+DEFAULT_WORKERS = 4
+
+# Indexes built by a full run: Parquet file, index name, mapping, search
+# profile, rollup spec and ID column
+ENTITY_SPECS = [
+    {
+        'name': 'works',
+        'parquet': OpenSearchIndexWorks.PARQUET_FILE_PATH,
+        'index': OpenSearchIndexWorks.INDEX_NAME,
+        'mapping': OpenSearchIndexWorks.define_works_mapping,
+        'search_profile': OpenSearchIndexWorks.SEARCH_PROFILE,
+        'rollup_spec': OpenSearchIndexWorks.ROLLUP_SPEC,
+        'id_col': 'openalex_id',
+    },
+    {
+        'name': 'authors',
+        'parquet': OpenSearchIndexAuthors.PARQUET_FILE_PATH,
+        'index': OpenSearchIndexAuthors.INDEX_NAME,
+        'mapping': OpenSearchIndexAuthors.define_authors_mapping,
+        'search_profile': OpenSearchIndexAuthors.SEARCH_PROFILE,
+        'rollup_spec': OpenSearchIndexAuthors.ROLLUP_SPEC,
+        'id_col': 'id',
+    },
+    {
+        'name': 'projects',
+        'parquet': OpenSearchIndexProjects.PARQUET_FILE_PATH,
+        'index': OpenSearchIndexProjects.INDEX_NAME,
+        'mapping': OpenSearchIndexProjects.define_projects_mapping,
+        'search_profile': OpenSearchIndexProjects.SEARCH_PROFILE,
+        'rollup_spec': OpenSearchIndexProjects.ROLLUP_SPEC,
+        'id_col': 'id',
+    },
+]
+
+
+def _failed_result(spec, failed_stage, error=None):
+    return {'name': spec['name'], 'index': spec['index'], 'parquet': spec['parquet'], 'success': False,
+            'failed_stage': failed_stage, 'error': error, 'docs_success': 0, 'docs_failed': 0,
+            'dead_letters': 0}
+
+
+def run_all(specs=ENTITY_SPECS, max_in_flight=DEFAULT_MAX_IN_FLIGHT, workers=DEFAULT_WORKERS, fast_json=False,
+            **options):
+    """Builds several indexes concurrently over one shared client and returns a combined report.
+
+    Every index runs its own pipeline in a thread. They share the client's
+    connection pool, and its transport lets at most max_in_flight _bulk
+    requests through at once, however many workers each index uses. Client
+    serialization and the bulk requests themselves are recorded in the
+    report's 'transport' metrics; stage timings and document counts are
+    reported per index.
+    """
+    start = time.perf_counter()
+    transport_metrics = IndexMetrics('all')
+    client = OpenSearchIndexing.create_opensearch_client(
+        pool_maxsize=max(max_in_flight, 10),
+        serializer=OrjsonSerializer() if fast_json else None,
+        metrics=transport_metrics,
+        max_in_flight=max_in_flight)
+
+    results = []
+    if client is None:
+        results = [_failed_result(spec, 'connect') for spec in specs]
+    else:
+        with ThreadPoolExecutor(max_workers=len(specs)) as executor:
+            futures = {executor.submit(OpenSearchIndexing.run_pipeline, client, spec['parquet'], spec['index'],
+                                       spec['mapping'](), spec['id_col'], workers=workers, fast_json=fast_json,
+                                       search_profile=spec['search_profile'], rollup_spec=spec['rollup_spec'],
+                                       **options): spec
+                       for spec in specs}
+            for future in as_completed(futures):
+                spec = futures[future]
+                try:
+                    results.append({'name': spec['name'], **future.result()})
+                except Exception as e:
+                    logging.error(
+                        f"Pipeline for '{spec['index']}' crashed: {e}", exc_info=True)
+                    results.append(_failed_result(spec, 'crashed', str(e)))
+
+    order = [spec['name'] for spec in specs]
+    results.sort(key=lambda result: order.index(result['name']))
+    return {
+        'success': all(result['success'] for result in results),
+        'seconds': round(time.perf_counter() - start, 3),
+        'max_in_flight': max_in_flight,
+        'workers_per_index': workers,
+        'docs_success': sum(result['docs_success'] for result in results),
+        'docs_failed': sum(result['docs_failed'] for result in results),
+        'indexes': results,
+        'transport': transport_metrics.summary(),
+    }
+
+
+def log_report(report):
+    """Logs one line per index and a total."""
+    for result in report['indexes']:
+        status = 'ok' if result['success'] else f"FAILED at {result['failed_stage']}"
+        logging.info(
+            f"{result['name']:<9} {result['index']}: {status}, {result['docs_success']} indexed, "
+            f"{result['docs_failed']} failed, {result['dead_letters']} dead-lettered")
+    transport = report['transport']
+    logging.info(
+        f"All indexes: {report['docs_success']} documents in {report['seconds']:.1f}s over "
+        f"{transport['bulk_requests']} bulk requests ({transport['rejected_requests']} rejected with 429), "
+        f"at most {report['max_in_flight']} in flight.")
+    for result in report['indexes']:
+        if result['dead_letters']:
+            logging.error(
+                f"Replay the failed documents with: python OpenSearchRetryFailed.py {result['index']}")
+
+
+def parse_args(argv=None):
+    """Parses the command line options of the orchestrator."""
+    names = [spec['name'] for spec in ENTITY_SPECS]
+    parser = argparse.ArgumentParser(
+        description="Build the works, authors and projects indexes in one run over a shared client.")
+    parser.add_argument(
+        '--entities', nargs='+', choices=names, default=names,
+        help="Indexes to build (default: all).")
+    parser.add_argument(
+        '--max-in-flight', type=int, default=DEFAULT_MAX_IN_FLIGHT,
+        help=f"Bulk requests in flight at once across all indexes (default: {DEFAULT_MAX_IN_FLIGHT}).")
+    OpenSearchIndexing.add_pipeline_arguments(parser, workers=DEFAULT_WORKERS)
+    parser.add_argument(
+        '--report', default=None, metavar='PATH',
+        help="Write the combined result report as JSON to this file.")
+    return parser.parse_args(argv)
+
+
+if __name__ == "__main__":
+    options = vars(parse_args())
+    entities = options.pop('entities')
+    report_path = options.pop('report')
+    specs = [spec for spec in ENTITY_SPECS if spec['name'] in entities]
+
+    report = run_all(specs, **options)
+    log_report(report)
+    if report_path:
+        with open(report_path, 'w', encoding='utf-8') as file:
+            json.dump(report, file, indent=2)
+        logging.info(f"Report written to {report_path}.")
+    if not report['success']:
+        sys.exit(1)
@@ -8,6 +8,24 @@ load_dotenv()
 PARQUET_FILE_PATH = 'authors_clean_data.parquet'
 INDEX_NAME = 'university_authors_second'
 
+# Settings of the 'search' profile: eager ordinals on the facet keywords, no
+# doc values on identifier-only fields. No index sort: the institutions are nested
+SEARCH_PROFILE = {
+    'eager_global_ordinals': ['university_key', 'last_known_institutions.type'],
+    'no_doc_values': ['orcid', 'ids.orcid', 'ids.scopus', 'ids.twitter'],
+}
+
+# Facet counts precomputed with --rollups, named like the backend's aggregations
+ROLLUP_SPEC = {
+    'terms': {
+        'authors_by_university': ('university_key', 20),
+    },
+    'nested_terms': {
+        'authors_by_lki_type': ('last_known_institutions', 'types', 'type', 10),
+    },
+    'citations': 'cited_by_count',
+}
+
 
 def define_authors_mapping():
     """Defines the OpenSearch index mapping."""
@@ -116,6 +134,11 @@ def define_authors_mapping():
                     "score": {"type": "float"}
                 }
             },
+            # Written by RelatedItems.py, read back by ID only
+            "similar_authors": {
+                "type": "object",
+                "enabled": False
+            },
             "created_date": {
                 "type": "date",
                 "format": "yyyy-MM-dd"
@@ -129,6 +152,9 @@ def define_authors_mapping():
 
 
 if __name__ == "__main__":
+    options = vars(OpenSearchIndexing.parse_args())
+    parquet_filepath = options.pop('parquet') or PARQUET_FILE_PATH
     authors_mapping = define_authors_mapping()
     OpenSearchIndexing.main(
-        PARQUET_FILE_PATH, INDEX_NAME, authors_mapping, 'id')
+        parquet_filepath, INDEX_NAME, authors_mapping, 'id', search_profile=SEARCH_PROFILE,
+        rollup_spec=ROLLUP_SPEC, **options)
@@ -8,6 +8,20 @@ load_dotenv()
 PARQUET_FILE_PATH = 'projects_clean.parquet'
 INDEX_NAME = 'university_projects'
 
+# Settings of the 'search' profile: eager ordinals on the facet keyword. No
+# index sort: fundings are nested
+SEARCH_PROFILE = {
+    'eager_global_ordinals': ['university_key'],
+}
+
+# Facet counts precomputed with --rollups; projects are counted by start year
+ROLLUP_SPEC = {
+    'terms': {
+        'projects_by_university': ('university_key', 20),
+    },
+    'year': 'startDate',
+}
+
 
 def define_projects_mapping():
     """Defines the OpenSearch index mapping."""
@@ -96,5 +110,9 @@ def define_projects_mapping():
 
 
 if __name__ == "__main__":
+    options = vars(OpenSearchIndexing.parse_args())
+    parquet_filepath = options.pop('parquet') or PARQUET_FILE_PATH
     mapping = define_projects_mapping()
-    OpenSearchIndexing.main(PARQUET_FILE_PATH, INDEX_NAME, mapping, 'id')
+    OpenSearchIndexing.main(parquet_filepath, INDEX_NAME, mapping, 'id',
+                            search_profile=SEARCH_PROFILE,
+                            rollup_spec=ROLLUP_SPEC, **options)
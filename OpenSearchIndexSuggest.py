@@ -0,0 +1,244 @@
+import os
+import sys
+import logging
+import argparse
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
+from dotenv import load_dotenv
+import OpenSearchIndexing
+import OpenSearchIndexWorks
+import OpenSearchIndexAuthors
+import OpenSearchIndexProjects
+from IndexManifest import last_rows
+from IndexAliases import (DEFAULT_RETENTION, apply_retention, next_version, swap_alias, verify_document_count,
+                          versioned_index_name)
+
+# Load environment variables from .env file
+load_dotenv()
+
+# Read alias of the typeahead index; every build goes into a new version
+INDEX_NAME = os.getenv('OPENSEARCH_SUGGEST_INDEX', 'university_suggest')
+
+# Rows read at once from each Parquet file
+BATCH_SIZE = 10000
+
+# Completion weights are 32-bit integers
+MAX_WEIGHT = 2 ** 31 - 1
+
+# One shard keeps the completion FST in one piece; case and diacritics are
+# folded so 'lodz' finds 'Łódź'
+SUGGEST_SETTINGS = {
+    'number_of_shards': 1,
+    'analysis': {
+        'analyzer': {
+            'suggest_folding': {
+                'type': 'custom',
+                'tokenizer': 'standard',
+                'filter': ['lowercase', 'asciifolding'],
+            }
+        }
+    },
+}
+
+
+def define_suggest_mapping():
+    """Defines the OpenSearch index mapping."""
+
+    return {
+        "properties": {
+            "kind": {"type": "keyword"},
+            "ref_id": {"type": "keyword"},
+            "text": {"type": "keyword", "index": False},
+            "university_key": {"type": "keyword"},
+            "suggest": {
+                "type": "completion",
+                "analyzer": "suggest_folding",
+                "max_input_length": 100,
+                "contexts": [
+                    {"name": "kind", "type": "category", "path": "kind"},
+                    {"name": "university_key", "type": "category", "path": "university_key"},
+                ],
+            },
+        }
+    }
+
+
+def suggestion(kind, ref_id, university_key, text, inputs, weight):
+    """Returns the bulk action of one suggestion; the same item of another university is a separate entry."""
+    # Inputs are lowercased when analyzed, so inputs differing only in case are sent once
+    unique = {}
+    for value in inputs:
+        if value and value.strip():
+            unique.setdefault(value.strip().lower(), value.strip())
+    return {
+        "_id": f"{kind}:{university_key}:{ref_id}",
+        "_source": {
+            "kind": kind,
+            "ref_id": ref_id,
+            "text": text,
+            "university_key": university_key,
+            "suggest": {"input": list(unique.values()), "weight": max(0, min(int(weight or 0), MAX_WEIGHT))},
+        },
+    }
+
+
+def _iter_rows(parquet_filepath, id_col, columns, batch_size):
+    """Yields the rows of a Parquet file with an ID, the last one of every ID and university.
+
+    A row repeated in a file would give the same suggestion twice. The
+    repeats are found up front from the ID and university columns alone, so
+    memory does not grow with the number of suggestions sent.
+    """
+    parquet_file = pq.ParquetFile(parquet_filepath)
+    names = parquet_file.schema_arrow.names
+    columns = [name for name in columns if name in names]
+    keys = parquet_file.read(columns=[name for name in ('university_key', id_col) if name in names])
+    suggestion_ids = pc.cast(keys[id_col], pa.string())
+    if 'university_key' in keys.column_names:
+        # Same key as the suggestion _id, where a missing university reads 'None'
+        university_keys = pc.fill_null(pc.cast(keys['university_key'], pa.string()), 'None')
+        suggestion_ids = pc.binary_join_element_wise(university_keys, suggestion_ids, ':')
+    is_last = last_rows(suggestion_ids)
+    row = 0
+    for batch in parquet_file.iter_batches(batch_size=batch_size, columns=columns):
+        for record, last in zip(batch.to_pylist(), is_last[row:row + batch.num_rows]):
+            if last:
+                yield record
+        row += batch.num_rows
+
+
+def paper_suggestions(parquet_filepath, batch_size=BATCH_SIZE):
+    """Paper titles, weighted by cited_by_count."""
+    for row in _iter_rows(parquet_filepath, 'openalex_id',
+                          ['openalex_id', 'university_key', 'title', 'cited_by_count'], batch_size):
+        if row.get('openalex_id') and row.get('title'):
+            yield suggestion('paper', row['openalex_id'], row.get('university_key'), row['title'],
+                             [row['title']], row.get('cited_by_count'))
+
+
+def author_suggestions(parquet_filepath, batch_size=BATCH_SIZE):
+    """Author names and alternative names, weighted by works_count.
+
+    Each name is also suggested by its last word, so typing 'kowal' finds
+    'Jan Kowalski'.
+    """
+    for row in _iter_rows(parquet_filepath, 'id', ['id', 'university_key', 'display_name',
+                                                   'display_name_alternatives', 'works_count'], batch_size):
+        if not row.get('id') or not row.get('display_name'):
+            continue
+        names = [row['display_name']] + list(row.get('display_name_alternatives') or [])
+        surnames = [name.split()[-1] for name in names if name and len(name.split()) > 1]
+        yield suggestion('author', row['id'], row.get('university_key'), row['display_name'],
+                         names + surnames, row.get('works_count'))
+
+
+def project_suggestions(parquet_filepath, batch_size=BATCH_SIZE):
+    """Project acronyms and titles; projects carry no citation or works count, so all weigh the same."""
+    for row in _iter_rows(parquet_filepath, 'id', ['id', 'university_key', 'acronym', 'title'], batch_size):
+        if not row.get('id') or not (row.get('title') or row.get('acronym')):
+            continue
+        text = f"{row['acronym']}: {row['title']}" if row.get('acronym') and row.get('title') else \
+            row.get('title') or row.get('acronym')
+        yield suggestion('project', row['id'], row.get('university_key'), text,
+                         [row.get('acronym'), row.get('title')], 1)
+
+
+def topic_suggestions(parquet_filepath):
+    """Topic names of the works, one per university, weighted by the university's works on the topic."""
+    table = pq.read_table(parquet_filepath, columns=['university_key', 'topics'])
+    topics = table['topics'].combine_chunks()
+    flat = pc.list_flatten(topics)
+    pairs = pa.table({
+        'university_key': pc.take(table['university_key'], pc.list_parent_indices(topics)),
+        'id': pc.struct_field(flat, 'id'),
+        'display_name': pc.struct_field(flat, 'display_name'),
+    }).filter(pc.is_valid(pc.struct_field(flat, 'id')))
+    # One suggestion per topic and university, even where works spell the topic name differently
+    counts = pairs.group_by(['university_key', 'id']).aggregate([('id', 'count'), ('display_name', 'max')])
+    for row in counts.to_pylist():
+        if row['display_name_max']:
+            yield suggestion('topic', row['id'], row['university_key'], row['display_name_max'],
+                             [row['display_name_max']], row['id_count'])
+
+
+def generate_suggest_actions(index_name, works_path, authors_path, projects_path, counts):
+    """Yields the bulk actions of all suggestions and counts them per kind in `counts`."""
+    sources = [
+        ('paper', lambda: paper_suggestions(works_path)),
+        ('topic', lambda: topic_suggestions(works_path)),
+        ('author', lambda: author_suggestions(authors_path)),
+        ('project', lambda: project_suggestions(projects_path)),
+    ]
+    for kind, generate in sources:
+        logging.info(f"Generating {kind} suggestions...")
+        counts[kind] = 0
+        for action in generate():
+            counts[kind] += 1
+            yield {"_index": index_name, **action}
+
+
+def build_suggest_index(client, works_path, authors_path, projects_path, workers=1, retention=DEFAULT_RETENTION):
+    """Builds a new version of the suggest index from the Parquet files and points the alias at it.
+
+    Like a --rebuild of the other indexes, the alias is switched only once
+    the new version holds every suggestion; a failed build is deleted.
+    """
+    for path in (works_path, authors_path, projects_path):
+        if not os.path.exists(path):
+            logging.error(f"File not found at '{path}'")
+            return False
+    alias = INDEX_NAME
+    index_name = versioned_index_name(alias, next_version(client, alias))
+    logging.info(f"Building '{alias}' into '{index_name}'.")
+    if not OpenSearchIndexing.create_opensearch_index(client, index_name, define_suggest_mapping(),
+                                                      SUGGEST_SETTINGS):
+        return False
+
+    counts = {}
+    actions = generate_suggest_actions(index_name, works_path, authors_path, projects_path, counts)
+    indexed = OpenSearchIndexing.bulk_index_actions(client, actions, index_name, workers)
+    if not indexed or not verify_document_count(client, index_name, sum(counts.values())):
+        OpenSearchIndexing.discard_version(client, index_name, alias)
+        return False
+
+    swap_alias(client, alias, index_name)
+    apply_retention(client, alias, retention)
+    logging.info(
+        f"Suggest index '{alias}' built: " + ', '.join(f"{count} {kind}s" for kind, count in counts.items()))
+    return True
+
+
+def parse_args(argv=None):
+    """Parses the command line options of the suggest index build."""
+    parser = argparse.ArgumentParser(
+        description="Build the typeahead index (completion suggestions for papers, authors, projects and "
+                    "topics) from the Parquet files of the other indexes.")
+    parser.add_argument(
+        '--works', default=OpenSearchIndexWorks.PARQUET_FILE_PATH, metavar='PATH',
+        help=f"Works Parquet file, for paper titles and topics (default: {OpenSearchIndexWorks.PARQUET_FILE_PATH}).")
+    parser.add_argument(
+        '--authors', default=OpenSearchIndexAuthors.PARQUET_FILE_PATH, metavar='PATH',
+        help=f"Authors Parquet file (default: {OpenSearchIndexAuthors.PARQUET_FILE_PATH}).")
+    parser.add_argument(
+        '--projects', default=OpenSearchIndexProjects.PARQUET_FILE_PATH, metavar='PATH',
+        help=f"Projects Parquet file (default: {OpenSearchIndexProjects.PARQUET_FILE_PATH}).")
+    parser.add_argument(
+        '--workers', type=int, default=1,
+        help="Number of bulk requests kept in flight concurrently (default: 1).")
+    parser.add_argument(
+        '--retention', type=int, default=DEFAULT_RETENTION,
+        help=f"Versions to keep including the live one (default: {DEFAULT_RETENTION}).")
+    return parser.parse_args(argv)
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    opensearch_client = OpenSearchIndexing.create_opensearch_client(pool_maxsize=max(args.workers, 10))
+    if not opensearch_client:
+        logging.error("Failed to connect to OpenSearch. Exiting.")
+        sys.exit(1)
+    if not build_suggest_index(opensearch_client, args.works, args.authors, args.projects, args.workers,
+                               args.retention):
+        logging.error("Failed to build the suggest index.")
+        sys.exit(1)
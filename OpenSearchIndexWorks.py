@@ -8,6 +8,25 @@ load_dotenv()
 PARQUET_FILE_PATH = 'papers_clean2.parquet'
 INDEX_NAME = 'university_papers_second'
 
+# Settings of the 'search' profile: eager ordinals on the facet keywords, no
+# doc values on URL-only fields. No index sort: topics and keywords are nested
+SEARCH_PROFILE = {
+    'eager_global_ordinals': ['university_key', 'type'],
+    'no_doc_values': ['cited_by_api_url', 'open_access.oa_url'],
+}
+
+# Facet counts precomputed with --rollups, named like the backend's aggregations
+ROLLUP_SPEC = {
+    'terms': {
+        'papers_by_date': ('publication_date', 20),
+        'papers_by_type': ('type', 20),
+        'papers_by_university': ('university_key', 20),
+    },
+    'date_fields': ['publication_date'],
+    'year': 'publication_year',
+    'citations': 'cited_by_count',
+}
+
 def define_works_mapping():
     """Defines the OpenSearch index mapping."""
 
@@ -182,6 +201,11 @@ def define_works_mapping():
                 "type": "keyword",
                 "index": False,
             },
+            # Written by RelatedItems.py, read back by ID only
+            "related_works": {
+                "type": "object",
+                "enabled": False,
+            },
             "updated_date": {
                 "type": "date",
                 "format": "strict_date_optional_time",
@@ -195,6 +219,9 @@ def define_works_mapping():
 
 
 if __name__ == "__main__":
+    options = vars(OpenSearchIndexing.parse_args())
+    parquet_filepath = options.pop('parquet') or PARQUET_FILE_PATH
     works_mapping = define_works_mapping()
-    OpenSearchIndexing.main(PARQUET_FILE_PATH, INDEX_NAME,
-                            works_mapping, 'openalex_id')
+    OpenSearchIndexing.main(parquet_filepath, INDEX_NAME, works_mapping, 'openalex_id',
+                            search_profile=SEARCH_PROFILE,
+                            rollup_spec=ROLLUP_SPEC, **options)
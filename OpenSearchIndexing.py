@@ -1,9 +1,30 @@
 import os
 import sys
 import logging
+import argparse
+import time
+import threading
+from itertools import islice
+from functools import partial
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
 import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
 from opensearchpy import OpenSearch, helpers, exceptions
 from dotenv import load_dotenv
+from IndexManifest import IndexManifest, last_rows, manifest_path, remove_manifest, replace_manifest
+from IndexCheckpoint import IndexCheckpoint, remove_checkpoints
+from AdaptiveBulk import (AdaptiveBatchController, DEFAULT_MAX_CHUNK_BYTES, DEFAULT_TARGET_LATENCY,
+                          adaptive_streaming_bulk, iter_adaptive_chunks, send_adaptive_chunk)
+from BulkEncoder import OrjsonSerializer, encode_action
+from IndexDeadLetter import (DeadLetterWriter, dead_letter_entry, dead_letter_path, read_dead_letters, remove_dead_letters,
+                             write_dead_letters)
+from IndexMetrics import IndexMetrics, InstrumentedTransport, TimedSerializer, timed_iter
+from IndexAliases import (DEFAULT_RETENTION, apply_retention, expected_document_count, next_version, swap_alias,
+                          verify_document_count, versioned_index_name)
+from IndexProfiles import DEFAULT_PROFILE, PROFILES, index_body
+from IndexRollups import delete_rollups, write_rollups
 
 # Load environment variables from .env file
 load_dotenv()
@@ -15,6 +36,38 @@ OPENSEARCH_SCHEME = os.getenv('OPENSEARCH_SCHEME')
 OPENSEARCH_PORT = os.getenv('OPENSEARCH_PORT')
 OPENSEARCH_HOST = os.getenv('OPENSEARCH_HOST')
 
+# Number of Parquet rows decoded at once in streaming mode
+STREAM_BATCH_SIZE = 1000
+
+# Options passed to every streaming bulk call
+BULK_OPTIONS = {
+    'chunk_size': 500,
+    'max_retries': 4,
+    'initial_backoff': 1,
+    'max_backoff': 5,
+    'request_timeout': 60,
+    'raise_on_error': False,
+}
+
+# Index settings applied while bulk loading, in flat form so they can be
+# read back from and restored through the _settings API
+BULK_LOAD_SETTINGS = {
+    'index.refresh_interval': '-1',
+    'index.number_of_replicas': 0,
+    'index.translog.durability': 'async',
+}
+
+# Force merges can take a long time on large indexes
+FORCE_MERGE_TIMEOUT = 3600
+
+# Default bulk options of the dead-letter retry command: smaller chunks and
+# a longer backoff than a normal run, since retried documents often hit an
+# overloaded cluster
+RETRY_CHUNK_SIZE = 100
+RETRY_MAX_RETRIES = 8
+RETRY_INITIAL_BACKOFF = 2
+RETRY_MAX_BACKOFF = 60
+
 # Logging setup
 logging.basicConfig(
     level=logging.INFO,
@@ -26,8 +79,13 @@ logging.basicConfig(
 )
 
 
-def create_opensearch_client():
-    """Creates and configures the OpenSearch client."""
+def create_opensearch_client(pool_maxsize=None, serializer=None, metrics=None, max_in_flight=None):
+    """Creates and configures the OpenSearch client.
+
+    With metrics, serialization time and every _bulk request are recorded.
+    With max_in_flight, at most that many _bulk requests are sent at once
+    by all threads sharing the client.
+    """
 
     logging.info(
         f"Attempting to connect to OpenSearch: {OPENSEARCH_SCHEME}://{OPENSEARCH_HOST}:{OPENSEARCH_PORT}")
@@ -49,6 +107,16 @@ def create_opensearch_client():
     else:
         logging.warning("Not using SSL for OpenSearch connection.")
 
+    # Only override the client's default JSON serializer when asked to
+    client_options = {}
+    if serializer is not None:
+        client_options['serializer'] = serializer
+    if metrics is not None:
+        client_options['serializer'] = TimedSerializer(serializer, metrics)
+        client_options['transport_class'] = InstrumentedTransport
+    if max_in_flight is not None:
+        client_options['transport_class'] = InstrumentedTransport
+
     try:
         client = OpenSearch(
             hosts=[{'host': OPENSEARCH_HOST, 'port': OPENSEARCH_PORT}],
@@ -57,8 +125,14 @@ def create_opensearch_client():
             use_ssl=use_ssl,
             verify_certs=False,
             ssl_assert_hostname=False,
-            ssl_show_warn=False
+            ssl_show_warn=False,
+            pool_maxsize=pool_maxsize,
+            **client_options
         )
+        if metrics is not None:
+            client.transport.index_metrics = metrics
+        if max_in_flight is not None:
+            client.transport.bulk_slots = threading.BoundedSemaphore(max_in_flight)
         # Verify connection
         if not client.ping():
             raise ConnectionError("OpenSearch ping failed.")
@@ -69,18 +143,26 @@ def create_opensearch_client():
         return None
 
 
-def create_opensearch_index(client, index_name, mapping):
-    """Creates the OpenSearch index with the specified mapping if it doesn't exist."""
+def create_opensearch_index(client, index_name, mapping, settings=None):
+    """Creates the OpenSearch index with the specified mapping and settings if it doesn't exist."""
 
     try:
         if not client.indices.exists(index=index_name):
             logging.info(f"Index '{index_name}' does not exist. Creating it.")
+            body = {'mappings': mapping}
+            if settings:
+                body['settings'] = settings
             response = client.indices.create(
-                index=index_name, body={'mappings': mapping})
+                index=index_name, body=body)
             logging.info(
                 f"Index '{index_name}' created successfully: {response}")
             return True
         else:
+            if settings:
+                # Sorting and shard count are fixed when an index is created
+                logging.warning(
+                    f"Index '{index_name}' already exists. Its settings are not changed; "
+                    f"use --rebuild to apply {', '.join(settings)}.")
             logging.info(
                 f"Index '{index_name}' already exists. Skipping creation.")
             return True
@@ -121,23 +203,196 @@ def load_from_parquet(filename):
         return None
 
 
-def generate_bulk_actions(dataframe, target_index, id_col):
-    """Generator function to yield bulk API actions from DataFrame rows."""
+def apply_bulk_load_settings(client, index_name):
+    """Switches an index to bulk-load settings and returns the settings it had before."""
+    try:
+        response = client.indices.get_settings(
+            index=index_name, flat_settings=True)
+        current_settings = next(iter(response.values()))['settings']
+        # Settings that were never set explicitly are restored as None,
+        # which resets them to the cluster default
+        original_settings = {key: current_settings.get(key)
+                             for key in BULK_LOAD_SETTINGS}
+
+        client.indices.put_settings(
+            index=index_name, body=BULK_LOAD_SETTINGS)
+        logging.info(
+            f"Applied bulk-load settings to '{index_name}': {BULK_LOAD_SETTINGS}")
+        return original_settings
+    except Exception as e:
+        logging.error(
+            f"Failed to apply bulk-load settings to '{index_name}': {e}", exc_info=True)
+        return None
+
+
+def restore_index_settings(client, index_name, original_settings):
+    """Restores index settings saved by apply_bulk_load_settings."""
+    try:
+        client.indices.put_settings(index=index_name, body=original_settings)
+        logging.info(
+            f"Restored settings of '{index_name}': {original_settings}")
+        return True
+    except Exception as e:
+        logging.error(
+            f"Failed to restore settings of '{index_name}': {e}", exc_info=True)
+        return False
+
+
+def force_merge_index(client, index_name, max_num_segments):
+    """Force-merges an index down to at most max_num_segments segments per shard."""
+    logging.info(
+        f"Force-merging '{index_name}' to {max_num_segments} segment(s)...")
+    try:
+        client.indices.forcemerge(
+            index=index_name, max_num_segments=max_num_segments,
+            request_timeout=FORCE_MERGE_TIMEOUT)
+        logging.info(f"Index '{index_name}' force-merged.")
+        return True
+    except Exception as e:
+        logging.error(
+            f"Failed to force-merge '{index_name}': {e}", exc_info=True)
+        return False
+
+
+def open_parquet_stream(filename):
+    """Opens a Parquet file for batch-wise reading without loading it into memory."""
+    logging.info(f"Opening Parquet file for streaming: {filename}")
+
+    try:
+        parquet_file = pq.ParquetFile(filename)
+        logging.info(
+            f"Parquet file opened: {parquet_file.metadata.num_rows} rows in {parquet_file.num_row_groups} row group(s).")
+        return parquet_file
+    except FileNotFoundError:
+        logging.error(f"File not found: {filename}", exc_info=True)
+        return None
+    except Exception as e:
+        logging.error(
+            f"Error opening Parquet file: {filename}. Error: {e}", exc_info=True)
+        return None
+
+
+def iter_parquet_records(parquet_file, batch_size=STREAM_BATCH_SIZE, start_row=0, metrics=None):
+    """Generator yielding the rows of one Parquet record batch at a time as dicts.
+
+    Rows before start_row are skipped; whole row groups are skipped without
+    being decoded. With metrics, decoding and conversion to Python are timed.
+    """
+    row_groups = []
+    for row_group in range(parquet_file.num_row_groups):
+        group_rows = parquet_file.metadata.row_group(row_group).num_rows
+        if not row_groups and start_row >= group_rows:
+            start_row -= group_rows
+            continue
+        row_groups.append(row_group)
+
+    batches = parquet_file.iter_batches(
+        batch_size=batch_size, row_groups=row_groups)
+    if metrics is not None:
+        batches = timed_iter(batches, metrics, 'decode')
+    for batch in batches:
+        if start_row:
+            if batch.num_rows <= start_row:
+                start_row -= batch.num_rows
+                continue
+            batch = batch.slice(start_row)
+            start_row = 0
+        # to_pylist maps nulls to None and list columns to plain Python lists,
+        # so only the current batch is ever converted to Python objects
+        start = time.perf_counter()
+        records = batch.to_pylist()
+        if metrics is not None:
+            metrics.add_time('convert', time.perf_counter() - start)
+        yield records
+
+
+def generate_bulk_actions_from_parquet(parquet_file, target_index, id_col, batch_size=STREAM_BATCH_SIZE,
+                                       checkpoint=None, pre_encode=False, metrics=None):
+    """Generator function to yield bulk API actions lazily from Parquet record batches.
+
+    With pre_encode, every action also carries its NDJSON lines encoded with
+    orjson under '_encoded', ready to be joined into a bulk request body.
+    Of the rows sharing an ID only the last one is sent, as it is the one
+    the index keeps; the ID column is read upfront to find them.
+    """
+    if id_col not in parquet_file.schema_arrow.names:
+        logging.error(
+            f"ID column '{id_col}' not found in Parquet schema. Cannot generate bulk actions.")
+        return
+
+    start_row = checkpoint.start_row if checkpoint is not None else 0
+    is_last = last_rows(parquet_file.read(columns=[id_col])[id_col])
+    row = start_row
+    skipped_count = 0
+    duplicate_count = 0
+    logging.info(
+        f"Generating bulk actions for {parquet_file.metadata.num_rows - start_row} records in batches of {batch_size}...")
+
+    for records in iter_parquet_records(parquet_file, batch_size, start_row, metrics):
+        if checkpoint is not None:
+            checkpoint.begin_batch(len(records))
+        for doc in records:
+            doc_id = doc.get(id_col)
+            row += 1
+
+            if doc_id is None:
+                skipped_count += 1
+                continue
+            if not is_last[row - 1]:
+                duplicate_count += 1
+                continue
+
+            action = {
+                "_index": target_index,
+                "_id": str(doc_id),
+                "_source": doc
+            }
+            if pre_encode:
+                start = time.perf_counter()
+                action["_encoded"] = encode_action(
+                    target_index, action["_id"], doc)
+                if metrics is not None:
+                    metrics.add_time('serialize', time.perf_counter() - start)
+            yield action
+        if checkpoint is not None:
+            checkpoint.end_batch()
+    if skipped_count > 0:
+        logging.warning(
+            f"Skipped {skipped_count} records because '{id_col}' was missing or null.")
+    if duplicate_count > 0:
+        logging.info(
+            f"Skipped {duplicate_count} records whose '{id_col}' appears again further down.")
+
+
+def generate_bulk_actions(dataframe, target_index, id_col, metrics=None):
+    """Generator function to yield bulk API actions from DataFrame rows.
+
+    Like in streaming mode, only the last row of every ID is sent.
+    """
     if id_col not in dataframe.columns:
         logging.error(
             f"ID column '{id_col}' not found in DataFrame. Cannot generate bulk actions.")
         return
 
     skipped_count = 0
+    start = time.perf_counter()
     records = dataframe.to_dict(orient='records')
+    if metrics is not None:
+        metrics.add_time('convert', time.perf_counter() - start)
     logging.info(f"Generating bulk actions for {len(records)} records...")
+    is_last = last_rows(pa.array([None if value is None else str(value) for value in dataframe[id_col]],
+                                 pa.string()))
+    duplicate_count = 0
 
-    for doc in records:
+    for doc, last in zip(records, is_last):
         doc_id = doc.get(id_col)
 
         if doc_id is None:
             skipped_count += 1
             continue
+        if not last:
+            duplicate_count += 1
+            continue
 
         yield {
             "_index": target_index,
@@ -147,48 +402,142 @@ def generate_bulk_actions(dataframe, target_index, id_col):
     if skipped_count > 0:
         logging.warning(
             f"Skipped {skipped_count} records because '{id_col}' was missing or null.")
+    if duplicate_count > 0:
+        logging.info(
+            f"Skipped {duplicate_count} records whose '{id_col}' appears again further down.")
 
 
-def index_data_to_opensearch(client, dataframe, index_name, id_col):
-    """Indexes data from a DataFrame into OpenSearch using streaming bulk."""
-    if dataframe is None or dataframe.empty:
-        logging.error("DataFrame is empty or None. Cannot index data.")
-        return False
-    logging.info(
-        f"Starting bulk indexing of {len(dataframe)} records to '{index_name}'...")
+def _chunk_actions(actions, chunk_size):
+    """Generator grouping an iterable of actions into lists of at most chunk_size items."""
+    actions = iter(actions)
+    while True:
+        chunk = list(islice(actions, chunk_size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def _send_chunk(client, chunk):
+    """Sends one chunk of actions with streaming bulk and returns its per-action results."""
+    return list(helpers.streaming_bulk(client=client, actions=chunk, **BULK_OPTIONS))
+
+
+def _adaptive_options():
+    """Retry and timeout options of BULK_OPTIONS that also apply to adaptive bulk requests."""
+    return {key: BULK_OPTIONS[key]
+            for key in ('max_retries', 'initial_backoff', 'max_backoff', 'request_timeout')}
+
+
+def parallel_streaming_bulk(client, actions, workers, controller=None):
+    """Generator yielding (ok, info) results while up to `workers` bulk requests are in flight.
+
+    Each chunk is serialized and sent by its own worker thread through
+    streaming_bulk, so the 429 retry/backoff behaviour is the same as in the
+    single-threaded path. At most `workers` chunks are held in memory. With a
+    controller, chunks are sized adaptively and all workers share its limits.
+    """
+    if controller is not None:
+        chunks = iter_adaptive_chunks(
+            actions, controller, client.transport.serializer)
+        send = partial(send_adaptive_chunk, controller=controller,
+                       **_adaptive_options())
+    else:
+        chunks = _chunk_actions(actions, BULK_OPTIONS['chunk_size'])
+        send = _send_chunk
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        pending = set()
+        for chunk in chunks:
+            if len(pending) >= workers:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    yield from future.result()
+            pending.add(executor.submit(send, client, chunk))
+
+        for future in pending:
+            yield from future.result()
+
+
+def _is_missing_delete(action_info):
+    """True for a delete that failed only because the document was already gone."""
+    op_type, info = next(iter(action_info.items()))
+    return op_type == 'delete' and info.get('status') == 404
+
+
+def bulk_index_actions(client, actions, index_name, workers=1, manifest=None, checkpoint=None, dead_letter=None,
+                       controller=None, metrics=None):
+    """Sends bulk actions to OpenSearch and refreshes the index on success.
+
+    With workers > 1 the chunks are sent concurrently by a thread pool,
+    otherwise a single streaming bulk call is used. When a manifest is given
+    only new or changed documents are sent and acknowledged ones are recorded.
+    A checkpoint is moved forward as record batches become fully acknowledged.
+    Failed operations are written to the dead letter, if given, so they can be
+    retried on their own. A controller switches to adaptively sized requests.
+    Final document counts are added to the metrics, if given.
+    """
     success_count = 0
     failed_count = 0
     total_processed = 0
+    start = time.perf_counter()
+
+    if manifest is not None:
+        actions = manifest.filter_actions(actions)
+    if checkpoint is not None:
+        actions = checkpoint.track(actions)
+
+    if workers > 1:
+        logging.info(
+            f"Using parallel bulk ingestion with {workers} in-flight requests.")
+        results = parallel_streaming_bulk(
+            client, actions, workers, controller)
+    elif controller is not None:
+        results = adaptive_streaming_bulk(
+            client, actions, controller, **_adaptive_options())
+    else:
+        results = helpers.streaming_bulk(
+            client=client, actions=actions, **BULK_OPTIONS)
 
     try:
-        for ok, action_info in helpers.streaming_bulk(
-            client=client,
-            actions=generate_bulk_actions(dataframe, index_name, id_col),
-            chunk_size=500,
-            max_retries=4,
-            initial_backoff=1,
-            max_backoff=5,
-            request_timeout=60,
-            raise_on_error=False
-        ):
+        for ok, action_info in results:
             total_processed += 1
+            if not ok and _is_missing_delete(action_info):
+                ok = True
+            if manifest is not None:
+                manifest.acknowledge(ok, action_info)
             if ok:
                 success_count += 1
             else:
                 failed_count += 1
-                logging.error(f"Failed to index document: {action_info}")
+                if dead_letter is not None:
+                    entry = dead_letter.record(action_info)
+                    logging.error(
+                        f"Failed to index document '{entry['_id']}': {entry['status']} {entry['error_type']}: {entry['reason']}")
+                else:
+                    logging.error(f"Failed to index document: {action_info}")
+            if checkpoint is not None:
+                # Dead-lettered failures are retried separately, so they do
+                # not hold the watermark back
+                checkpoint.acknowledge(
+                    ok or dead_letter is not None, action_info)
 
             if total_processed % 1000 == 0:
                 logging.info(
-                    f"Processed {total_processed} records. Success: {success_count}, Failed: {failed_count}")
+                    f"Processed {total_processed} records. Success: {success_count}, Failed: {failed_count} "
+                    f"({total_processed / (time.perf_counter() - start):.0f} docs/s)")
 
         logging.info("Bulk indexing finished.")
         logging.info(f"  Total actions attempted: {total_processed}")
         logging.info(f"  Successfully indexed: {success_count}")
         logging.info(f"  Failed operations: {failed_count}")
+        if controller is not None:
+            controller.summary()
+        if metrics is not None:
+            metrics.record_results(success_count, failed_count)
 
-        # Optional: Refresh the index only if everything succeeded
-        if success_count > 0 and failed_count == 0:
+        # Optional: Refresh the index only if everything succeeded, or if the
+        # failures were captured in the dead letter for a targeted retry
+        if success_count > 0 and (failed_count == 0 or dead_letter is not None):
             try:
                 client.indices.refresh(index=index_name)
                 logging.info(f"Index '{index_name}' refreshed.")
@@ -199,7 +548,7 @@ def index_data_to_opensearch(client, dataframe, index_name, id_col):
 
         return failed_count == 0  # Return True if successful
 
-    except exceptions.ApiError as ae:
+    except exceptions.TransportError as ae:
         logging.error(
             f"An OpenSearch API error occurred during bulk indexing: {ae}", exc_info=True)
         return False
@@ -209,33 +558,524 @@ def index_data_to_opensearch(client, dataframe, index_name, id_col):
         return False
 
 
-def main(parquet_filepath, index_name, mapping, id_col):
-    """Runs the entire OpenSearch pipeline."""
+def index_data_to_opensearch(client, dataframe, index_name, id_col, workers=1, manifest=None, dead_letter=None,
+                             controller=None, metrics=None):
+    """Indexes data from a DataFrame into OpenSearch using streaming bulk."""
+    if dataframe is None or dataframe.empty:
+        logging.error("DataFrame is empty or None. Cannot index data.")
+        return False
+    logging.info(
+        f"Starting bulk indexing of {len(dataframe)} records to '{index_name}'...")
+
+    return bulk_index_actions(
+        client, generate_bulk_actions(dataframe, index_name, id_col, metrics), index_name, workers, manifest,
+        dead_letter=dead_letter, controller=controller, metrics=metrics)
+
+
+def index_parquet_stream_to_opensearch(client, parquet_file, index_name, id_col, batch_size=STREAM_BATCH_SIZE, workers=1,
+                                       manifest=None, checkpoint=None, dead_letter=None, controller=None,
+                                       pre_encode=False, metrics=None):
+    """Indexes a Parquet file into OpenSearch batch by batch, keeping memory flat."""
+    if parquet_file is None or parquet_file.metadata.num_rows == 0:
+        logging.error("Parquet file is empty or None. Cannot index data.")
+        return False
+    logging.info(
+        f"Starting streaming bulk indexing of {parquet_file.metadata.num_rows} records to '{index_name}'...")
+
+    indexing_success = bulk_index_actions(
+        client,
+        generate_bulk_actions_from_parquet(
+            parquet_file, index_name, id_col, batch_size, checkpoint, pre_encode, metrics),
+        index_name, workers, manifest, checkpoint, dead_letter, controller, metrics)
+    if indexing_success and checkpoint is not None:
+        checkpoint.complete()
+    return indexing_success
+
+
+def read_delete_ids(deletes_filepath, id_col):
+    """Returns the distinct, non-null IDs of a Parquet file of documents to delete."""
+    ids = pq.read_table(deletes_filepath, columns=[id_col])[id_col]
+    return pc.unique(pc.cast(ids, pa.string()).drop_null()).to_pylist()
+
+
+def delete_documents(client, doc_ids, index_name, workers=1, manifest=None, metrics=None):
+    """Deletes documents by ID; a document that is already gone counts as deleted.
+
+    Deleted IDs are removed from the manifest, if given.
+    """
+    logging.info(f"Deleting {len(doc_ids)} documents from '{index_name}'...")
+    actions = ({"_op_type": "delete", "_index": index_name, "_id": doc_id} for doc_id in doc_ids)
+    deleted = bulk_index_actions(client, actions, index_name, workers, metrics=metrics)
+    if deleted and manifest is not None:
+        manifest.forget(doc_ids)
+    return deleted
+
+
+def generate_retry_actions(entries, batch_size=STREAM_BATCH_SIZE):
+    """Generator yielding bulk actions for dead-letter entries.
+
+    Documents are read back from the Parquet files they were loaded from,
+    filtering each record batch down to the failed IDs.
+    """
+    ids_by_source = {}
+    for entry in entries:
+        if entry['op_type'] == 'delete':
+            yield {"_op_type": "delete", "_index": entry['_index'], "_id": entry['_id']}
+        else:
+            key = (entry['parquet'], entry['id_col'], entry['_index'])
+            ids_by_source.setdefault(key, set()).add(entry['_id'])
+
+    for (parquet_filepath, id_col, target_index), ids in ids_by_source.items():
+        parquet_file = open_parquet_stream(parquet_filepath)
+        if parquet_file is None:
+            continue
+        value_set = pa.array(sorted(ids), type=pa.string())
+        for batch in parquet_file.iter_batches(batch_size=batch_size):
+            mask = pc.is_in(
+                pc.cast(batch.column(id_col), pa.string()), value_set=value_set)
+            for doc in batch.filter(mask).to_pylist():
+                yield {
+                    "_index": target_index,
+                    "_id": str(doc[id_col]),
+                    "_source": doc
+                }
+
+
+def retry_dead_letters(client, index_name, include_permanent=False, chunk_size=RETRY_CHUNK_SIZE,
+                       max_retries=RETRY_MAX_RETRIES, initial_backoff=RETRY_INITIAL_BACKOFF,
+                       max_backoff=RETRY_MAX_BACKOFF):
+    """Replays the failed documents of an index from its dead-letter file.
+
+    Only retryable failures (429, timeouts, rejected executions) are replayed
+    unless include_permanent is set. Documents that still fail are written
+    back to the dead-letter file; successful ones are removed from it.
+    """
+    entries = read_dead_letters(index_name)
+    if not entries:
+        logging.info(
+            f"No dead-letter entries found at {dead_letter_path(index_name)}.")
+        return True
+
+    to_retry = {}
+    kept = []
+    for entry in entries:
+        if entry['retryable'] or include_permanent:
+            to_retry[entry['_id']] = entry
+        else:
+            kept.append(entry)
+    logging.info(
+        f"Retrying {len(to_retry)} of {len(entries)} dead-letter entries for '{index_name}' "
+        f"({len(kept)} permanent failures kept).")
+
+    answered = set()
+    still_failing = []
+    try:
+        for ok, action_info in helpers.streaming_bulk(
+            client=client,
+            actions=generate_retry_actions(to_retry.values()),
+            chunk_size=chunk_size,
+            max_retries=max_retries,
+            initial_backoff=initial_backoff,
+            max_backoff=max_backoff,
+            request_timeout=BULK_OPTIONS['request_timeout'],
+            raise_on_error=False
+        ):
+            _, info = next(iter(action_info.items()))
+            doc_id = info.get('_id')
+            answered.add(doc_id)
+            if not ok and not _is_missing_delete(action_info):
+                original = to_retry[doc_id]
+                still_failing.append(dead_letter_entry(
+                    action_info, original['parquet'], original['id_col']))
+    except Exception as e:
+        logging.error(
+            f"Retry of dead-letter entries interrupted: {e}", exc_info=True)
+
+    # Entries never answered (interrupted run or document no longer in the
+    # Parquet file) stay in the dead letter unchanged
+    unanswered = [entry for doc_id, entry in to_retry.items()
+                  if doc_id not in answered]
+    remaining = kept + still_failing + unanswered
+    write_dead_letters(index_name, remaining)
+
+    recovered = len(to_retry) - len(still_failing) - len(unanswered)
+    logging.info(
+        f"Recovered {recovered} documents. {len(remaining)} entries left in the dead letter.")
+    if recovered > 0:
+        try:
+            client.indices.refresh(index=index_name)
+            logging.info(f"Index '{index_name}' refreshed.")
+        except Exception as e:
+            logging.error(f"Error refreshing index '{index_name}': {e}")
+    return len(still_failing) == 0 and len(unanswered) == 0
+
+
+def add_pipeline_arguments(parser, workers=1):
+    """Adds the options of run_pipeline to a parser; workers is the default of --workers."""
+    parser.add_argument(
+        '--stream', action='store_true',
+        help="Read the Parquet file one record batch at a time instead of loading it into a DataFrame.")
+    parser.add_argument(
+        '--batch-size', type=int, default=STREAM_BATCH_SIZE,
+        help=f"Rows per Parquet record batch in streaming mode (default: {STREAM_BATCH_SIZE}).")
+    parser.add_argument(
+        '--workers', type=int, default=workers,
+        help=f"Number of bulk requests kept in flight concurrently (default: {workers}).")
+    parser.add_argument(
+        '--bulk-load', action='store_true',
+        help="Disable refresh, replicas and per-request translog fsync while indexing, then restore them.")
+    parser.add_argument(
+        '--force-merge', dest='force_merge_segments', type=int, default=None, metavar='SEGMENTS',
+        help="Force-merge the index to this many segments after a successful run.")
+    parser.add_argument(
+        '--delta', action='store_true',
+        help="Send only documents that are new or changed since the last run, using a local manifest.")
+    parser.add_argument(
+        '--delete-missing', action='store_true',
+        help="With --delta, delete documents whose IDs no longer appear in the Parquet file.")
+    parser.add_argument(
+        '--trust-updated-date', action='store_true',
+        help="With --delta, treat documents with an unchanged updated_date as unchanged without hashing them.")
+    parser.add_argument(
+        '--resume', action='store_true',
+        help="Skip rows acknowledged by a previous interrupted run (implies --stream).")
+    parser.add_argument(
+        '--adaptive', action='store_true',
+        help="Size bulk requests from observed latency, server 'took' and rejections instead of a fixed 500 documents.")
+    parser.add_argument(
+        '--max-chunk-mb', type=float, default=DEFAULT_MAX_CHUNK_BYTES / 1024 / 1024,
+        help=f"With --adaptive, cap each bulk request at this many MiB (default: {DEFAULT_MAX_CHUNK_BYTES // 1024 // 1024}).")
+    parser.add_argument(
+        '--target-latency', type=float, default=DEFAULT_TARGET_LATENCY,
+        help=f"With --adaptive, bulk request duration in seconds to aim for (default: {DEFAULT_TARGET_LATENCY}).")
+    parser.add_argument(
+        '--fast-json', action='store_true',
+        help="Serialize with orjson; in streaming mode bulk bodies are encoded straight from the record batches.")
+    parser.add_argument(
+        '--rebuild', action='store_true',
+        help="Load into a new version <index>_v<N>, verify its document count, then point the <index> alias at it.")
+    parser.add_argument(
+        '--retention', type=int, default=DEFAULT_RETENTION,
+        help=f"With --rebuild, versions to keep including the live one (default: {DEFAULT_RETENTION}).")
+    parser.add_argument(
+        '--profile', choices=PROFILES, default=DEFAULT_PROFILE,
+        help="Settings profile of a new index: 'search' adds eager global ordinals on the facets and "
+             "no doc values on display-only fields.")
+    parser.add_argument(
+        '--shards', type=int, default=None,
+        help="Primary shards of a new index (default: the cluster default).")
+    parser.add_argument(
+        '--refresh-interval', default=None, metavar='INTERVAL',
+        help="Refresh interval of a new index, e.g. 30s or -1 (default: the cluster default).")
+    parser.add_argument(
+        '--rollups', action='store_true',
+        help="After a successful run, write per-university facet counts of the full Parquet file "
+             "to the rollup index read by the web app's landing view.")
+
+
+def parse_args(argv=None):
+    """Parses the command line options shared by the OpenSearchIndex* entry points."""
+    parser = argparse.ArgumentParser(
+        description="Index a Parquet file into OpenSearch.")
+    parser.add_argument(
+        '--parquet', default=None, metavar='PATH',
+        help="Index this Parquet file instead of the default one, e.g. a change set written by OpenAlexRefresh.py.")
+    parser.add_argument(
+        '--deletes', default=None, metavar='PATH',
+        help="After indexing, delete the documents whose IDs are in this Parquet file, "
+             "e.g. the <changes>_deletes.parquet written by OpenAlexRefresh.py.")
+    add_pipeline_arguments(parser)
+    parser.add_argument(
+        '--metrics-json', default=None, metavar='PATH',
+        help="Write stage timings, throughput and bulk request metrics as JSON to this file.")
+    parser.add_argument(
+        '--metrics-prom', default=None, metavar='PATH',
+        help="Also write the metrics in Prometheus text format (e.g. for the node_exporter textfile collector).")
+    return parser.parse_args(argv)
+
+
+def run_pipeline(client, parquet_filepath, index_name, mapping, id_col, stream=False, batch_size=STREAM_BATCH_SIZE,
+                 workers=1, bulk_load=False, force_merge_segments=None, delta=False, delete_missing=False,
+                 trust_updated_date=False, resume=False, adaptive=False,
+                 max_chunk_mb=DEFAULT_MAX_CHUNK_BYTES / 1024 / 1024, target_latency=DEFAULT_TARGET_LATENCY,
+                 fast_json=False, rebuild=False, retention=DEFAULT_RETENTION, profile=DEFAULT_PROFILE,
+                 search_profile=None, shards=None, refresh_interval=None, rollups=False, rollup_spec=None,
+                 deletes=None, metrics=None):
+    """Creates the index and loads one Parquet file into it with an existing client.
+
+    Returns a result dict instead of exiting, so several pipelines can share
+    one client: success, the stage that failed (if any), document counts,
+    dead-lettered documents and the metrics summary.
+
+    With rebuild, index_name is used as a read alias. The data goes into a
+    new index <index_name>_v<N>; once its document count matches the
+    Parquet file the alias is moved to it in one atomic update and old
+    versions beyond `retention` are deleted. A failed rebuild deletes the
+    new version and leaves the alias untouched.
+
+    With profile 'search', a new index is created with the entity's
+    search_profile (see IndexProfiles.index_body).
+
+    With rollups, the facet counts described by rollup_spec are computed
+    from the Parquet file once the data is live and written to the rollup
+    index (see IndexRollups.write_rollups). The file must hold the whole
+    index, not a change set. Without rollups, the rollup document of the
+    index is deleted as soon as its data changes.
+
+    deletes is a Parquet file of IDs (in id_col) whose documents are
+    deleted once the file is indexed, e.g. the deletes written next to a
+    change set by OpenAlexRefresh.py. A change set may then be empty.
+    """
+    logging.info(f"--- Starting Pipeline for '{index_name}' ---")
+    metrics = metrics or IndexMetrics(index_name)
+    result = {'index': index_name, 'parquet': parquet_filepath, 'success': False, 'failed_stage': None,
+              'dead_letters': 0}
+
+    def finish(failed_stage=None):
+        result['failed_stage'] = failed_stage
+        result['docs_success'] = metrics.docs_success
+        result['docs_failed'] = metrics.docs_failed
+        result['metrics'] = metrics.summary()
+        return result
+
+    alias = None
+    record_manifest = False
+    if rebuild:
+        if delta or resume:
+            # A new version starts empty, so nothing can be skipped
+            logging.warning("--rebuild loads every document. Ignoring --delta and --resume.")
+            delta = resume = False
+        if deletes:
+            # A new version only holds the documents of the file
+            logging.warning("--rebuild loads the whole file. Ignoring --deletes.")
+            deletes = None
+        alias = index_name
+        # The alias's delta manifest describes the old version; a new one is
+        # recorded while loading and replaces it at the swap
+        record_manifest = os.path.exists(manifest_path(alias))
+        try:
+            index_name = versioned_index_name(alias, next_version(client, alias))
+        except Exception as e:
+            logging.error(
+                f"Failed to look up the versions of '{alias}': {e}", exc_info=True)
+            return finish('create_index')
+        result['target_index'] = index_name
+        logging.info(f"Rebuilding '{alias}' into '{index_name}'.")
+
+    # Checkpoints are kept per record batch, so resuming needs streaming mode
+    if resume and not stream:
+        logging.info("--resume implies --stream. Enabling streaming mode.")
+        stream = True
+
+    # --- Stage 2: Define Index Mapping and Create Index ---
+    with metrics.stage('create_index'):
+        try:
+            mapping, settings = index_body(
+                mapping, search_profile if profile == 'search' else None, shards, refresh_interval)
+        except (KeyError, ValueError) as e:
+            logging.error(f"Invalid search profile for '{index_name}': {e}")
+            return finish('create_index')
+        index_created = create_opensearch_index(
+            client, index_name, mapping, settings)
+    if not index_created:
+        logging.error(f"Failed to create OpenSearch index '{index_name}'.")
+        return finish('create_index')
+
+    # --- Stage 3: Load Data from Parquet File ---
+    # In streaming mode decoding happens during Stage 4 and is timed there
+    if stream:
+        with metrics.stage('load'):
+            parquet_file = open_parquet_stream(parquet_filepath)
+        if parquet_file is None:
+            logging.error(
+                f"Failed to open {parquet_filepath} for streaming.")
+            return finish('load')
+    else:
+        with metrics.stage('load'):
+            dataframe_to_index = load_from_parquet(parquet_filepath)
+        if dataframe_to_index is None or (dataframe_to_index.empty and not deletes):
+            logging.error(
+                f"Failed to load data from {parquet_filepath}.")
+            return finish('load')
+
+    delete_ids = []
+    if deletes:
+        try:
+            delete_ids = read_delete_ids(deletes, id_col)
+        except Exception as e:
+            logging.error(f"Failed to read the IDs to delete from {deletes}: {e}", exc_info=True)
+            return finish('load')
+
+    # --- Stage 4: Index Data to OpenSearch ---
+    # Rollups of the current data must not outlive it; in rebuild mode the
+    # live data only changes at the swap
+    if alias is None and not delete_rollups(client, index_name):
+        return finish('rollups')
+
+    original_settings = None
+    if bulk_load:
+        original_settings = apply_bulk_load_settings(
+            client, index_name)
+        if original_settings is None:
+            logging.warning("Continuing without bulk-load settings.")
+
+    manifest = None
+    if delta:
+        manifest = IndexManifest(
+            index_name, delete_missing=delete_missing, trust_updated_date=trust_updated_date)
+        logging.info(f"Delta mode enabled for '{index_name}'.")
+    elif record_manifest:
+        # The new version starts empty, so every document is sent and recorded
+        remove_manifest(index_name)
+        manifest = IndexManifest(index_name)
+        logging.info(f"Recording a new delta manifest for '{alias}'.")
+
+    dead_letter = DeadLetterWriter(
+        index_name, parquet_filepath, id_col, append=resume)
+
+    controller = None
+    if adaptive:
+        controller = AdaptiveBatchController(
+            initial_docs=BULK_OPTIONS['chunk_size'],
+            max_bytes=int(max_chunk_mb * 1024 * 1024),
+            target_latency=target_latency)
+    elif fast_json and stream:
+        # Pre-encoded actions are sent as raw bulk bodies, which goes through
+        # the chunked sender; pin its size to the usual fixed chunk size
+        controller = AdaptiveBatchController(
+            initial_docs=BULK_OPTIONS['chunk_size'],
+            min_docs=BULK_OPTIONS['chunk_size'],
+            max_docs=BULK_OPTIONS['chunk_size'],
+            max_bytes=int(max_chunk_mb * 1024 * 1024))
+
+    indexing_success = False
+    try:
+        with metrics.stage('index'):
+            if deletes and (parquet_file.metadata.num_rows if stream else len(dataframe_to_index)) == 0:
+                # A change set may only hold deletes
+                logging.info(f"No rows to index in {parquet_filepath}.")
+                indexing_success = True
+            elif stream:
+                checkpoint = IndexCheckpoint(
+                    parquet_filepath, index_name, resume=resume)
+                if manifest is not None and manifest.delete_missing and checkpoint.start_row > 0:
+                    # Skipped rows are never seen by the manifest and would look deleted
+                    logging.warning(
+                        "Ignoring --delete-missing while resuming a partial run.")
+                    manifest.delete_missing = False
+                indexing_success = index_parquet_stream_to_opensearch(
+                    client, parquet_file, index_name, id_col, batch_size, workers, manifest, checkpoint,
+                    dead_letter, controller, pre_encode=fast_json, metrics=metrics)
+            else:
+                indexing_success = index_data_to_opensearch(
+                    client, dataframe_to_index, index_name, id_col, workers, manifest, dead_letter,
+                    controller, metrics)
+            if indexing_success and delete_ids:
+                indexing_success = delete_documents(
+                    client, delete_ids, index_name, workers, manifest, metrics)
+    finally:
+        dead_letter.close()
+        if manifest is not None:
+            manifest.close()
+        # Always put the original settings back, even if indexing failed
+        if original_settings is not None:
+            restore_index_settings(
+                client, index_name, original_settings)
+
+    result['dead_letters'] = dead_letter.count
+    if not indexing_success:
+        if alias is not None:
+            discard_version(client, index_name, alias)
+        return finish('index')
+
+    if force_merge_segments:
+        with metrics.stage('force_merge'):
+            force_merge_index(client,
+                              index_name, force_merge_segments)
+
+    # --- Stage 5: Verify the New Version and Swap the Alias ---
+    if alias is not None:
+        try:
+            with metrics.stage('verify'):
+                verified = verify_document_count(
+                    client, index_name, expected_document_count(parquet_filepath, id_col))
+            if not verified:
+                discard_version(client, index_name, alias)
+                return finish('verify')
+            with metrics.stage('swap'):
+                swap_alias(client, alias, index_name)
+                if record_manifest:
+                    replace_manifest(index_name, alias)
+                apply_retention(client, alias, retention)
+        except Exception as e:
+            logging.error(
+                f"Failed to switch '{alias}' to '{index_name}': {e}", exc_info=True)
+            return finish('swap')
+        if not delete_rollups(client, alias):
+            return finish('rollups')
+
+    # --- Stage 6: Precompute the Landing View's Facet Counts ---
+    if rollups and rollup_spec:
+        with metrics.stage('rollups'):
+            rollups_written = write_rollups(
+                client, alias or index_name, index_name, parquet_filepath, rollup_spec, id_col)
+        if not rollups_written:
+            return finish('rollups')
+
+    result['success'] = True
+    return finish()
+
+
+def discard_version(client, index_name, alias):
+    """Deletes a version whose rebuild failed; the alias still points to the previous one.
+
+    Its manifest, checkpoints and dead letters go with it, so no later run
+    resumes from or replays documents of an index that no longer exists.
+    """
+    remove_manifest(index_name)
+    remove_checkpoints(index_name)
+    remove_dead_letters(index_name)
+    try:
+        client.indices.delete(index=index_name)
+        logging.error(
+            f"Rebuild failed. Deleted '{index_name}'; '{alias}' still points to the previous version.")
+    except Exception as e:
+        logging.error(
+            f"Rebuild failed and '{index_name}' could not be deleted: {e}", exc_info=True)
+
+
+def main(parquet_filepath, index_name, mapping, id_col, workers=1, fast_json=False, metrics_json=None,
+         metrics_prom=None, **options):
+    """Runs the entire OpenSearch pipeline for one index and exits with status 1 on failure."""
     logging.info("--- Starting Pipeline ---")
+    metrics = IndexMetrics(index_name)
 
     # --- Stage 1: Connect to OpenSearch ---
-    opensearch_client = create_opensearch_client()
+    # Keep one pooled connection per in-flight bulk request
+    with metrics.stage('connect'):
+        opensearch_client = create_opensearch_client(
+            pool_maxsize=max(workers, 10),
+            serializer=OrjsonSerializer() if fast_json else None,
+            metrics=metrics)
     if not opensearch_client:
         logging.error("Failed to connect to OpenSearch. Exiting.")
         sys.exit(1)
 
-    # --- Stage 2: Define Index Mapping and Create Index ---
-    if not create_opensearch_index(opensearch_client, index_name, mapping):
-        logging.error("Failed to create OpenSearch index. Exiting.")
-        sys.exit(1)
+    result = run_pipeline(opensearch_client, parquet_filepath, index_name, mapping, id_col, workers=workers,
+                          fast_json=fast_json, metrics=metrics, **options)
 
-    # --- Stage 3: Load Data from Parquet File ---
-    dataframe_to_index = load_from_parquet(parquet_filepath)
-    if dataframe_to_index is None or dataframe_to_index.empty:
-        logging.error(
-            f"Failed to load data from {parquet_filepath}. Exiting.")
-        sys.exit(1)
+    metrics.log_summary()
+    metrics.write(metrics_json, metrics_prom)
 
-    # --- Stage 4: Index Data to OpenSearch ---
-    indexing_success = index_data_to_opensearch(
-        opensearch_client, dataframe_to_index, index_name, id_col)
-    if indexing_success:
+    if result['success']:
         logging.info("^^^ Data indexed successfully. ^^^")
+    elif result['failed_stage'] != 'index':
+        logging.error(f"Pipeline failed at stage '{result['failed_stage']}'. Exiting.")
+        sys.exit(1)
     else:
         logging.error("--- --- --- Pipeline completed with indexing errors.")
+        # A failed rebuild is repeated as a whole, not replayed
+        if result['dead_letters'] > 0 and 'target_index' not in result:
+            logging.error(
+                f"Replay the failed documents with: python OpenSearchRetryFailed.py {index_name}")
         sys.exit(1)
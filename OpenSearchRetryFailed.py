@@ -0,0 +1,39 @@
+import sys
+import argparse
+from dotenv import load_dotenv
+import OpenSearchIndexing
+
+# Load environment variables from .env file
+load_dotenv()
+
+
+def parse_args(argv=None):
+    """Parses the command line options of the dead-letter retry command."""
+    parser = argparse.ArgumentParser(
+        description="Replay the failed documents recorded in an index's dead-letter file.")
+    parser.add_argument('index_name', help="Index whose dead-letter file should be replayed.")
+    parser.add_argument(
+        '--include-permanent', action='store_true',
+        help="Also replay permanent failures such as mapping errors (e.g. after fixing the mapping).")
+    parser.add_argument(
+        '--chunk-size', type=int, default=OpenSearchIndexing.RETRY_CHUNK_SIZE,
+        help=f"Documents per bulk request (default: {OpenSearchIndexing.RETRY_CHUNK_SIZE}).")
+    parser.add_argument(
+        '--max-retries', type=int, default=OpenSearchIndexing.RETRY_MAX_RETRIES,
+        help=f"Retries per chunk on 429 responses (default: {OpenSearchIndexing.RETRY_MAX_RETRIES}).")
+    parser.add_argument(
+        '--initial-backoff', type=int, default=OpenSearchIndexing.RETRY_INITIAL_BACKOFF,
+        help=f"Seconds before the first retry (default: {OpenSearchIndexing.RETRY_INITIAL_BACKOFF}).")
+    parser.add_argument(
+        '--max-backoff', type=int, default=OpenSearchIndexing.RETRY_MAX_BACKOFF,
+        help=f"Upper bound of the retry backoff in seconds (default: {OpenSearchIndexing.RETRY_MAX_BACKOFF}).")
+    return parser.parse_args(argv)
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    client = OpenSearchIndexing.create_opensearch_client()
+    if not client:
+        sys.exit(1)
+    if not OpenSearchIndexing.retry_dead_letters(client, **vars(args)):
+        sys.exit(1)
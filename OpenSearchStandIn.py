@@ -0,0 +1,281 @@
+import gzip
+import fnmatch
+import json
+import time
+import random
+import logging
+import argparse
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from IndexProfiles import nested_fields
+
+
+class StandInState:
+    """Indexes, aliases, settings and counters of a stand-in server, shared by all handler threads."""
+
+    def __init__(self, latency=0.0, reject_rate=0.0, seed=None):
+        self.latency = latency
+        self.reject_rate = reject_rate
+        self.random = random.Random(seed)
+        self.indexes = {}
+        self.aliases = {}
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self.lock:
+            self.stats = {
+                'bulk_requests': 0,
+                'bulk_bytes': 0,
+                'operations': 0,
+                'rejected': 0,
+            }
+            for index in self.indexes.values():
+                index['count'] = 0
+
+
+class StandInHandler(BaseHTTPRequestHandler):
+    """Answers the subset of the OpenSearch REST API used by the indexing pipeline.
+
+    Bulk-loaded documents are counted, not stored, so the stand-in stays
+    cheap enough not to be the bottleneck of a benchmark. Single documents
+    written with PUT <index>/_doc/<id> are kept and can be read back.
+    """
+
+    protocol_version = 'HTTP/1.1'
+    state = None
+
+    def log_message(self, format, *args):
+        logging.debug(format % args)
+
+    def _send_json(self, status, body):
+        payload = json.dumps(body).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(payload)))
+        self.end_headers()
+        if self.command != 'HEAD':
+            self.wfile.write(payload)
+
+    def _read_body(self):
+        length = int(self.headers.get('Content-Length', 0))
+        body = self.rfile.read(length) if length else b''
+        if self.headers.get('Content-Encoding') == 'gzip':
+            body = gzip.decompress(body)
+        return body, length
+
+    def _path_parts(self):
+        return [part for part in self.path.split('?')[0].split('/') if part]
+
+    def _resolve(self, expression):
+        """Index names matched by a comma-separated list of index names, aliases and wildcards."""
+        names = []
+        for name in expression.split(','):
+            if '*' in name:
+                names.extend(sorted(fnmatch.filter(self.state.indexes, name)))
+            elif name in self.state.aliases:
+                names.extend(sorted(self.state.aliases[name]))
+            elif name in self.state.indexes:
+                names.append(name)
+        return names
+
+    def do_HEAD(self):
+        parts = self._path_parts()
+        if len(parts) == 2 and parts[0] == '_alias':
+            exists = parts[1] in self.state.aliases
+        else:
+            exists = not parts or parts[0] in self.state.indexes or parts[0] in self.state.aliases
+        self._send_json(200 if exists else 404, {})
+
+    def do_GET(self):
+        parts = self._path_parts()
+        if not parts:
+            return self._send_json(200, {'name': 'stand-in', 'version': {'number': '2.19.1'}})
+        if parts == ['_standin', 'stats']:
+            with self.state.lock:
+                return self._send_json(200, dict(self.state.stats))
+        if len(parts) == 2 and parts[0] == '_alias':
+            if parts[1] not in self.state.aliases:
+                return self._send_json(404, {'error': 'alias [' + parts[1] + '] missing', 'status': 404})
+            return self._send_json(200, {name: {'aliases': {parts[1]: {}}}
+                                         for name in self.state.aliases[parts[1]]})
+        names = self._resolve(parts[0])
+        if not names:
+            if '*' in parts[0]:
+                return self._send_json(200, {})
+            return self._send_json(404, {'error': {'type': 'index_not_found_exception'}, 'status': 404})
+        if parts[1:] == ['_settings']:
+            return self._send_json(200, {name: {'settings': self.state.indexes[name]['settings']} for name in names})
+        if parts[1:] == ['_count']:
+            return self._send_json(200, {'count': sum(self.state.indexes[name]['count'] for name in names)})
+        if len(parts) == 3 and parts[1] == '_doc':
+            document = self.state.indexes[names[0]].get('documents', {}).get(parts[2])
+            if document is None:
+                return self._send_json(404, {'_index': names[0], '_id': parts[2], 'found': False})
+            return self._send_json(200, {'_index': names[0], '_id': parts[2], 'found': True, '_source': document})
+        self._send_json(200, {name: {'mappings': self.state.indexes[name]['mappings'],
+                                     'aliases': {alias: {} for alias, targets in self.state.aliases.items()
+                                                 if name in targets}}
+                              for name in names})
+
+    def do_PUT(self):
+        parts = self._path_parts()
+        body, _ = self._read_body()
+        request = json.loads(body) if body else {}
+        if len(parts) == 1:
+            # Like OpenSearch, refuse index sorting on a mapping with nested fields
+            if 'index.sort.field' in request.get('settings', {}) and nested_fields(request.get('mappings', {})):
+                return self._send_json(400, {'error': {
+                    'type': 'illegal_argument_exception',
+                    'reason': 'cannot have nested fields when index sort is activated'}, 'status': 400})
+            if parts[0] in self.state.indexes:
+                return self._send_json(400, {'error': {
+                    'type': 'resource_already_exists_exception',
+                    'reason': f"index [{parts[0]}] already exists"}, 'status': 400})
+            self.state.indexes[parts[0]] = {
+                'mappings': request.get('mappings', {}),
+                'settings': {'index.refresh_interval': '1s', 'index.number_of_replicas': '1'},
+                'count': 0,
+            }
+            # Creation settings are taken in the flat form the pipeline sends
+            self.state.indexes[parts[0]]['settings'].update(request.get('settings', {}))
+            return self._send_json(200, {'acknowledged': True, 'index': parts[0]})
+        if parts[1:] == ['_settings'] and parts[0] in self.state.indexes:
+            self.state.indexes[parts[0]]['settings'].update(request)
+            return self._send_json(200, {'acknowledged': True})
+        if len(parts) == 3 and parts[1] == '_doc' and parts[0] in self.state.indexes:
+            with self.state.lock:
+                documents = self.state.indexes[parts[0]].setdefault('documents', {})
+                result = 'updated' if parts[2] in documents else 'created'
+                documents[parts[2]] = request
+                self.state.indexes[parts[0]]['count'] = len(documents)
+            return self._send_json(201 if result == 'created' else 200,
+                                   {'_index': parts[0], '_id': parts[2], 'result': result})
+        self._send_json(404, {'error': {'type': 'index_not_found_exception'}, 'status': 404})
+
+    def do_DELETE(self):
+        parts = self._path_parts()
+        if len(parts) == 3 and parts[1] == '_doc':
+            names = self._resolve(parts[0])
+            with self.state.lock:
+                documents = self.state.indexes[names[0]].get('documents', {}) if names else {}
+                if parts[2] not in documents:
+                    return self._send_json(404, {'_id': parts[2], 'result': 'not_found'})
+                del documents[parts[2]]
+                self.state.indexes[names[0]]['count'] = len(documents)
+            return self._send_json(200, {'_index': names[0], '_id': parts[2], 'result': 'deleted'})
+        for name in self._resolve(parts[0]):
+            self._delete_index(name)
+        self._send_json(200, {'acknowledged': True})
+
+    def _delete_index(self, name):
+        self.state.indexes.pop(name, None)
+        for alias in list(self.state.aliases):
+            self.state.aliases[alias].discard(name)
+            if not self.state.aliases[alias]:
+                del self.state.aliases[alias]
+
+    def _update_aliases(self, actions):
+        with self.state.lock:
+            for action in actions:
+                (action_type, spec), = action.items()
+                if action_type == 'add':
+                    self.state.aliases.setdefault(spec['alias'], set()).add(spec['index'])
+                elif action_type == 'remove':
+                    self.state.aliases.get(spec['alias'], set()).discard(spec['index'])
+                    if not self.state.aliases.get(spec['alias'], True):
+                        del self.state.aliases[spec['alias']]
+                elif action_type == 'remove_index':
+                    self._delete_index(spec['index'])
+        self._send_json(200, {'acknowledged': True})
+
+    def do_POST(self):
+        parts = self._path_parts()
+        body, raw_length = self._read_body()
+        if parts == ['_standin', 'reset']:
+            self.state.reset()
+            return self._send_json(200, {'acknowledged': True})
+        if parts and parts[-1] == '_bulk':
+            return self._bulk(body, raw_length)
+        if parts == ['_aliases']:
+            return self._update_aliases(json.loads(body)['actions'])
+        if parts[1:] == ['_count']:
+            return self.do_GET()
+        # _refresh, _forcemerge and similar maintenance calls
+        self._send_json(200, {'_shards': {'total': 1, 'successful': 1, 'failed': 0}})
+
+    def _bulk(self, body, raw_length):
+        start = time.monotonic()
+        if self.state.latency:
+            time.sleep(self.state.latency)
+
+        items = []
+        rejected = 0
+        lines = body.split(b'\n')
+        i = 0
+        while i < len(lines):
+            if not lines[i].strip():
+                i += 1
+                continue
+            op_type, meta = next(iter(json.loads(lines[i]).items()))
+            # Every operation except delete is followed by a source line
+            i += 1 if op_type == 'delete' else 2
+            with self.state.lock:
+                reject = self.state.random.random() < self.state.reject_rate
+            if reject:
+                rejected += 1
+                items.append({op_type: {
+                    '_index': meta.get('_index'), '_id': meta.get('_id'), 'status': 429,
+                    'error': {'type': 'es_rejected_execution_exception', 'reason': 'stand-in rejection'}}})
+                continue
+            index = self.state.indexes.get(meta.get('_index'))
+            if index is not None and op_type != 'delete':
+                index['count'] += 1
+            items.append({op_type: {
+                '_index': meta.get('_index'), '_id': meta.get('_id'),
+                'status': 200 if op_type == 'delete' else 201, 'result': 'created'}})
+
+        with self.state.lock:
+            self.state.stats['bulk_requests'] += 1
+            self.state.stats['bulk_bytes'] += raw_length
+            self.state.stats['operations'] += len(items)
+            self.state.stats['rejected'] += rejected
+
+        took = int((time.monotonic() - start) * 1000)
+        self._send_json(200, {'took': took, 'errors': rejected > 0, 'items': items})
+
+
+def start_stand_in(host='127.0.0.1', port=0, latency=0.0, reject_rate=0.0, seed=None):
+    """Starts a stand-in server in a background thread and returns it; port 0 picks a free port."""
+    handler = type('BoundStandInHandler', (StandInHandler,), {
+        'state': StandInState(latency, reject_rate, seed)})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    logging.info(
+        f"OpenSearch stand-in listening on {host}:{server.server_address[1]} "
+        f"(latency {latency}s, reject rate {reject_rate}).")
+    return server
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Run a local stand-in for the OpenSearch _bulk, indices and ping endpoints.")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=9200)
+    parser.add_argument('--latency', type=float, default=0.0,
+                        help="Seconds added to every _bulk request (default: 0).")
+    parser.add_argument('--reject-rate', type=float, default=0.0,
+                        help="Fraction of bulk operations answered with 429 (default: 0).")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO,
+                        format='%(asctime)s - %(levelname)s - %(message)s')
+    server = start_stand_in(args.host, args.port,
+                            args.latency, args.reject_rate)
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.shutdown()
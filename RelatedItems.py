@@ -0,0 +1,291 @@
+import os
+import sys
+import time
+import logging
+import argparse
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
+
+# MinHash signature length, split into BANDS bands of NUM_PERM / BANDS rows.
+# 32 bands of 2 rows make pairs with a Jaccard similarity of about 0.18 or
+# more likely to share a band
+NUM_PERM = 64
+BANDS = 32
+
+# Neighbours stored per document
+DEFAULT_TOP_K = 10
+
+# Neighbours with a lower estimated Jaccard similarity are not stored
+DEFAULT_MIN_SCORE = 0.1
+
+# Within one band bucket, each document is paired only with the documents
+# up to this many positions away, so a bucket shared by thousands of
+# documents (e.g. one very common topic) cannot blow up the candidate pairs
+DEFAULT_WINDOW = 50
+
+# Rows hashed at once while building signatures
+SIGNATURE_CHUNK_ROWS = 4096
+
+# Rows per record batch when rewriting the Parquet file
+DEFAULT_BATCH_SIZE = 50000
+
+# Documents the related items are computed for: cleaned file, ID column,
+# the column the neighbours are stored in, and the (list column, struct
+# field) pairs whose values make up a document's set. A field of None
+# takes the list values themselves.
+ENTITIES = {
+    'works': {
+        'file': 'papers_clean2.parquet',
+        'id_col': 'openalex_id',
+        'column': 'related_works',
+        'features': [('keywords', 'id'), ('topics', 'id'), ('authors', None)],
+    },
+    'authors': {
+        'file': 'authors_clean_data.parquet',
+        'id_col': 'id',
+        'column': 'similar_authors',
+        'features': [('x_concepts', 'id')],
+    },
+}
+
+RELATED_TYPE = pa.list_(pa.struct([('id', pa.string()), ('score', pa.float32())]))
+
+_MIX_1 = np.uint64(0xbf58476d1ce4e5b9)
+_MIX_2 = np.uint64(0x94d049bb133111eb)
+
+
+def _mix(values):
+    # splitmix64 finalizer; uint64 multiplication wraps around
+    with np.errstate(over='ignore'):
+        values = (values ^ (values >> np.uint64(30))) * _MIX_1
+        values = (values ^ (values >> np.uint64(27))) * _MIX_2
+    return values ^ (values >> np.uint64(31))
+
+
+def feature_tokens(table, features):
+    """Returns (row, token hash) arrays of all set members of all rows, sorted by row.
+
+    Values of different features are hashed apart, so an author and a
+    keyword with the same text are different members.
+    """
+    rows, hashes = [], []
+    for column, field in features:
+        if column not in table.schema.names:
+            logging.warning(f"Column '{column}' not found. Skipping it.")
+            continue
+        lists = table[column].combine_chunks()
+        values = pc.list_flatten(lists)
+        parents = pc.list_parent_indices(lists)
+        if field is not None:
+            values = pc.struct_field(values, field)
+        valid = pc.is_valid(values)
+        values = pc.filter(values, valid).to_numpy(zero_copy_only=False)
+        salt = pd.util.hash_array(np.array([f"{column}.{field}"], dtype=object))[0]
+        rows.append(pc.filter(parents, valid).to_numpy().astype(np.int64))
+        hashes.append(pd.util.hash_array(values.astype(object)) ^ salt)
+    if not rows:
+        return np.empty(0, np.int64), np.empty(0, np.uint64)
+    rows = np.concatenate(rows)
+    order = np.argsort(rows, kind='stable')
+    return rows[order], np.concatenate(hashes)[order]
+
+
+def minhash_signatures(num_rows, rows, hashes, num_perm=NUM_PERM, seed=0):
+    """Returns the (num_rows, num_perm) MinHash signatures and a mask of the rows that have any member.
+
+    Each of the num_perm hash functions mixes the token hash with its own
+    seed; a row's signature is the minimum of each function over its members.
+    """
+    seeds = np.random.default_rng(seed).integers(0, 2 ** 63, num_perm, dtype=np.uint64)
+    signatures = np.full((num_rows, num_perm), np.iinfo(np.uint64).max, dtype=np.uint64)
+    has_members = np.zeros(num_rows, dtype=bool)
+    has_members[rows] = True
+
+    bounds = np.searchsorted(rows, np.arange(0, num_rows + SIGNATURE_CHUNK_ROWS, SIGNATURE_CHUNK_ROWS))
+    for start, end in zip(bounds[:-1], bounds[1:]):
+        if start == end:
+            continue
+        chunk_rows = rows[start:end]
+        starts = np.flatnonzero(np.r_[True, chunk_rows[1:] != chunk_rows[:-1]])
+        permuted = _mix(hashes[start:end, None] ^ seeds[None, :])
+        signatures[chunk_rows[starts]] = np.minimum.reduceat(permuted, starts, axis=0)
+    return signatures, has_members
+
+
+def candidate_pairs(signatures, has_members, bands=BANDS, window=DEFAULT_WINDOW):
+    """Returns the unique (a, b) row pairs, a < b, that share at least one LSH band.
+
+    Band keys are sorted, so documents with the same key are adjacent; each
+    is paired with the following documents of its bucket up to `window`
+    positions away.
+    """
+    num_rows, num_perm = signatures.shape
+    rows_per_band = num_perm // bands
+    members = np.flatnonzero(has_members)
+    pairs = []
+    for band in range(bands):
+        band_values = signatures[members, band * rows_per_band:(band + 1) * rows_per_band]
+        keys = _mix(band_values[:, 0] ^ np.uint64(band))
+        for column in range(1, rows_per_band):
+            keys = _mix(keys ^ band_values[:, column])
+        order = np.argsort(keys, kind='stable')
+        sorted_keys = keys[order]
+        for distance in range(1, window + 1):
+            same = sorted_keys[:-distance] == sorted_keys[distance:]
+            if not same.any():
+                # Keys are sorted: no equal pair at this distance means none further away
+                break
+            first, second = members[order[:-distance][same]], members[order[distance:][same]]
+            pairs.append(np.minimum(first, second) * num_rows + np.maximum(first, second))
+    if not pairs:
+        return np.empty(0, np.int64), np.empty(0, np.int64)
+    codes = np.unique(np.concatenate(pairs))
+    return codes // num_rows, codes % num_rows
+
+
+def estimate_similarity(signatures, first, second, chunk_size=1_000_000):
+    """Estimated Jaccard similarity of row pairs: the share of equal signature positions."""
+    scores = np.empty(len(first), dtype=np.float32)
+    for start in range(0, len(first), chunk_size):
+        end = start + chunk_size
+        scores[start:end] = (signatures[first[start:end]] == signatures[second[start:end]]).mean(axis=1)
+    return scores
+
+
+def top_neighbours(num_rows, first, second, scores, top_k=DEFAULT_TOP_K, min_score=DEFAULT_MIN_SCORE):
+    """Returns (offsets, neighbour rows, scores): the top_k most similar rows of every row, best first.
+
+    Ties are broken by row order, so the result is deterministic.
+    """
+    keep = scores >= min_score
+    source = np.concatenate([first[keep], second[keep]])
+    target = np.concatenate([second[keep], first[keep]])
+    score = np.concatenate([scores[keep], scores[keep]])
+    order = np.lexsort((target, -score, source))
+    source, target, score = source[order], target[order], score[order]
+
+    group_starts = np.flatnonzero(np.r_[True, source[1:] != source[:-1]]) if len(source) else np.empty(0, np.int64)
+    group_sizes = np.diff(np.r_[group_starts, len(source)])
+    rank = np.arange(len(source)) - np.repeat(group_starts, group_sizes)
+    top = rank < top_k
+    source, target, score = source[top], target[top], score[top]
+
+    offsets = np.zeros(num_rows + 1, dtype=np.int32)
+    np.cumsum(np.bincount(source, minlength=num_rows), out=offsets[1:])
+    return offsets, target, score
+
+
+def related_items(table, id_col, features, top_k=DEFAULT_TOP_K, min_score=DEFAULT_MIN_SCORE,
+                  window=DEFAULT_WINDOW, num_perm=NUM_PERM, bands=BANDS):
+    """Computes the related items column of a table: per row a list of {id, score}, best first.
+
+    The index holds one document per ID, so an ID repeated over several
+    rows (one per university) is one item: its neighbours are computed from
+    its last row, as indexed, and given to each of its rows. An item is
+    never its own neighbour. Rows without an ID get null.
+    """
+    start_time = time.time()
+    ids = pc.cast(table[id_col], pa.string()).combine_chunks().dictionary_encode()
+    item_ids = ids.dictionary
+    row_items = ids.indices
+    valid = np.flatnonzero(row_items.is_valid().to_numpy(zero_copy_only=False))
+    last_rows = np.full(len(item_ids), -1, dtype=np.int64)
+    np.maximum.at(last_rows, row_items.fill_null(0).to_numpy()[valid], valid)
+    items = table.take(pa.array(last_rows))
+
+    num_items = items.num_rows
+    rows, hashes = feature_tokens(items, features)
+    signatures, has_members = minhash_signatures(num_items, rows, hashes, num_perm)
+    first, second = candidate_pairs(signatures, has_members, bands, window)
+    scores = estimate_similarity(signatures, first, second)
+    offsets, target, score = top_neighbours(num_items, first, second, scores, top_k, min_score)
+
+    neighbours = pa.StructArray.from_arrays(
+        [item_ids.take(pa.array(target)), pa.array(score, pa.float32())], fields=list(RELATED_TYPE.value_type))
+    related = pa.ListArray.from_arrays(pa.array(offsets), neighbours, type=RELATED_TYPE)
+    with_related = int(np.count_nonzero(np.diff(offsets)))
+    logging.info(
+        f"Related items: {int(has_members.sum())} of {num_items} items ({table.num_rows} rows) have features, "
+        f"{len(first)} candidate pairs, {with_related} items got neighbours "
+        f"({len(target) / max(with_related, 1):.1f} on average) in {time.time() - start_time:.1f}s.")
+    return related.take(row_items)
+
+
+def add_related_items(entity, input_path, output_path, top_k=DEFAULT_TOP_K, min_score=DEFAULT_MIN_SCORE,
+                      window=DEFAULT_WINDOW, batch_size=DEFAULT_BATCH_SIZE):
+    """Writes input_path with the entity's related items column added (or replaced) to output_path.
+
+    Only the ID and feature columns are loaded to compute the neighbours;
+    the file itself is rewritten batch by batch under a temporary name,
+    so output_path may be input_path.
+    """
+    rules = ENTITIES[entity]
+    parquet_file = pq.ParquetFile(input_path)
+    input_schema = parquet_file.schema_arrow
+    feature_columns = [column for column, _ in rules['features'] if column in input_schema.names]
+    table = pq.read_table(input_path, columns=[rules['id_col']] + feature_columns)
+    related = related_items(table, rules['id_col'], rules['features'], top_k, min_score, window)
+
+    columns = [name for name in input_schema.names if name != rules['column']]
+    output_schema = pa.schema([input_schema.field(name) for name in columns] +
+                              [pa.field(rules['column'], RELATED_TYPE)])
+    temp_path = output_path + '.tmp'
+    writer = pq.ParquetWriter(temp_path, output_schema)
+    offset = 0
+    try:
+        for batch in parquet_file.iter_batches(batch_size=batch_size, columns=columns):
+            arrays = batch.columns + [related.slice(offset, batch.num_rows)]
+            writer.write_batch(pa.RecordBatch.from_arrays(arrays, schema=output_schema))
+            offset += batch.num_rows
+    except BaseException:
+        writer.close()
+        os.remove(temp_path)
+        raise
+    writer.close()
+    os.replace(temp_path, output_path)
+    logging.info(f"Wrote {output_path} with column '{rules['column']}'.")
+
+
+def parse_args(argv=None):
+    """Parses the command line options of the related items stage."""
+    parser = argparse.ArgumentParser(
+        description="Store the most similar works or authors (MinHash LSH over topics, keywords, authors "
+                    "and concepts) in each row of a cleaned Parquet file.")
+    parser.add_argument('entity', choices=list(ENTITIES))
+    parser.add_argument(
+        '--input', default=None, metavar='FILE',
+        help="Cleaned Parquet file (default: the file indexed for the entity).")
+    parser.add_argument(
+        '--output', default=None, metavar='FILE',
+        help="Output Parquet file (default: the input file, replaced).")
+    parser.add_argument(
+        '--top-k', type=int, default=DEFAULT_TOP_K,
+        help=f"Neighbours stored per row (default: {DEFAULT_TOP_K}).")
+    parser.add_argument(
+        '--min-score', type=float, default=DEFAULT_MIN_SCORE,
+        help=f"Lowest estimated Jaccard similarity of a stored neighbour (default: {DEFAULT_MIN_SCORE}).")
+    parser.add_argument(
+        '--window', type=int, default=DEFAULT_WINDOW,
+        help=f"Documents paired with each document within one LSH bucket (default: {DEFAULT_WINDOW}).")
+    parser.add_argument(
+        '--batch-size', type=int, default=DEFAULT_BATCH_SIZE,
+        help=f"Rows per record batch when rewriting the file (default: {DEFAULT_BATCH_SIZE}).")
+    return parser.parse_args(argv)
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    logging.basicConfig(level=logging.INFO,
+                        format='%(asctime)s - %(levelname)s - %(message)s')
+
+    input_path = args.input or ENTITIES[args.entity]['file']
+    output_path = args.output or input_path
+    try:
+        add_related_items(args.entity, input_path, output_path, args.top_k, args.min_score, args.window,
+                          args.batch_size)
+    except FileNotFoundError:
+        logging.error(f"File not found at '{input_path}'")
+        sys.exit(1)
@@ -0,0 +1,196 @@
+const opensearchClient = require('./opensearchClient');
+
+// Cached responses kept at most, least recently used evicted first
+const MAX_ENTRIES = parseInt(process.env.SEARCH_CACHE_MAX_ENTRIES || '500', 10);
+// How long a cached response may be served, even if its index is unchanged
+const TTL_MS = parseInt(process.env.SEARCH_CACHE_TTL_MS || '60000', 10);
+// How long an index version is trusted before it is looked up again
+const VERSION_TTL_MS = parseInt(process.env.SEARCH_CACHE_VERSION_TTL_MS || '5000', 10);
+
+// --- LRU cache with TTL, built on the insertion order of a Map ---
+class LruCache {
+    constructor(maxEntries, ttlMs) {
+        this.maxEntries = maxEntries;
+        this.ttlMs = ttlMs;
+        this.entries = new Map();
+        this.hits = 0;
+        this.misses = 0;
+    }
+
+    get(key) {
+        const entry = this.entries.get(key);
+        if (!entry || entry.expires <= Date.now()) {
+            this.entries.delete(key);
+            this.misses++;
+            return undefined;
+        }
+        // Move to the end: most recently used
+        this.entries.delete(key);
+        this.entries.set(key, entry);
+        this.hits++;
+        return entry.value;
+    }
+
+    set(key, value) {
+        this.entries.delete(key);
+        this.entries.set(key, { value, expires: Date.now() + this.ttlMs });
+        while (this.entries.size > this.maxEntries) {
+            this.entries.delete(this.entries.keys().next().value);
+        }
+    }
+}
+
+const responses = new LruCache(MAX_ENTRIES, TTL_MS);
+const versions = new Map();
+const inFlight = new Map();
+
+// JSON with object keys sorted, so equal query bodies give equal cache keys
+function normalize(value) {
+    if (Array.isArray(value)) {
+        return `[${value.map(normalize).join(',')}]`;
+    }
+    if (value && typeof value === 'object') {
+        return `{${Object.keys(value).sort()
+            .filter((key) => value[key] !== undefined)
+            .map((key) => `${JSON.stringify(key)}:${normalize(value[key])}`).join(',')}}`;
+    }
+    return JSON.stringify(value);
+}
+
+// Version of an index (or alias): the UUIDs of the indexes behind it and
+// their write and refresh counters. A rebuild swaps the UUID, any indexed or
+// deleted document bumps the write counters and the refresh that makes it
+// searchable bumps the refresh counter, so a response cached between a write
+// and its refresh never outlives the refresh.
+// A missing index (e.g. no rollups written yet) has the version 'absent'.
+async function indexVersion(index) {
+    const known = versions.get(index);
+    if (known && known.expires > Date.now()) {
+        return known.version;
+    }
+    let result;
+    try {
+        result = await opensearchClient.indices.stats({ index, metric: ['indexing', 'refresh'] });
+    } catch (error) {
+        if (!error.meta || error.meta.statusCode !== 404) {
+            throw error;
+        }
+        versions.set(index, { version: 'absent', expires: Date.now() + VERSION_TTL_MS });
+        return 'absent';
+    }
+    const version = Object.entries(result.body.indices)
+        .sort(([a], [b]) => a.localeCompare(b))
+        .map(([, stats]) => {
+            const { indexing, refresh } = stats.primaries;
+            return `${stats.uuid}:${indexing.index_total}:${indexing.delete_total}:${refresh.total}`;
+        })
+        .join(',');
+    versions.set(index, { version, expires: Date.now() + VERSION_TTL_MS });
+    return version;
+}
+
+// Cache key of a request against an index, or null if the index version is
+// unknown (the request is then sent uncached)
+async function cacheKey(index, request) {
+    try {
+        return `${index}|${await indexVersion(index)}|${normalize(request)}`;
+    } catch (error) {
+        console.error(`Error reading the version of index ${index}:`, error.meta ? error.meta.body : error);
+        return null;
+    }
+}
+
+// Runs fetch() unless an equal request is cached or already in flight.
+// Concurrent identical requests share one OpenSearch call; only successful
+// responses are cached.
+async function cached(index, request, fetch) {
+    const key = await cacheKey(index, request);
+    if (key === null) {
+        return fetch();
+    }
+    const hit = responses.get(key);
+    if (hit !== undefined) {
+        return hit;
+    }
+    if (inFlight.has(key)) {
+        return inFlight.get(key);
+    }
+    const pending = fetch()
+        .then((value) => {
+            responses.set(key, value);
+            return value;
+        })
+        .finally(() => inFlight.delete(key));
+    inFlight.set(key, pending);
+    return pending;
+}
+
+// Batch form of cached() for _msearch: requests that are neither cached nor
+// in flight are fetched together by one fetchMany(requests) call, which
+// resolves to one { value } or { error } per request. Resolves to the
+// Promise.allSettled results, in the order of `items` ({ index, request }).
+async function cachedBatch(items, fetchMany) {
+    const keys = await Promise.all(items.map((item) => cacheKey(item.index, item.request)));
+    const results = new Array(items.length);
+    const missing = [];
+    const firstMissing = new Map();
+    const duplicates = [];
+    keys.forEach((key, i) => {
+        if (key !== null) {
+            const hit = responses.get(key);
+            if (hit !== undefined) {
+                results[i] = hit;
+                return;
+            }
+            if (inFlight.has(key)) {
+                results[i] = inFlight.get(key);
+                return;
+            }
+            // The same request twice in one batch is fetched once
+            if (firstMissing.has(key)) {
+                duplicates.push([i, firstMissing.get(key)]);
+                return;
+            }
+            firstMissing.set(key, i);
+        }
+        missing.push(i);
+    });
+
+    if (missing.length > 0) {
+        const batch = fetchMany(missing.map((i) => items[i]));
+        missing.forEach((i, position) => {
+            const key = keys[i];
+            const pending = batch.then((values) => {
+                const { value, error } = values[position];
+                if (error) {
+                    throw error;
+                }
+                if (key !== null) {
+                    responses.set(key, value);
+                }
+                return value;
+            });
+            if (key === null) {
+                results[i] = pending;
+                return;
+            }
+            results[i] = pending.finally(() => inFlight.delete(key));
+            inFlight.set(key, results[i]);
+        });
+    }
+    duplicates.forEach(([i, first]) => {
+        results[i] = results[first];
+    });
+    return Promise.allSettled(results);
+}
+
+function stats() {
+    return {
+        entries: responses.entries.size,
+        hits: responses.hits,
+        misses: responses.misses,
+        inFlight: inFlight.size,
+    };
+}
+
+module.exports = { LruCache, normalize, cacheKey, cached, cachedBatch, stats };
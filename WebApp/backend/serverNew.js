@@ -2,6 +2,7 @@ const express = require('express');
 const cors = require('cors');
 require('dotenv').config();
 const opensearchClient = require('./opensearchClient');
+const searchCache = require('./searchCache');
 
 const app = express();
 const PORT = process.env.PORT || 3001;
@@ -9,12 +10,49 @@ const PORT = process.env.PORT || 3001;
 app.use(cors());
 app.use(express.json());
 
-// --- Generic Search Helper Function ---
-async function executeOpenSearchQuery(targetIndex, queryText, filters, page, pageSize, sortBy, defaultSortField, defaultSortOrder = "desc") {
+// Summary index with per-university facet counts, written by the indexing
+// pipeline with --rollups (one document per search index)
+const ROLLUPS_INDEX = process.env.OPENSEARCH_ROLLUPS_INDEX || 'university_rollups';
+
+// Index, default sort and unique ID field (the tiebreaker of cursor pagination)
+// of each search type, used by the search endpoints and /api/msearch
+const SEARCH_TYPES = {
+    papers: { index: process.env.OPENSEARCH_PAPERS_INDEX, sortField: "publication_date", sortOrder: "desc", idField: "openalex_id" },
+    authors: { index: process.env.OPENSEARCH_AUTHORS_INDEX, sortField: "display_name.keyword", sortOrder: "asc", idField: "id" },
+    projects: { index: process.env.OPENSEARCH_PROJECTS_INDEX, sortField: "startDate", sortOrder: "desc", idField: "id" },
+};
+
+// Returns the precomputed rollup document of an index, or null if there is none
+async function readRollups(targetIndex) {
+    return searchCache.cached(ROLLUPS_INDEX, { rollups: targetIndex }, async () => {
+        try {
+            const result = await opensearchClient.get({ index: ROLLUPS_INDEX, id: targetIndex });
+            return result.body._source;
+        } catch (error) {
+            if (!error.meta || error.meta.statusCode !== 404) {
+                console.error(`Error reading rollups for ${targetIndex}:`, error.meta ? error.meta.body : error);
+            }
+            return null;
+        }
+    });
+}
+
+function isLandingRequest(queryText, filters) {
+    return !(queryText && queryText.trim() !== "") && Object.keys(filters).length === 0;
+}
+
+function formatSearchResult(body) {
+    return {
+        hits: body.hits.hits.map(hit => ({ id: hit._id, ...hit._source, score: hit._score })),
+        // Absent when total hits are not tracked (cursor continuation pages)
+        total: body.hits.total ? body.hits.total.value : null,
+        aggregations: body.aggregations || {}
+    };
+}
+
+// --- Query Body Builder ---
+function buildQueryBody(targetIndex, queryText, filters, page, pageSize, sortBy, defaultSortField, defaultSortOrder = "desc") {
     const from = (page - 1) * pageSize;
-    console.log(`Executing search on index '${targetIndex}':`, { queryText, filters, page, pageSize, sortBy });
-    console.log('AAA', targetIndex);
-    console.log('BBB',process.env.OPENSEARCH_PAPERS_INDEX,process.env.OPENSEARCH_AUTHORS_INDEX,process.env.OPENSEARCH_PROJECTS_INDEX);
     const hasQueryText = queryText && queryText.trim() !== "";
     const hasFilters = Object.keys(filters).length > 0;
 
@@ -125,73 +163,305 @@ async function executeOpenSearchQuery(targetIndex, queryText, filters, page, pag
     }
     // If hasQueryText and no sortBy, OpenSearch sorts by _score by default
 
-    console.log(`Constructed OpenSearch Query for ${targetIndex}:`, JSON.stringify(osQueryBody, null, 2));
+    return osQueryBody;
+}
+
+// --- Generic Search Helper Function ---
+async function executeOpenSearchQuery(targetIndex, queryText, filters, page, pageSize, sortBy, defaultSortField, defaultSortOrder = "desc") {
+    // The landing view only needs facet counts: serve them from the rollups
+    // instead of aggregating over the whole index
+    if (isLandingRequest(queryText, filters)) {
+        const rollups = await readRollups(targetIndex);
+        if (rollups) {
+            return { hits: [], total: rollups.total, aggregations: rollups.aggregations };
+        }
+    }
+
+    const osQueryBody = buildQueryBody(targetIndex, queryText, filters, page, pageSize, sortBy, defaultSortField, defaultSortOrder);
+    return searchCache.cached(targetIndex, osQueryBody, async () => {
+        try {
+            const result = await opensearchClient.search({
+                index: targetIndex,
+                body: osQueryBody
+            });
+            return formatSearchResult(result.body);
+        } catch (error) {
+            console.error(`Error in executeOpenSearchQuery for ${targetIndex}:`, error.meta ? error.meta.body : error);
+            // Re-throw a more generic error or a structured error for the route handler
+            throw new Error(`OpenSearch query failed for index ${targetIndex}: ${error.message}`);
+        }
+    });
+}
+
+// --- Cursor Pagination ---
+// A point-in-time (PIT) freezes the index for a result list; every page
+// extends its keep-alive. Pages follow each other with search_after on the
+// sort values of the last hit, so page 1000 costs as much as page one and
+// max_result_window does not apply.
+const PIT_KEEP_ALIVE = process.env.OPENSEARCH_PIT_KEEP_ALIVE || '5m';
+
+function httpError(status, message) {
+    const error = new Error(message);
+    error.status = status;
+    return error;
+}
+
+// Cursors are opaque to the client: base64url JSON of the search type, PIT,
+// sort and the sort values of the last hit
+function encodeCursor(state) {
+    return Buffer.from(JSON.stringify(state)).toString('base64url');
+}
 
+function decodeCursor(cursor) {
     try {
-        const result = await opensearchClient.search({
-            index: targetIndex,
-            body: osQueryBody
-        });
-        return {
-            hits: result.body.hits.hits.map(hit => ({ id: hit._id, ...hit._source, score: hit._score })),
-            total: result.body.hits.total.value,
-            aggregations: result.body.aggregations || {}
-        };
+        return JSON.parse(Buffer.from(cursor, 'base64url').toString('utf8'));
+    } catch (error) {
+        return null;
+    }
+}
+
+async function closePit(pitId) {
+    try {
+        await opensearchClient.deletePit({ body: { pit_id: [pitId] } });
+    } catch (error) {
+        console.error(`Error closing point-in-time:`, error.meta ? error.meta.body : error);
+    }
+}
+
+// Returns one page of a cursor-paginated search and the cursor of the next
+// page (null after the last page). Without a cursor a new PIT is opened and
+// the first page is returned with total and aggregations; continuation pages
+// skip both. The same queryText and filters must be sent with every page.
+async function executeCursorQuery(type, queryText, filters, pageSize, sortBy, cursor) {
+    const searchType = SEARCH_TYPES[type];
+    const osQueryBody = buildQueryBody(searchType.index, queryText, filters, 1, pageSize, sortBy,
+        searchType.sortField, searchType.sortOrder);
+    delete osQueryBody.from;
+    osQueryBody.size = pageSize;
+
+    let state;
+    if (cursor) {
+        state = decodeCursor(cursor);
+        if (!state || state.type !== type || !state.pit || !Array.isArray(state.after)) {
+            throw httpError(400, 'Invalid cursor');
+        }
+        delete osQueryBody.aggs;
+        osQueryBody.track_total_hits = false;
+        osQueryBody.search_after = state.after;
+    } else {
+        // Relevance order unless sorted; the unique ID breaks ties so no hit
+        // is skipped or repeated between pages
+        const sort = [...(osQueryBody.sort || [{ _score: { order: "desc" } }]), { [searchType.idField]: { order: "asc" } }];
+        const pit = await opensearchClient.createPit({ index: searchType.index, keep_alive: PIT_KEEP_ALIVE });
+        state = { type, pit: pit.body.pit_id, sort };
+    }
+    osQueryBody.sort = state.sort;
+    osQueryBody.pit = { id: state.pit, keep_alive: PIT_KEEP_ALIVE };
+
+    let result;
+    try {
+        result = await opensearchClient.search({ body: osQueryBody });
     } catch (error) {
-        console.error(`Error in executeOpenSearchQuery for ${targetIndex}:`, error.meta ? error.meta.body : error);
-        // Re-throw a more generic error or a structured error for the route handler
-        throw new Error(`OpenSearch query failed for index ${targetIndex}: ${error.message}`);
+        // An expired or closed PIT has no search context left
+        if (error.meta && (error.meta.statusCode === 404 || JSON.stringify(error.meta.body).includes('search_context_missing'))) {
+            throw httpError(410, 'Cursor expired, start the search again');
+        }
+        console.error(`Error in executeCursorQuery for ${searchType.index}:`, error.meta ? error.meta.body : error);
+        throw new Error(`OpenSearch query failed for index ${searchType.index}: ${error.message}`);
+    }
+
+    const hits = result.body.hits.hits;
+    // The PIT ID may change between pages; always continue with the latest
+    const pitId = result.body.pit_id || state.pit;
+    let nextCursor = null;
+    if (hits.length === pageSize) {
+        nextCursor = encodeCursor({ type, pit: pitId, sort: state.sort, after: hits[hits.length - 1].sort });
+    } else {
+        await closePit(pitId);
     }
+    return { ...formatSearchResult(result.body), cursor: nextCursor };
+}
+
+// Runs several searches in one _msearch round trip. Each search is
+// { type, queryText, filters, page, pageSize, sortBy } with type one of
+// SEARCH_TYPES; cached and in-flight searches are not sent again.
+async function executeMultiSearch(searches) {
+    const items = await Promise.all(searches.map(async (search) => {
+        const { type, queryText, filters = {}, page = 1, pageSize = 10, sortBy = null } = search;
+        const searchType = SEARCH_TYPES[type];
+        if (!searchType) {
+            return { error: new Error(`Unknown search type '${type}'`) };
+        }
+        if (isLandingRequest(queryText, filters)) {
+            const rollups = await readRollups(searchType.index);
+            if (rollups) {
+                return { value: { hits: [], total: rollups.total, aggregations: rollups.aggregations } };
+            }
+        }
+        return {
+            index: searchType.index,
+            request: buildQueryBody(searchType.index, queryText, filters, page, pageSize, sortBy,
+                searchType.sortField, searchType.sortOrder)
+        };
+    }));
+
+    const toSend = items.filter(item => item.request);
+    const settled = await searchCache.cachedBatch(toSend, async (requests) => {
+        const result = await opensearchClient.msearch({
+            body: requests.flatMap(({ index, request }) => [{ index }, request])
+        });
+        return result.body.responses.map((response, i) => (response.error
+            ? { error: new Error(`OpenSearch query failed for index ${requests[i].index}: ${response.error.reason || response.error.type}`) }
+            : { value: formatSearchResult(response) }));
+    });
+
+    let next = 0;
+    return items.map((item) => {
+        if (!item.request) {
+            return item.error ? { error: item.error.message } : item.value;
+        }
+        const outcome = settled[next++];
+        return outcome.status === 'fulfilled' ? outcome.value : { error: outcome.reason.message };
+    });
 }
 
 
 // --- Papers Search Endpoint ---
 app.post('/api/search/papers', async (req, res) => {
-    const { queryText, filters = {}, page = 1, pageSize = 10, sortBy = null } = req.body;
+    const { queryText, filters = {}, page = 1, pageSize = 10, sortBy = null, pagination = null, cursor = null } = req.body;
     try {
-
-        console.log('aaa',process.env.OPENSEARCH_PAPERS_INDEX);
+        if (cursor || pagination === "cursor") {
+            return res.json(await executeCursorQuery("papers", queryText, filters, pageSize, sortBy, cursor));
+        }
+        const { index, sortField, sortOrder } = SEARCH_TYPES.papers;
         const responseData = await executeOpenSearchQuery(
-            process.env.OPENSEARCH_PAPERS_INDEX,
-            queryText, filters, page, pageSize, sortBy,
-            "publication_date", "desc" // Default sort field and order for papers
+            index, queryText, filters, page, pageSize, sortBy, sortField, sortOrder
         );
         res.json(responseData);
     } catch (error) {
         console.error(`Papers Search Endpoint Error:`, error);
-        res.status(500).json({ message: 'Error querying for papers', error: error.message });
+        res.status(error.status || 500).json({ message: 'Error querying for papers', error: error.message });
     }
 });
 
 // --- Authors Search Endpoint ---
 app.post('/api/search/authors', async (req, res) => {
-    const { queryText, filters = {}, page = 1, pageSize = 10, sortBy = null } = req.body;
+    const { queryText, filters = {}, page = 1, pageSize = 10, sortBy = null, pagination = null, cursor = null } = req.body;
     try {
+        if (cursor || pagination === "cursor") {
+            return res.json(await executeCursorQuery("authors", queryText, filters, pageSize, sortBy, cursor));
+        }
+        const { index, sortField, sortOrder } = SEARCH_TYPES.authors;
         const responseData = await executeOpenSearchQuery(
-            process.env.OPENSEARCH_AUTHORS_INDEX,
-            queryText, filters, page, pageSize, sortBy,
-            "display_name", "asc" // Default sort field and order for authors
+            index, queryText, filters, page, pageSize, sortBy, sortField, sortOrder
         );
         res.json(responseData);
     } catch (error) {
         console.error(`Authors Search Endpoint Error:`, error);
-        res.status(500).json({ message: 'Error querying for authors', error: error.message });
+        res.status(error.status || 500).json({ message: 'Error querying for authors', error: error.message });
     }
 });
 
 // --- Projects Search Endpoint ---
 app.post('/api/search/projects', async (req, res) => {
-    const { queryText, filters = {}, page = 1, pageSize = 10, sortBy = null } = req.body;
+    const { queryText, filters = {}, page = 1, pageSize = 10, sortBy = null, pagination = null, cursor = null } = req.body;
     try {
+        if (cursor || pagination === "cursor") {
+            return res.json(await executeCursorQuery("projects", queryText, filters, pageSize, sortBy, cursor));
+        }
+        const { index, sortField, sortOrder } = SEARCH_TYPES.projects;
         const responseData = await executeOpenSearchQuery(
-            process.env.OPENSEARCH_PROJECTS_INDEX,
-            queryText, filters, page, pageSize, sortBy,
-            "startDate", "desc" // Default sort field and order for projects
+            index, queryText, filters, page, pageSize, sortBy, sortField, sortOrder
         );
         res.json(responseData);
     } catch (error) {
         console.error(`Projects Search Endpoint Error:`, error);
-        res.status(500).json({ message: 'Error querying for projects', error: error.message });
+        res.status(error.status || 500).json({ message: 'Error querying for projects', error: error.message });
+    }
+});
+
+// --- Typeahead ---
+// Suggest index built by OpenSearchIndexSuggest.py: completion suggestions of
+// paper titles, author names, project acronyms and titles, and topic names
+const SUGGEST_INDEX = process.env.OPENSEARCH_SUGGEST_INDEX || 'university_suggest';
+const SUGGEST_KINDS = ['paper', 'author', 'project', 'topic'];
+const SUGGEST_MAX_SIZE = 20;
+
+// Returns the top `size` suggestions per kind for a prefix, in one request
+// with one completion suggester per kind
+async function executeSuggest(prefix, kinds, size, universityKey, fuzzy) {
+    const suggest = {};
+    for (const kind of kinds) {
+        const contexts = { kind: [kind] };
+        if (universityKey) {
+            contexts.university_key = [universityKey];
+        }
+        suggest[kind] = {
+            prefix,
+            completion: {
+                field: 'suggest', size, skip_duplicates: true, contexts,
+                ...(fuzzy ? { fuzzy: { fuzziness: 1, prefix_length: 2 } } : {})
+            }
+        };
+    }
+    const body = { _source: ['kind', 'ref_id', 'text', 'university_key'], suggest };
+
+    return searchCache.cached(SUGGEST_INDEX, body, async () => {
+        try {
+            const result = await opensearchClient.search({ index: SUGGEST_INDEX, body });
+            const suggestions = {};
+            for (const kind of kinds) {
+                suggestions[kind] = result.body.suggest[kind][0].options.map(option => ({
+                    text: option._source.text,
+                    id: option._source.ref_id,
+                    university_key: option._source.university_key,
+                    score: option._score
+                }));
+            }
+            return suggestions;
+        } catch (error) {
+            console.error(`Error in executeSuggest:`, error.meta ? error.meta.body : error);
+            throw new Error(`OpenSearch suggest failed for index ${SUGGEST_INDEX}: ${error.message}`);
+        }
+    });
+}
+
+// --- Suggest Endpoint ---
+// GET /api/suggest?q=grap&kinds=paper,author&university_key=PL_ZUT&size=5&fuzzy=true
+// Responds with { suggestions: { paper: [{ text, id, university_key, score }], ... } }
+app.get('/api/suggest', async (req, res) => {
+    // The completion analyzer lowercases anyway; lowercasing here lets more requests share a cache entry
+    const prefix = (req.query.q || '').trim().toLowerCase();
+    if (!prefix) {
+        return res.json({ suggestions: {} });
+    }
+    const kinds = req.query.kinds ? req.query.kinds.split(',').filter(kind => SUGGEST_KINDS.includes(kind)) : SUGGEST_KINDS;
+    if (kinds.length === 0) {
+        return res.status(400).json({ message: `kinds must be any of ${SUGGEST_KINDS.join(', ')}` });
+    }
+    const size = Math.min(Math.max(parseInt(req.query.size, 10) || 5, 1), SUGGEST_MAX_SIZE);
+    try {
+        const suggestions = await executeSuggest(prefix, kinds, size, req.query.university_key, req.query.fuzzy === 'true');
+        res.json({ suggestions });
+    } catch (error) {
+        console.error(`Suggest Endpoint Error:`, error);
+        res.status(500).json({ message: 'Error fetching suggestions', error: error.message });
+    }
+});
+
+// --- Multi-Search Endpoint ---
+// Body: { searches: [{ type: "papers" | "authors" | "projects", queryText, filters, page, pageSize, sortBy }, ...] }
+// Responds with one result (or { error }) per search, in order.
+app.post('/api/msearch', async (req, res) => {
+    const { searches = [] } = req.body;
+    if (!Array.isArray(searches) || searches.length === 0) {
+        return res.status(400).json({ message: 'Expected a non-empty "searches" array' });
+    }
+    try {
+        res.json({ responses: await executeMultiSearch(searches) });
+    } catch (error) {
+        console.error(`Multi-Search Endpoint Error:`, error);
+        res.status(500).json({ message: 'Error running the searches', error: error.message });
     }
 });
 
@@ -0,0 +1,20 @@
+import os
+import sys
+import tempfile
+
+import pytest
+
+# The modules live at the top of the repository, next to this directory
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def pytest_configure(config):
+    # OpenSearchIndexing opens pipeline.log in the working directory on import
+    os.chdir(tempfile.mkdtemp(prefix='mastersproject-tests-'))
+
+
+@pytest.fixture(autouse=True)
+def working_dir(tmp_path, monkeypatch):
+    """Runs every test in its own directory, so manifests, checkpoints and caches start empty."""
+    monkeypatch.chdir(tmp_path)
+    return tmp_path
@@ -0,0 +1,125 @@
+import json
+
+import pytest
+from opensearchpy import exceptions
+from opensearchpy.serializer import JSONSerializer
+
+from AdaptiveBulk import AdaptiveBatchController, iter_adaptive_chunks, send_adaptive_chunk
+
+
+class FakeBulkClient:
+    """Answers bulk requests from a list of responses: a status per document, or an exception."""
+
+    def __init__(self, responses):
+        self.responses = list(responses)
+        self.bodies = []
+
+    def bulk(self, body, request_timeout=None):
+        self.bodies.append(body)
+        response = self.responses.pop(0)
+        if isinstance(response, Exception):
+            raise response
+        ids = [json.loads(line)['index']['_id'] for line in body.decode().splitlines()[::2]]
+        items = []
+        for doc_id, status in zip(ids, response):
+            info = {'_id': doc_id, 'status': status}
+            if status == 429:
+                info['error'] = {'type': 'es_rejected_execution_exception', 'reason': 'queue full'}
+            items.append({'index': info})
+        return {'took': 5, 'errors': any(status >= 300 for status in response), 'items': items}
+
+
+def encoded(*ids):
+    return [(json.dumps({'index': {'_index': 'test', '_id': doc_id}}) + '\n{}\n').encode() for doc_id in ids]
+
+
+def controller(**options):
+    return AdaptiveBatchController(initial_docs=100, min_docs=10, max_docs=1000, target_latency=2.0, **options)
+
+
+def test_fast_full_request_grows():
+    batch = controller()
+    batch.observe(100, 1000, 0.1, 50, 0)
+    assert batch.docs == 126
+
+
+def test_fast_request_limited_by_bytes_does_not_grow():
+    batch = controller()
+    batch.observe(40, 1000, 0.1, 50, 0)
+    assert batch.docs == 100
+
+
+def test_slow_request_shrinks_towards_target():
+    batch = controller()
+    batch.observe(100, 1000, 4.0, 3900, 0)
+    assert batch.docs == 50
+
+
+def test_rejection_halves_down_to_minimum():
+    batch = controller()
+    for _ in range(5):
+        batch.observe(100, 1000, 0.1, 50, 3)
+    assert batch.docs == 10
+    assert batch.rejections == 15
+
+
+def test_growth_is_capped():
+    batch = AdaptiveBatchController(initial_docs=900, max_docs=1000)
+    batch.observe(900, 1000, 0.1, 50, 0)
+    assert batch.docs == 1000
+
+
+def test_chunks_respect_document_and_byte_limits():
+    actions = [{'_index': 'test', '_id': str(i), '_source': {'text': 'x' * 50}} for i in range(10)]
+    by_docs = list(iter_adaptive_chunks(actions, AdaptiveBatchController(initial_docs=4), JSONSerializer()))
+    assert [len(chunk) for chunk in by_docs] == [4, 4, 2]
+
+    size = len(by_docs[0][0])
+    by_bytes = list(iter_adaptive_chunks(
+        actions, AdaptiveBatchController(initial_docs=100, max_bytes=3 * size), JSONSerializer()))
+    assert [len(chunk) for chunk in by_bytes] == [3, 3, 3, 1]
+
+
+def test_rejected_items_are_retried_alone():
+    client = FakeBulkClient([[201, 429, 201, 429], [201, 201]])
+    batch = controller()
+    results = send_adaptive_chunk(client, encoded('a', 'b', 'c', 'd'), batch, initial_backoff=0)
+
+    assert sorted((info['index']['_id'], ok) for ok, info in results) == \
+        [('a', True), ('b', True), ('c', True), ('d', True)]
+    assert b'"a"' not in client.bodies[1] and b'"b"' in client.bodies[1]
+    assert batch.requests == 2
+    assert batch.rejections == 2
+
+
+def test_rejected_items_fail_after_max_retries():
+    client = FakeBulkClient([[201, 429], [429], [429]])
+    results = send_adaptive_chunk(client, encoded('a', 'b'), controller(), max_retries=2, initial_backoff=0)
+
+    assert sorted((info['index']['_id'], ok) for ok, info in results) == [('a', True), ('b', False)]
+    assert len(client.bodies) == 3
+
+
+def test_rejected_request_is_sent_again():
+    client = FakeBulkClient([exceptions.TransportError(429, 'rejected', {}), [201, 201]])
+    batch = controller()
+    results = send_adaptive_chunk(client, encoded('a', 'b'), batch, initial_backoff=0)
+
+    assert [ok for ok, _ in results] == [True, True]
+    assert client.bodies[0] == client.bodies[1]
+    assert batch.rejections == 2
+    assert batch.docs == 50
+
+
+def test_other_errors_are_raised():
+    client = FakeBulkClient([exceptions.TransportError(500, 'boom', {})])
+    with pytest.raises(exceptions.TransportError):
+        send_adaptive_chunk(client, encoded('a'), controller(), initial_backoff=0)
+
+
+def test_non_rejection_failures_are_not_retried():
+    client = FakeBulkClient([[201, 400]])
+    results = send_adaptive_chunk(client, encoded('a', 'b'), controller(), initial_backoff=0)
+
+    assert [ok for ok, _ in results] == [True, False]
+    assert len(client.bodies) == 1
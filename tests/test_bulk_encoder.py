@@ -0,0 +1,46 @@
+import datetime
+import decimal
+import json
+
+import numpy as np
+
+from BulkEncoder import OrjsonSerializer, encode_action
+
+
+def decode(lines):
+    action, source = lines.decode('utf-8').splitlines()
+    return json.loads(action), json.loads(source)
+
+
+def test_action_and_source_lines():
+    lines = encode_action('papers', 'W1', {'title': 'Łódź', 'year': 2020})
+    assert lines.endswith(b'\n') and lines.count(b'\n') == 2
+    assert decode(lines) == ({'index': {'_index': 'papers', '_id': 'W1'}}, {'title': 'Łódź', 'year': 2020})
+
+
+def test_op_type_and_escaped_id():
+    action, _ = decode(encode_action('papers', 'a"b', {}, op_type='create'))
+    assert action == {'create': {'_index': 'papers', '_id': 'a"b'}}
+
+
+def test_values_from_pandas_and_pyarrow():
+    doc = {
+        'keywords': np.array(['a', 'b'], dtype=object),
+        'counts': np.array([1, 2]),
+        'topics': np.array([{'id': 'T1'}], dtype=object),
+        'amount': decimal.Decimal('1.5'),
+        'raw': b'\x00\x01',
+        'date': datetime.date(2024, 5, 1),
+        'missing': None,
+    }
+    _, source = decode(encode_action('papers', 'W1', doc))
+    assert source == {'keywords': ['a', 'b'], 'counts': [1, 2], 'topics': [{'id': 'T1'}], 'amount': 1.5,
+                      'raw': 'AAE=', 'date': '2024-05-01', 'missing': None}
+
+
+def test_serializer_matches_stdlib_json():
+    body = {'query': {'match': {'title': 'graph'}}, 'size': 10}
+    serializer = OrjsonSerializer()
+    assert json.loads(serializer.dumps(body)) == body
+    assert serializer.dumps('{"raw": true}') == '{"raw": true}'
+    assert serializer.loads(b'{"a": [1, 2]}') == {'a': [1, 2]}
@@ -0,0 +1,50 @@
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from OpenSearchBulkExport import export_bulk_shards, prepare_index, verify_shards
+
+
+class FakeIndices:
+    def __init__(self, existing=()):
+        self.existing = set(existing)
+        self.created = {}
+
+    def exists(self, index):
+        return index in self.existing
+
+    def create(self, index, body):
+        self.created[index] = body
+        self.existing.add(index)
+
+
+class FakeClient:
+    def __init__(self, existing=()):
+        self.indices = FakeIndices(existing)
+
+
+def export(entity=None):
+    pq.write_table(pa.table({'id': [f"P{i}" for i in range(50)], 'title': ['x' * 100] * 50}), 'data.parquet')
+    return export_bulk_shards('data.parquet', 'university_projects', 'id', 'shards', 2000, entity=entity)
+
+
+def test_tampered_shard_is_detected():
+    manifest = export()
+    assert len(manifest['shards']) > 1
+    assert verify_shards('shards', manifest)
+    with open(f"shards/{manifest['shards'][1]['file']}", 'ab') as file:
+        file.write(b'x')
+    assert not verify_shards('shards', manifest)
+
+
+def test_index_is_created_with_the_recorded_mapping():
+    manifest = export(entity='projects')
+    client = FakeClient()
+    assert prepare_index(client, manifest)
+    mappings = client.indices.created['university_projects']['mappings']
+    assert mappings['properties']['fundings']['type'] == 'nested'
+
+
+def test_missing_index_without_mapping_is_refused():
+    manifest = export()
+    assert not prepare_index(FakeClient(), manifest)
+    assert prepare_index(FakeClient(existing=['university_projects']), manifest)
@@ -0,0 +1,45 @@
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from DataClean import clean_parquet, keep_mask
+
+
+def works_batch():
+    return pa.table({
+        'openalex_id': ['W1', 'W2', 'W3', 'W4', 'W5'],
+        'university_key': ['uw', 'uw', 'agh', 'agh', 'uw'],
+        'is_retracted': [False, True, False, None, False],
+        'is_paratext': [False, False, True, False, False],
+        'abstract': ['a', None, 'c', 'd', None],
+        'keywords': pa.array([['k'], [], ['k'], None, []], pa.list_(pa.string())),
+        'primary_location': ['x'] * 5,
+    })
+
+
+def test_works_keep_only_rows_flagged_false():
+    # A null flag counts as not kept, like the notebook's `== False` filter
+    assert keep_mask('works', works_batch()).to_pylist() == [True, False, False, False, True]
+
+
+def test_other_entities_keep_every_row():
+    batch = pa.table({'id': ['A1', 'A2'], 'is_retracted': [True, None]})
+    assert keep_mask('authors', batch).to_pylist() == [True, True]
+    assert keep_mask('projects', batch).to_pylist() == [True, True]
+
+
+def test_missing_flag_columns_keep_every_row():
+    assert keep_mask('works', pa.table({'openalex_id': ['W1', 'W2']})).to_pylist() == [True, True]
+
+
+def test_clean_parquet_drops_rows_and_columns():
+    pq.write_table(works_batch(), 'raw.parquet')
+    summary = clean_parquet('works', 'raw.parquet', 'clean.parquet', batch_size=2)
+
+    cleaned = pq.read_table('clean.parquet')
+    assert cleaned['openalex_id'].to_pylist() == ['W1', 'W5']
+    assert cleaned.schema.names == ['openalex_id', 'university_key', 'abstract', 'keywords']
+    result = summary.to_dict()
+    assert (result['rows_read'], result['rows_written']) == (5, 2)
+    assert result['removed_flags'] == {'is_retracted': 1, 'is_paratext': 1}
+    assert (result['missing_abstracts'], result['empty_keywords']) == (1, 1)
+    assert result['universities'] == {'uw': 2}
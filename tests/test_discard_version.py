@@ -0,0 +1,41 @@
+import os
+
+from IndexCheckpoint import CHECKPOINT_DIR
+from IndexDeadLetter import dead_letter_path, write_dead_letters
+from IndexManifest import manifest_path
+from OpenSearchIndexing import discard_version
+
+
+class FakeIndices:
+    def __init__(self):
+        self.deleted = []
+
+    def delete(self, index):
+        self.deleted.append(index)
+
+
+class FakeClient:
+    def __init__(self):
+        self.indices = FakeIndices()
+
+
+def touch(path):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    open(path, 'w').close()
+    return path
+
+
+def test_discard_removes_the_local_state_of_the_version_only():
+    manifest = touch(manifest_path('works_v2'))
+    checkpoints = [touch(os.path.join(CHECKPOINT_DIR, f"works_v2__{name}.json")) for name in ('a', 'b')]
+    kept_checkpoint = touch(os.path.join(CHECKPOINT_DIR, 'works_v1__a.json'))
+    write_dead_letters('works_v2', [{'_id': 'W1'}])
+    write_dead_letters('works_v1', [{'_id': 'W2'}])
+
+    client = FakeClient()
+    discard_version(client, 'works_v2', 'works')
+
+    assert client.indices.deleted == ['works_v2']
+    assert not any(os.path.exists(path) for path in [manifest, *checkpoints, dead_letter_path('works_v2')])
+    assert os.path.exists(kept_checkpoint)
+    assert os.path.exists(dead_letter_path('works_v1'))
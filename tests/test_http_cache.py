@@ -0,0 +1,77 @@
+import os
+import time
+
+import pytest
+
+from HttpCache import OfflineCacheMiss, ResponseCache, normalize_url
+
+URL = 'https://api.openalex.org/works'
+
+
+def test_normalize_url_sorts_params_and_drops_credentials():
+    assert normalize_url(f"{URL}?per-page=200&filter=a:1&mailto=me@x.org&api_key=secret#top") == \
+        f"{URL}?filter=a%3A1&per-page=200"
+
+
+def test_equal_requests_share_an_entry():
+    cache = ResponseCache('cache')
+    assert cache.path(f"{URL}?b=2&a=1&mailto=me@x.org") == cache.path(f"{URL}?a=1&b=2")
+    assert cache.path(f"{URL}?a=1") != cache.path(f"{URL}?a=2")
+
+
+def test_round_trip_and_counters():
+    cache = ResponseCache('cache')
+    assert cache.get(URL) is None
+    cache.put(URL, 200, {'Content-Type': 'application/json', 'Content-Encoding': 'gzip'}, b'{"results": []}')
+    assert cache.get(URL) == (200, {'Content-Type': 'application/json'}, b'{"results": []}')
+    assert (cache.hits, cache.misses) == (1, 1)
+
+
+def age(cache, url, seconds):
+    path = cache.path(url)
+    os.utime(path, (time.time() - seconds, time.time() - seconds))
+
+
+def test_expired_entry_is_fetched_again():
+    cache = ResponseCache('cache', ttl=60)
+    cache.put(URL, 200, {}, b'old')
+    assert cache.has(URL)
+    age(cache, URL, 120)
+    assert not cache.has(URL)
+    assert cache.get(URL) is None
+
+
+def test_offline_mode_serves_expired_entries_and_fails_on_misses():
+    ResponseCache('cache').put(URL, 200, {}, b'old')
+    offline = ResponseCache('cache', ttl=60, mode='offline')
+    age(offline, URL, 120)
+    assert offline.get(URL)[2] == b'old'
+    with pytest.raises(OfflineCacheMiss):
+        offline.get(f"{URL}?page=2")
+
+
+def test_refresh_mode_never_serves():
+    ResponseCache('cache').put(URL, 200, {}, b'old')
+    assert ResponseCache('cache', mode='refresh').get(URL) is None
+
+
+def test_least_recently_used_entries_are_evicted():
+    cache = ResponseCache('cache')
+    first, second, third = (f"{URL}?page={page}" for page in (1, 2, 3))
+    cache.put(first, 200, {}, b'x' * 1000)
+    cache.put(second, 200, {}, b'x' * 1000)
+    age(cache, first, 100)
+    age(cache, second, 50)
+    # Reading the older entry makes it the most recently used one
+    assert cache.get(first) is not None
+
+    cache.max_bytes = sum(cache._sizes.values())
+    cache.put(third, 200, {}, b'x' * 1000)
+    assert os.path.exists(cache.path(first))
+    assert not os.path.exists(cache.path(second))
+    assert os.path.exists(cache.path(third))
+
+
+def test_existing_entries_count_towards_the_size():
+    ResponseCache('cache').put(URL, 200, {}, b'x' * 1000)
+    assert sum(ResponseCache('cache')._sizes.values()) == os.path.getsize(ResponseCache('cache').path(URL))
@@ -0,0 +1,91 @@
+import os
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from IndexCheckpoint import IndexCheckpoint
+from OpenSearchIndexing import generate_bulk_actions_from_parquet
+
+
+def write_rows(ids, path='data.parquet'):
+    pq.write_table(pa.table({'id': ids, 'row': list(range(len(ids)))}), path)
+    return path
+
+
+def ack(checkpoint, doc_id, ok=True):
+    checkpoint.acknowledge(ok, {'index': {'_id': doc_id, 'status': 201 if ok else 500}})
+
+
+def track_all(checkpoint, path, batch_size):
+    """Generates the actions of a file in batches of batch_size with the checkpoint tracking them."""
+    actions = generate_bulk_actions_from_parquet(pq.ParquetFile(path), 'test', 'id', batch_size, checkpoint)
+    return [action['_id'] for action in checkpoint.track(actions)]
+
+
+def test_watermark_waits_for_earlier_batches():
+    path = write_rows(['a', 'b', 'c', 'd', 'e', 'f'])
+    checkpoint = IndexCheckpoint(path, 'test')
+    assert track_all(checkpoint, path, 2) == ['a', 'b', 'c', 'd', 'e', 'f']
+
+    # Later batches finish first, as they may with several workers
+    for doc_id in ('f', 'e', 'c', 'd'):
+        ack(checkpoint, doc_id)
+    assert checkpoint.rows_done == 0
+    ack(checkpoint, 'a')
+    assert checkpoint.rows_done == 0
+    ack(checkpoint, 'b')
+    assert checkpoint.rows_done == 6
+
+
+def test_failed_action_holds_the_watermark():
+    path = write_rows(['a', 'b', 'c', 'd'])
+    checkpoint = IndexCheckpoint(path, 'test')
+    track_all(checkpoint, path, 2)
+    ack(checkpoint, 'a')
+    ack(checkpoint, 'b')
+    ack(checkpoint, 'c', ok=False)
+    ack(checkpoint, 'd')
+    assert checkpoint.rows_done == 2
+
+
+def test_repeated_id_credits_the_batch_that_sent_it():
+    # 'a' is in the first and the last batch; only its last row is sent
+    path = write_rows(['a', 'b', 'c', 'a'])
+    checkpoint = IndexCheckpoint(path, 'test')
+    assert track_all(checkpoint, path, 2) == ['b', 'c', 'a']
+
+    ack(checkpoint, 'b')
+    assert checkpoint.rows_done == 2
+    ack(checkpoint, 'a')
+    assert checkpoint.rows_done == 2
+    ack(checkpoint, 'c')
+    assert checkpoint.rows_done == 4
+
+
+def test_resume_skips_acknowledged_rows():
+    path = write_rows(['a', 'b', 'c', 'd', 'e'])
+    checkpoint = IndexCheckpoint(path, 'test')
+    track_all(checkpoint, path, 2)
+    for doc_id in ('a', 'b', 'c'):
+        ack(checkpoint, doc_id)
+
+    resumed = IndexCheckpoint(path, 'test', resume=True)
+    assert resumed.start_row == 2
+    assert track_all(resumed, path, 2) == ['c', 'd', 'e']
+    for doc_id in ('c', 'd', 'e'):
+        ack(resumed, doc_id)
+    assert resumed.rows_done == 5
+    resumed.complete()
+    assert not os.path.exists(resumed.path)
+
+
+def test_resume_ignores_checkpoint_of_changed_file():
+    path = write_rows(['a', 'b', 'c'])
+    checkpoint = IndexCheckpoint(path, 'test')
+    track_all(checkpoint, path, 1)
+    ack(checkpoint, 'a')
+    assert IndexCheckpoint(path, 'test', resume=True).start_row == 1
+
+    write_rows(['a', 'b', 'c', 'd'])
+    assert IndexCheckpoint(path, 'test', resume=True).start_row == 0
+    assert IndexCheckpoint(path, 'other', resume=True).start_row == 0
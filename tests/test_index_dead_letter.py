@@ -0,0 +1,48 @@
+import os
+
+from IndexDeadLetter import (DeadLetterWriter, classify_failure, dead_letter_path, read_dead_letters,
+                             write_dead_letters)
+
+
+def test_rejection_is_retryable():
+    info = {'status': 429, 'error': {'type': 'es_rejected_execution_exception', 'reason': 'queue full'}}
+    assert classify_failure(info) == ('es_rejected_execution_exception', 'queue full', True)
+
+
+def test_mapping_error_is_permanent_and_keeps_its_cause():
+    info = {'status': 400, 'error': {'type': 'mapper_parsing_exception', 'reason': 'failed to parse',
+                                     'caused_by': {'type': 'illegal_argument_exception', 'reason': 'bad date'}}}
+    assert classify_failure(info) == ('mapper_parsing_exception', 'failed to parse: bad date', False)
+
+
+def test_retryable_status_without_retryable_type():
+    info = {'status': 503, 'error': {'type': 'some_exception', 'reason': 'unavailable'}}
+    assert classify_failure(info)[2]
+
+
+def test_transport_error_is_retryable():
+    assert classify_failure({'status': 'N/A', 'error': 'ConnectionTimeout'}) == \
+        ('transport_error', 'ConnectionTimeout', True)
+
+
+def test_writer_records_and_rewrites_entries():
+    writer = DeadLetterWriter('test', 'data.parquet', 'id')
+    writer.record({'index': {'_id': 'a', '_index': 'test', 'status': 429,
+                             'error': {'type': 'es_rejected_execution_exception', 'reason': 'full'}}})
+    writer.record({'index': {'_id': 'b', '_index': 'test', 'status': 400,
+                             'error': {'type': 'mapper_parsing_exception', 'reason': 'bad'}}})
+    writer.close()
+
+    entries = read_dead_letters('test')
+    assert [(entry['_id'], entry['retryable'], entry['parquet']) for entry in entries] == \
+        [('a', True, 'data.parquet'), ('b', False, 'data.parquet')]
+    write_dead_letters('test', entries[1:])
+    assert [entry['_id'] for entry in read_dead_letters('test')] == ['b']
+    write_dead_letters('test', [])
+    assert not os.path.exists(dead_letter_path('test'))
+
+
+def test_writer_without_failures_leaves_no_file():
+    DeadLetterWriter('test', 'data.parquet', 'id').close()
+    assert not os.path.exists(dead_letter_path('test'))
+    assert read_dead_letters('test') == []
@@ -0,0 +1,53 @@
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from IndexManifest import IndexManifest, last_rows
+from OpenSearchIndexing import generate_bulk_actions_from_parquet
+
+
+def run_delta(rows, delete_missing=False):
+    """One --delta run over rows, every sent action acknowledged; returns the sent actions."""
+    pq.write_table(pa.Table.from_pylist(rows), 'data.parquet')
+    manifest = IndexManifest('test', delete_missing=delete_missing)
+    actions = generate_bulk_actions_from_parquet(pq.ParquetFile('data.parquet'), 'test', 'id')
+    sent = []
+    for action in manifest.filter_actions(actions):
+        sent.append(action)
+        op_type = action.get('_op_type', 'index')
+        manifest.acknowledge(True, {op_type: {'_id': action['_id'], 'status': 200}})
+    manifest.close()
+    return sent
+
+
+def test_last_rows():
+    assert last_rows(pa.array(['a', 'b', None, 'a', 'c', 'b'])).tolist() == [False, False, False, True, True, True]
+
+
+def test_unchanged_documents_are_skipped():
+    rows = [{'id': 'a', 'title': 'A'}, {'id': 'b', 'title': 'B'}]
+    assert len(run_delta(rows)) == 2
+    assert run_delta(rows) == []
+
+
+def test_changed_document_is_sent():
+    run_delta([{'id': 'a', 'title': 'A'}, {'id': 'b', 'title': 'B'}])
+    sent = run_delta([{'id': 'a', 'title': 'A'}, {'id': 'b', 'title': 'B2'}])
+    assert [(action['_id'], action['_source']['title']) for action in sent] == [('b', 'B2')]
+
+
+def test_repeated_id_sends_only_last_row():
+    rows = [{'id': 'a', 'university_key': 'uw'}, {'id': 'b', 'university_key': 'uw'},
+            {'id': 'a', 'university_key': 'agh'}]
+    sent = run_delta(rows)
+    assert [(action['_id'], action['_source']['university_key']) for action in sent] == \
+        [('b', 'uw'), ('a', 'agh')]
+    # The stored hash is the one of the row the index keeps, so nothing is sent again
+    assert run_delta(rows) == []
+
+
+def test_deleted_id():
+    run_delta([{'id': 'a', 'title': 'A'}, {'id': 'b', 'title': 'B'}])
+    sent = run_delta([{'id': 'a', 'title': 'A'}], delete_missing=True)
+    assert [(action.get('_op_type'), action['_id']) for action in sent] == [('delete', 'b')]
+    # Acknowledged deletes leave the manifest, so they are not sent twice
+    assert run_delta([{'id': 'a', 'title': 'A'}], delete_missing=True) == []
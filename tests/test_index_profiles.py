@@ -0,0 +1,57 @@
+import pytest
+
+import OpenSearchIndexAuthors
+import OpenSearchIndexProjects
+import OpenSearchIndexWorks
+from IndexProfiles import field_mapping, index_body, nested_fields
+
+MAPPING = {
+    'properties': {
+        'title': {'type': 'text', 'fields': {'keyword': {'type': 'keyword'}}},
+        'university_key': {'type': 'keyword'},
+        'open_access': {'properties': {'oa_url': {'type': 'keyword', 'index': False}}},
+        'date': {'type': 'date'},
+    }
+}
+
+
+def test_field_mapping_follows_objects_and_multi_fields():
+    assert field_mapping(MAPPING, 'open_access.oa_url') == {'type': 'keyword', 'index': False}
+    assert field_mapping(MAPPING, 'title.keyword') == {'type': 'keyword'}
+    with pytest.raises(KeyError):
+        field_mapping(MAPPING, 'open_access.missing')
+
+
+def test_plain_mapping_is_unchanged():
+    assert index_body(MAPPING) == (MAPPING, {})
+    assert index_body(MAPPING, shards=2, refresh_interval='30s')[1] == \
+        {'index.number_of_shards': 2, 'index.refresh_interval': '30s'}
+
+
+def test_search_profile_tunes_a_copy():
+    profile = {'sort': {'date': 'desc'}, 'eager_global_ordinals': ['university_key'],
+               'no_doc_values': ['open_access.oa_url']}
+    mapping, settings = index_body(MAPPING, profile)
+    assert settings == {'index.sort.field': ['date'], 'index.sort.order': ['desc']}
+    assert mapping['properties']['university_key']['eager_global_ordinals'] is True
+    assert mapping['properties']['open_access']['properties']['oa_url']['doc_values'] is False
+    assert 'doc_values' not in MAPPING['properties']['open_access']['properties']['oa_url']
+
+
+def test_sort_is_refused_on_nested_mappings():
+    mapping = {'properties': {**MAPPING['properties'], 'topics': {'type': 'nested', 'properties': {}}}}
+    assert nested_fields(mapping) == ['topics']
+    with pytest.raises(ValueError):
+        index_body(mapping, {'sort': {'date': 'desc'}})
+
+
+@pytest.mark.parametrize('module, define', [
+    (OpenSearchIndexWorks, OpenSearchIndexWorks.define_works_mapping),
+    (OpenSearchIndexAuthors, OpenSearchIndexAuthors.define_authors_mapping),
+    (OpenSearchIndexProjects, OpenSearchIndexProjects.define_projects_mapping),
+])
+def test_entity_search_profiles_apply(module, define):
+    mapping, settings = index_body(define(), module.SEARCH_PROFILE)
+    assert 'index.sort.field' not in settings
+    for path in module.SEARCH_PROFILE['eager_global_ordinals']:
+        assert field_mapping(mapping, path)['eager_global_ordinals'] is True
@@ -0,0 +1,71 @@
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from IndexRollups import compute_rollups, indexed_rows, terms_buckets
+
+WORKS_SPEC = {
+    'terms': {
+        'papers_by_date': ('publication_date', 2),
+        'papers_by_university': ('university_key', 20),
+    },
+    'date_fields': ['publication_date'],
+    'year': 'publication_year',
+    'citations': 'cited_by_count',
+}
+
+
+def works_file(path='works.parquet'):
+    pq.write_table(pa.table({
+        # W1 appears for two universities; the index keeps its last row
+        'openalex_id': ['W1', 'W2', 'W1', 'W3', None],
+        'university_key': ['uw', 'uw', 'agh', 'agh', 'uw'],
+        'publication_date': ['2020-01-01', '2021-05-01', '2020-01-01', '2021-05-01', '2022-01-01'],
+        'publication_year': [2020, 2021, 2020, 2021, 2022],
+        'cited_by_count': [10, 5, 10, 1, 100],
+    }), path)
+    return path
+
+
+def test_indexed_rows_keep_the_last_row_of_every_id():
+    table = pq.read_table(works_file())
+    assert indexed_rows(table, 'openalex_id')['university_key'].to_pylist() == ['uw', 'agh', 'agh']
+
+
+def test_terms_buckets_sorted_by_count_then_key():
+    result = terms_buckets(pa.array(['b', 'a', 'b', 'c', None, 'a']), 2)
+    assert result['buckets'] == [{'key': 'a', 'doc_count': 2}, {'key': 'b', 'doc_count': 2}]
+    assert result['sum_other_doc_count'] == 1
+
+
+def test_date_buckets_are_keyed_by_epoch_millis():
+    result = terms_buckets(pa.array(['2020-01-01', '2020-01-01']), 10, date_field=True)
+    assert result['buckets'] == [{'key_as_string': '2020-01-01', 'key': 1577836800000, 'doc_count': 2}]
+
+
+def test_rollups_count_documents():
+    rollups = compute_rollups(works_file(), WORKS_SPEC, 'openalex_id')
+    assert rollups['total'] == 3
+    assert rollups['aggregations']['papers_by_university']['buckets'] == \
+        [{'key': 'agh', 'doc_count': 2}, {'key': 'uw', 'doc_count': 1}]
+    assert [bucket['key_as_string'] for bucket in rollups['aggregations']['papers_by_date']['buckets']] == \
+        ['2021-05-01', '2020-01-01']
+    assert rollups['universities'] == {
+        'agh': {'documents': 2, 'cited_by_count': 11, 'by_year': {'2020': 1, '2021': 1}},
+        'uw': {'documents': 1, 'cited_by_count': 5, 'by_year': {'2021': 1}},
+    }
+
+
+def test_nested_terms_and_string_year():
+    pq.write_table(pa.table({
+        'id': ['A1', 'A2'],
+        'university_key': ['uw', 'uw'],
+        'startDate': ['2019-03-01', None],
+        'institutions': pa.array([[{'type': 'education'}, {'type': 'facility'}], [{'type': 'education'}]],
+                                 pa.list_(pa.struct([('type', pa.string())]))),
+    }), 'authors.parquet')
+    spec = {'nested_terms': {'by_type': ('institutions', 'types', 'type', 10)}, 'year': 'startDate'}
+    rollups = compute_rollups('authors.parquet', spec, 'id')
+    assert rollups['aggregations']['by_type']['doc_count'] == 3
+    assert rollups['aggregations']['by_type']['types']['buckets'] == \
+        [{'key': 'education', 'doc_count': 2}, {'key': 'facility', 'doc_count': 1}]
+    assert rollups['universities'] == {'uw': {'documents': 2, 'by_year': {'2019': 1}}}
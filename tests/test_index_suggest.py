@@ -0,0 +1,40 @@
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from OpenSearchIndexSuggest import author_suggestions, paper_suggestions, topic_suggestions
+
+
+def test_repeated_rows_give_one_suggestion_from_the_last_row():
+    pq.write_table(pa.table({
+        'openalex_id': ['W1', 'W1', 'W1', 'W2', None],
+        'university_key': ['uw', 'agh', 'uw', None, 'uw'],
+        'title': ['Old title', 'Title', 'New title', 'Other', 'No ID'],
+        'cited_by_count': [1, 2, 3, 4, 5],
+    }), 'works.parquet')
+
+    # Batches of one row, so the repeats span batches
+    actions = list(paper_suggestions('works.parquet', batch_size=1))
+
+    assert [action['_id'] for action in actions] == ['paper:agh:W1', 'paper:uw:W1', 'paper:None:W2']
+    assert actions[1]['_source']['text'] == 'New title'
+
+
+def test_file_without_university_column_dedupes_by_id():
+    pq.write_table(pa.table({'id': ['A1', 'A1'], 'display_name': ['Jan Kowalski', 'Jan Kowalski']}),
+                   'authors.parquet')
+
+    assert [action['_id'] for action in author_suggestions('authors.parquet')] == ['author:None:A1']
+
+
+def test_topic_is_suggested_once_per_university():
+    topic = pa.struct([('id', pa.string()), ('display_name', pa.string())])
+    pq.write_table(pa.table({
+        'university_key': ['uw', 'uw', 'agh'],
+        'topics': pa.array([[{'id': 'T1', 'display_name': 'Optics'}],
+                            [{'id': 'T1', 'display_name': 'Optics and Photonics'}, {'id': None, 'display_name': 'x'}],
+                            [{'id': 'T1', 'display_name': 'Optics'}]], type=pa.list_(topic)),
+    }), 'works.parquet')
+
+    weights = {action['_id']: action['_source']['suggest']['weight'] for action in topic_suggestions('works.parquet')}
+
+    assert weights == {'topic:uw:T1': 2, 'topic:agh:T1': 1}
@@ -0,0 +1,69 @@
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from OpenAlexRefresh import deletes_path, merge_changes, refresh
+
+
+def cleaned_file(path='works.parquet'):
+    pq.write_table(pa.table({
+        'openalex_id': ['W1', 'W2', 'W2', 'W3'],
+        'university_key': ['uw', 'uw', 'agh', 'agh'],
+        'title': ['one', 'two', 'two', 'three'],
+        'updated_date': ['2024-01-01'] * 4,
+    }), path)
+    return path
+
+
+def rows(path):
+    return sorted((row['openalex_id'], row['university_key'], row['title'])
+                  for row in pq.read_table(path).to_pylist())
+
+
+def test_merge_upserts_by_id_and_university():
+    path = cleaned_file()
+    changes = pa.table({'openalex_id': ['W1', 'W4'], 'university_key': ['uw', 'uw'],
+                        'title': ['one v2', 'four'], 'updated_date': ['2024-02-01'] * 2})
+    assert merge_changes(path, changes, set(), 'openalex_id') == 5
+    assert rows(path) == [('W1', 'uw', 'one v2'), ('W2', 'agh', 'two'), ('W2', 'uw', 'two'),
+                          ('W3', 'agh', 'three'), ('W4', 'uw', 'four')]
+
+
+def test_merge_removes_only_the_given_university_rows():
+    path = cleaned_file()
+    merge_changes(path, pa.table({'openalex_id': pa.array([], pa.string()),
+                                  'university_key': pa.array([], pa.string()),
+                                  'title': pa.array([], pa.string()),
+                                  'updated_date': pa.array([], pa.string())}),
+                  {'W2|uw', 'W3|agh'}, 'openalex_id')
+    assert rows(path) == [('W1', 'uw', 'one'), ('W2', 'agh', 'two')]
+
+
+class FakeHarvester:
+    api_key = 'key'
+
+    def __init__(self, records):
+        self.records = records
+
+    def harvest(self, entity, universities, filters=None):
+        return {key: [record for record in self.records if record['university_key'] == key]
+                for key in universities}
+
+
+def test_refresh_writes_ids_left_without_rows_as_deletes():
+    path = cleaned_file()
+    records = [
+        {'openalex_id': 'W1', 'university_key': 'uw', 'title': 'one v2', 'is_retracted': False,
+         'is_paratext': False, 'updated_date': '2024-02-01'},
+        # W2 stays at agh, W3 has no other row
+        {'openalex_id': 'W2', 'university_key': 'uw', 'title': 'two', 'is_retracted': True,
+         'is_paratext': False, 'updated_date': '2024-02-01'},
+        {'openalex_id': 'W3', 'university_key': 'agh', 'title': 'three', 'is_retracted': False,
+         'is_paratext': True, 'updated_date': '2024-02-01'},
+    ]
+    changed = refresh('works', path, 'changes.parquet', universities={'uw': 'ror', 'agh': 'ror'},
+                      harvester=FakeHarvester(records))
+
+    assert changed == 3
+    assert rows(path) == [('W1', 'uw', 'one v2'), ('W2', 'agh', 'two')]
+    assert pq.read_table('changes.parquet')['openalex_id'].to_pylist() == ['W1']
+    assert pq.read_table(deletes_path('changes.parquet'))['openalex_id'].to_pylist() == ['W3']
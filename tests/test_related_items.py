@@ -0,0 +1,46 @@
+import pyarrow as pa
+
+from RelatedItems import ENTITIES, related_items
+
+
+def works_table(ids, authors):
+    return pa.table({
+        'openalex_id': ids,
+        'keywords': pa.array([[] for _ in ids], pa.list_(pa.struct([('id', pa.string())]))),
+        'topics': pa.array([[] for _ in ids], pa.list_(pa.struct([('id', pa.string())]))),
+        'authors': pa.array(authors, pa.list_(pa.string())),
+    })
+
+
+def test_repeated_ids_are_one_item():
+    # W1 appears once per university; W2 shares most of its authors
+    table = works_table(
+        ['W1', 'W1', 'W2', 'W3'],
+        [['a', 'b', 'c', 'd'], ['a', 'b', 'c', 'd'], ['a', 'b', 'c', 'e'], ['x', 'y', 'z']])
+
+    related = related_items(table, 'openalex_id', ENTITIES['works']['features'], min_score=0.0).to_pylist()
+
+    assert len(related) == 4
+    for row in (0, 1):
+        assert [neighbour['id'] for neighbour in related[row]] == ['W2']
+    assert [neighbour['id'] for neighbour in related[2]] == ['W1']
+    assert related[3] == []
+
+
+def test_last_row_of_an_id_is_used():
+    table = works_table(['W1', 'W2', 'W1'], [['x', 'y'], ['a', 'b'], ['a', 'b']])
+
+    related = related_items(table, 'openalex_id', ENTITIES['works']['features']).to_pylist()
+
+    assert [neighbour['id'] for neighbour in related[1]] == ['W1']
+    assert related[0] == related[2]
+
+
+def test_rows_without_id():
+    table = works_table(['W1', None, 'W2'], [['a', 'b'], ['a', 'b'], ['a', 'b']])
+
+    related = related_items(table, 'openalex_id', ENTITIES['works']['features']).to_pylist()
+
+    assert [neighbour['id'] for neighbour in related[0]] == ['W2']
+    assert related[1] is None
+    assert [neighbour['id'] for neighbour in related[2]] == ['W1']